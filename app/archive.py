@@ -0,0 +1,343 @@
+import json
+import os
+import tempfile
+import time
+
+from datetime import date, datetime
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import numpy as np
+
+from .datacls import OfferStatistics
+from .exceptions import ArchiveFormatError
+
+# Версия формата архива (см. MetricsArchive)
+ARCHIVE_VERSION = 1
+# Строка архива: метрики одного объявления за один день. День - номер дня от 1970-01-01,
+# поэтому колонка day приводится к датам без разбора: records["day"].astype("datetime64[D]")
+RECORD_DTYPE = np.dtype([
+    ("listing_id", "<i8"),
+    ("day", "<i4"),
+    ("views", "<i4"),
+    ("calls", "<i4"),
+    ("chats", "<i4"),
+    ("likes", "<i4"),
+    ("auction_points", "<f4"),
+])
+# Запись индекса блоков: положение блока в файле строк и диапазоны ID объявлений и дней в нем
+BLOCK_DTYPE = np.dtype([
+    ("offset", "<i8"),
+    ("count", "<i8"),
+    ("listing_min", "<i8"),
+    ("listing_max", "<i8"),
+    ("day_min", "<i4"),
+    ("day_max", "<i4"),
+    ("written_at", "<i8"),
+])
+# Значение целочисленной метрики, которое означает, что метрика не была получена (None)
+MISSING_VALUE = -1
+# Целочисленные метрики строки архива
+COUNT_FIELDS = ("views", "calls", "chats", "likes")
+# Поля OfferStatistics, которые хранятся в таблице метаданных объявлений, а не в строках архива
+METADATA_FIELDS = ("listing_url", "publish_date", "property_type", "offers", "address", "area")
+# Файлы архива в его папке
+RECORDS_FILE = "metrics.bin"
+BLOCKS_FILE = "blocks.bin"
+OFFERS_FILE = "offers.json"
+META_FILE = "meta.json"
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def to_day(value: date | datetime | str) -> int:
+    """
+    Преобразует дату в номер дня архива.
+
+    :param value: Дата, datetime или дата отчета в формате "DD.MM.YYYY".
+    :return: Номер дня от 1970-01-01.
+    """
+    if isinstance(value, str):
+        value = datetime.strptime(value, "%d.%m.%Y")
+    if isinstance(value, datetime):
+        value = value.date()
+    return value.toordinal() - EPOCH_ORDINAL
+
+
+def from_day(day: int) -> date:
+    """
+    Преобразует номер дня архива в дату.
+
+    :param day: Номер дня от 1970-01-01.
+    :return: Дата.
+    """
+    return date.fromordinal(int(day) + EPOCH_ORDINAL)
+
+
+def spread(values: list, index: np.ndarray) -> list:
+    """
+    Раскладывает значения по строкам: values[index[i]] для каждой строки.
+
+    :param values: Значения (например, по одному на день или объявление).
+    :param index: Номер значения для каждой строки.
+    :return: Список значений строк.
+    """
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return column[index].tolist()
+
+
+def read_array(path: Path, dtype: np.dtype) -> np.ndarray:
+    """
+    Отображает файл с записями фиксированной длины в память без чтения и разбора.
+
+    Неполная запись в конце файла (после прерванной записи) не учитывается.
+
+    :param path: Путь к файлу.
+    :param dtype: Тип записи.
+    :return: Массив numpy.memmap только для чтения (пустой массив, если записей нет).
+    """
+    count = os.path.getsize(path) // dtype.itemsize if path.exists() else 0
+    if not count:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(count,))
+
+
+def append_array(path: Path, array: np.ndarray) -> int:
+    """
+    Дописывает записи в конец файла и сбрасывает их на диск.
+
+    :param path: Путь к файлу.
+    :param array: Записи для добавления.
+    :return: Номер первой добавленной записи в файле.
+    """
+    with open(path, "ab") as file:
+        size = file.seek(0, os.SEEK_END)
+        offset, tail = divmod(size, array.dtype.itemsize)
+        if tail:
+            # Неполная запись, оставшаяся после прерванной записи, отбрасывается
+            file.truncate(offset * array.dtype.itemsize)
+        array.tofile(file)
+        file.flush()
+        os.fsync(file.fileno())
+    return offset
+
+
+class MetricsArchive:
+    def __init__(self, path: Path) -> None:
+        """
+        Локальный архив собранных метрик по дням.
+
+        Архив - папка с файлами:
+        - metrics.bin - строки фиксированной длины RECORD_DTYPE. Каждый запуск дописывает
+          свой блок строк, отсортированный по (ID объявления, день);
+        - blocks.bin - индекс блоков BLOCK_DTYPE с диапазонами ID объявлений и дней;
+        - offers.json - метаданные объявлений (ссылка, адрес и т.д., см. METADATA_FIELDS)
+          по последнему запуску;
+        - meta.json - версия формата.
+
+        Строки и индекс читаются через numpy.memmap без разбора, поэтому выборка по объявлениям
+        и диапазону дней не зависит от объема истории в Google таблице.
+
+        :param path: Путь к папке архива. Создается при первой записи.
+        :raises ArchiveFormatError: Если архив создан несовместимой версией.
+        """
+        self.path = Path(path)
+        meta_path = self.path / META_FILE
+        if meta_path.exists():
+            with open(meta_path, encoding="utf-8") as file:
+                meta = json.load(file)
+            if meta.get("version") != ARCHIVE_VERSION:
+                raise ArchiveFormatError(
+                    f"Архив {self.path} создан в формате версии {meta.get('version')}, "\
+                    f"поддерживается версия {ARCHIVE_VERSION}!"
+                )
+
+    def records(self) -> np.ndarray:
+        """
+        Возвращает все строки архива (numpy.memmap с типом RECORD_DTYPE).
+        """
+        return read_array(self.path / RECORDS_FILE, RECORD_DTYPE)
+
+    def blocks(self) -> np.ndarray:
+        """
+        Возвращает индекс блоков архива (массив с типом BLOCK_DTYPE).
+        """
+        return read_array(self.path / BLOCKS_FILE, BLOCK_DTYPE)
+
+    def metadata(self) -> dict[int, dict]:
+        """
+        Возвращает метаданные объявлений.
+
+        :return: Словарь: ID объявления -> поля METADATA_FIELDS.
+        """
+        try:
+            with open(self.path / OFFERS_FILE, encoding="utf-8") as file:
+                return {int(listing_id): values for listing_id, values in json.load(file).items()}
+        except FileNotFoundError:
+            return {}
+
+    def __write_json(self, name: str, data: dict) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix=name, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False)
+        os.replace(tmp_path, self.path / name)
+
+    def append(self, offers: Iterable[OfferStatistics]) -> int:
+        """
+        Дописывает строки запуска в архив одним блоком и обновляет метаданные объявлений.
+
+        Сначала записываются строки, затем запись индекса: если запись прервалась,
+        строки без записи в индексе не учитываются при чтении. Метрики, которые не были
+        получены (None), сохраняются как MISSING_VALUE, а баллы аукциона - как NaN.
+
+        :param offers: Объекты OfferStatistics (по одному на объявление и день).
+        :return: Количество добавленных строк.
+        """
+        days = {}
+        metadata = {}
+
+        def record(offer: OfferStatistics) -> tuple:
+            day = days.get(offer.report_date)
+            if day is None:
+                day = days[offer.report_date] = to_day(offer.report_date)
+            metadata[offer.listing_id] = {name: getattr(offer, name) for name in METADATA_FIELDS}
+            return (
+                offer.listing_id, day,
+                *(MISSING_VALUE if value is None else value for value in (
+                    offer.views, offer.calls, offer.chats, offer.likes
+                )),
+                np.nan if offer.auction_points is None else offer.auction_points
+            )
+
+        block = np.fromiter((record(offer) for offer in offers), dtype=RECORD_DTYPE)
+        if not len(block):
+            return 0
+        block.sort(order=("listing_id", "day"), kind="stable")
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        if not (self.path / META_FILE).exists():
+            self.__write_json(META_FILE, {"version": ARCHIVE_VERSION})
+        offset = append_array(self.path / RECORDS_FILE, block)
+        index = np.array(
+            [(
+                offset, len(block),
+                block["listing_id"][0], block["listing_id"][-1],
+                block["day"].min(), block["day"].max(),
+                int(time.time())
+            )],
+            dtype=BLOCK_DTYPE
+        )
+        append_array(self.path / BLOCKS_FILE, index)
+
+        stored = {str(listing_id): values for listing_id, values in self.metadata().items()}
+        stored.update((str(listing_id), values) for listing_id, values in metadata.items())
+        self.__write_json(OFFERS_FILE, stored)
+        return len(block)
+
+    def query(
+            self,
+            listing_ids: Iterable[int] = None,
+            day_from: date | datetime | str = None,
+            day_to: date | datetime | str = None,
+            latest: bool = True
+    ) -> np.ndarray:
+        """
+        Выбирает строки архива по объявлениям и диапазону дней.
+
+        Блоки, диапазоны которых не пересекаются с запросом, пропускаются по индексу,
+        а внутри блока строки объявления находятся двоичным поиском.
+
+        :param listing_ids: ID объявлений (по умолчанию - все).
+        :param day_from: Первый день диапазона включительно (по умолчанию - без ограничения).
+        :param day_to: Последний день диапазона включительно (по умолчанию - без ограничения).
+        :param latest: Для каждой пары (объявление, день) оставить только строку из последнего
+        запуска, в котором она собиралась. Результат отсортирован по (ID объявления, день).
+        Если False - возвращаются все строки в порядке блоков.
+        :return: Массив с типом RECORD_DTYPE.
+        """
+        records = self.records()
+        first_day = np.iinfo(np.int32).min if day_from is None else to_day(day_from)
+        last_day = np.iinfo(np.int32).max if day_to is None else to_day(day_to)
+        ids = None
+        if listing_ids is not None:
+            ids = np.unique(np.fromiter(listing_ids, dtype=np.int64))
+            if not len(ids):
+                return np.empty(0, dtype=RECORD_DTYPE)
+
+        parts = []
+        for block in self.blocks():
+            if block["day_max"] < first_day or block["day_min"] > last_day:
+                continue
+            if ids is not None and (ids[-1] < block["listing_min"] or ids[0] > block["listing_max"]):
+                continue
+            chunk = records[block["offset"]:block["offset"] + block["count"]]
+            if ids is None:
+                days = chunk["day"]
+                parts.append(chunk[(days >= first_day) & (days <= last_day)])
+                continue
+            listing_column = chunk["listing_id"]
+            starts = np.searchsorted(listing_column, ids, side="left")
+            ends = np.searchsorted(listing_column, ids, side="right")
+            for start, end in zip(starts[starts < ends], ends[starts < ends]):
+                # Внутри объявления строки отсортированы по дню
+                offer_days = chunk["day"][start:end]
+                parts.append(
+                    chunk[
+                        start + np.searchsorted(offer_days, first_day, side="left"):
+                        start + np.searchsorted(offer_days, last_day, side="right")
+                    ]
+                )
+        if not parts:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        result = np.concatenate(parts)
+        if not latest:
+            return result
+
+        position = np.arange(len(result))
+        result = result[np.lexsort((-position, result["day"], result["listing_id"]))]
+        first = np.ones(len(result), dtype=bool)
+        first[1:] = (
+            (result["listing_id"][1:] != result["listing_id"][:-1])
+            | (result["day"][1:] != result["day"][:-1])
+        )
+        return result[first]
+
+    def offers(self, records: np.ndarray) -> Iterator[OfferStatistics]:
+        """
+        Преобразует строки архива обратно в объекты OfferStatistics с метаданными объявлений.
+
+        Колонки преобразуются в списки целиком, а даты отчета и метаданные формируются
+        один раз на день и на объявление и раскладываются по строкам индексированием.
+        MISSING_VALUE и NaN возвращаются как None.
+
+        :param records: Строки архива (результат query).
+        :return: Итератор объектов OfferStatistics.
+        """
+        if not len(records):
+            return iter(())
+        metadata = self.metadata()
+        days, day_index = np.unique(records["day"], return_inverse=True)
+        listing_ids, listing_index = np.unique(records["listing_id"], return_inverse=True)
+        offers = [metadata.get(listing_id, {}) for listing_id in listing_ids.tolist()]
+        report_dates = spread([from_day(day).strftime("%d.%m.%Y") for day in days.tolist()], day_index)
+        listing_url, *fields = (
+            spread([offer.get(name) for offer in offers], listing_index) for name in METADATA_FIELDS
+        )
+
+        counts = []
+        for name in COUNT_FIELDS:
+            column = records[name]
+            values = column.tolist()
+            for index in np.flatnonzero(column == MISSING_VALUE).tolist():
+                values[index] = None
+            counts.append(values)
+        points = np.round(records["auction_points"].astype(np.float64), 2)
+        auction_points = points.tolist()
+        for index in np.flatnonzero(np.isnan(points)).tolist():
+            auction_points[index] = None
+
+        return map(
+            OfferStatistics,
+            report_dates, listing_url, records["listing_id"].tolist(), *counts, auction_points, *fields
+        )
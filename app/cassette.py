@@ -0,0 +1,139 @@
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+from pathlib import Path
+from urllib.parse import urlencode
+
+from .enums import CassetteMode
+from .exceptions import CassetteNotFound, SendRequestError
+
+
+def request_key(url: str, params: dict) -> str:
+    """
+    Формирует ключ запроса из URL и нормализованных параметров.
+
+    Параметры со значением None отбрасываются (requests их не отправляет),
+    остальные сортируются по имени, чтобы ключ не зависел от порядка аргументов.
+
+    :param url: URL запроса.
+    :param params: Параметры запроса.
+    :return: Строка вида "url?a=1&b=2".
+    """
+    items = sorted(
+        (name, value) for name, value in params.items() if value is not None
+    )
+    return f"{url}?{urlencode(items, doseq=True)}"
+
+
+class Cassette:
+    def __init__(
+            self,
+            path: Path,
+            mode: CassetteMode,
+            recorded_latency: bool = False
+    ) -> None:
+        """
+        Конструктор класса Cassette - файла с записанными ответами API Циан.
+
+        Ответы хранятся в SQLite базе, сжатыми zlib, с индексом по ключу запроса
+        (см. request_key), поэтому поиск ответа при воспроизведении не требует
+        чтения всего файла.
+
+        :param path: Путь к файлу кассеты.
+        :param mode: Режим работы: запись или воспроизведение.
+        :param recorded_latency: При воспроизведении выдерживать записанную задержку ответа
+        (по умолчанию ответы отдаются без задержки).
+        :raises CassetteNotFound: Если в режиме воспроизведения файл кассеты не найден.
+        """
+        if mode == CassetteMode.REPLAY and not Path(path).exists():
+            raise CassetteNotFound(f"Файл с записанными запросами {path} не найден!")
+        self.path = path
+        self.mode = mode
+        self.recorded_latency = recorded_latency
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(path, check_same_thread=False)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, url TEXT NOT NULL, body BLOB NOT NULL, latency REAL NOT NULL)"
+        )
+        self.__connection.execute(
+            "CREATE INDEX IF NOT EXISTS responses_url ON responses (url)"
+        )
+        self.__connection.commit()
+
+    def record(self, url: str, params: dict, body: dict, latency: float) -> None:
+        """
+        Сохраняет ответ API в кассету. Повторная запись того же запроса заменяет ответ.
+
+        :param url: URL запроса.
+        :param params: Параметры запроса.
+        :param body: Тело ответа в виде словаря.
+        :param latency: Время выполнения запроса в секундах.
+        """
+        data = zlib.compress(json.dumps(body, ensure_ascii=False).encode("utf-8"))
+        with self.__lock:
+            self.__connection.execute(
+                "INSERT OR REPLACE INTO responses (key, url, body, latency) VALUES (?, ?, ?, ?)",
+                (request_key(url, params), url, data, latency)
+            )
+            self.__connection.commit()
+
+    def play(self, url: str, params: dict) -> dict:
+        """
+        Возвращает записанный ответ API.
+
+        :param url: URL запроса.
+        :param params: Параметры запроса.
+        :return: Тело ответа в виде словаря.
+        :raises SendRequestError: Если запрос отсутствует в кассете.
+        """
+        key = request_key(url, params)
+        with self.__lock:
+            row = self.__connection.execute(
+                "SELECT body, latency FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            raise SendRequestError(f"Запрос отсутствует в записи {self.path}: {key}")
+        body, latency = row
+        if self.recorded_latency:
+            time.sleep(latency)
+        return json.loads(zlib.decompress(body))
+
+    def recorded_keys(self, url: str) -> set[str]:
+        """
+        Возвращает ключи всех записанных запросов к URL.
+
+        :param url: URL запроса.
+        :return: Множество ключей (см. request_key).
+        """
+        with self.__lock:
+            rows = self.__connection.execute(
+                "SELECT key FROM responses WHERE url = ?", (url,)
+            ).fetchall()
+        return {key for key, in rows}
+
+    def median_latency(self, url: str) -> float | None:
+        """
+        Возвращает медианное записанное время ответа для URL.
+
+        :param url: URL запроса.
+        :return: Время ответа в секундах или None, если запросов к URL не записано.
+        """
+        with self.__lock:
+            rows = self.__connection.execute(
+                "SELECT latency FROM responses WHERE url = ? ORDER BY latency", (url,)
+            ).fetchall()
+        if not rows:
+            return None
+        return rows[len(rows) // 2][0]
+
+    def close(self) -> None:
+        """
+        Закрывает файл кассеты.
+        """
+        with self.__lock:
+            self.__connection.close()
@@ -1,17 +1,51 @@
+import itertools
 import logging
+import random
 import requests
+import threading
+import time
 
-from .enums import Url
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from .cassette import Cassette
+from .enums import CassetteMode, RequestLog, Url
 from .exceptions import SendRequestError
+from .hedging import HedgeBudget, LatencyTracker, hedged_call
 from .logger import init_logging
 
+# Время ожидания установки соединения, секунды
+CONNECT_TIMEOUT = 3.05
+# Время ожидания ответа по умолчанию, секунды
+READ_TIMEOUT = 30
+# Время ожидания (соединение, ответ) для отдельных эндпоинтов
+TIMEOUTS = {
+    Url.VIEWS_STATISTICS_BY_DAYS.value: (CONNECT_TIMEOUT, 15),
+    Url.AUCTION.value: (CONNECT_TIMEOUT, 15),
+    Url.CALLS_REPORT.value: (CONNECT_TIMEOUT, 60),
+}
+# Максимальное количество попыток отправки одного запроса
+MAX_ATTEMPTS = 5
+# Задержка перед первым повтором запроса, секунды (удваивается с каждой попыткой)
+RETRY_DELAY = 1.0
+# Максимальная задержка перед повтором запроса, секунды
+MAX_RETRY_DELAY = 30.0
+
 
 class CianApi:
     def __init__(
             self,
             access_token: str,
             host: str = Url.HOST.value,
-            logger: logging = None
+            logger: logging.Logger = None,
+            cassette: Cassette = None,
+            request_log: RequestLog = RequestLog.INFO,
+            request_log_rate: int = 100,
+            timeouts: dict[str, tuple[float, float]] = None,
+            hedge_ratio: float = 0.0,
+            hedge_percentile: float = 95.0,
+            cancel: threading.Event = None
     ) -> None:
         """
         Конструктор класса CianApi. Инициализирует объект API-клиента для работы с публичным API Циан.
@@ -19,13 +53,53 @@ class CianApi:
         :param access_token: Токен доступа для авторизации в API.
         :param host: URL хоста API (по умолчанию https://public-api.cian.ru).
         :param logger: Логгер для ведения журнала событий. Если не указан, используется стандартный логгер.
+        :param cassette: Кассета для записи ответов API или их воспроизведения без обращения к API.
+        :param request_log: Режим логирования отдельных запросов: каждый запрос на уровне INFO,
+        только на уровне DEBUG или каждый request_log_rate-й запрос на уровне INFO.
+        :param request_log_rate: Частота выборки запросов для режима RequestLog.SAMPLE.
+        :param timeouts: Время ожидания (соединение, ответ) в секундах для отдельных эндпоинтов,
+        дополняет и переопределяет TIMEOUTS. Для остальных эндпоинтов - (CONNECT_TIMEOUT, READ_TIMEOUT).
+        :param hedge_ratio: Допустимая доля дублирующих запросов (0 - без дублирования). Если запрос
+        выполняется дольше hedge_percentile-го перцентиля времени ответа эндпоинта, отправляется
+        такой же запрос, и используется ответ, пришедший первым.
+        :param hedge_percentile: Перцентиль времени ответа, после которого отправляется дублирующий запрос.
+        :param cancel: Событие отмены сбора (см. run_stages). Если оно установлено, новые запросы
+        не отправляются, а завершаются ошибкой SendRequestError.
         """
         if not logger:
             logger = init_logging()
         self.logger = logger
         self.host = host
+        self.cassette = cassette
+        self.request_log = request_log
+        self.request_log_rate = max(request_log_rate, 1)
+        self.__request_counter = itertools.count(1)
+        self.timeouts = {**TIMEOUTS, **(timeouts or {})}
+        self.latencies: defaultdict[str, LatencyTracker] = defaultdict(LatencyTracker)
+        self.hedge_budget = HedgeBudget(hedge_ratio)
+        self.hedge_percentile = hedge_percentile
+        self.cancel = cancel
+        self.__hedge_executor = None
+        if hedge_ratio > 0:
+            self.__hedge_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="cian-hedge")
         self.session = self.init_session(access_token)
 
+    def close(self) -> None:
+        """
+        Останавливает пул потоков дублирующих запросов и закрывает сессию HTTP.
+
+        Незавершенные дублирующие запросы не ожидаются: их результаты все равно отбрасываются.
+        """
+        if self.__hedge_executor is not None:
+            self.__hedge_executor.shutdown(wait=False, cancel_futures=True)
+            self.__hedge_executor = None
+        self.session.close()
+
+    def __enter__(self) -> "CianApi":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
 
     def init_session(self, access_token: str) -> requests.Session:
         """
@@ -42,6 +116,23 @@ class CianApi:
         session.headers.update(headers)
         return session
     
+    def __log_request(self, msg: str, *args) -> None:
+        """
+        Логирование отправки запроса в соответствии с режимом request_log.
+
+        Сообщение форматируется только если запись действительно будет выведена.
+
+        :param msg: Шаблон сообщения в стиле %-форматирования.
+        :param args: Аргументы шаблона.
+        """
+        if self.request_log == RequestLog.DEBUG:
+            self.logger.debug(msg, *args)
+            return
+        number = next(self.__request_counter)
+        if self.request_log == RequestLog.SAMPLE and number % self.request_log_rate:
+            return
+        self.logger.info(msg + " | Запрос №%d", *args, number)
+
     def __error_notification(self, response: requests.Response) -> None:
         """
         Логирование ошибок при выполнении запроса к API.
@@ -64,31 +155,99 @@ class CianApi:
         """
         Вспомогательный метод для отправки GET-запросов к API Циан с заданными параметрами.
 
+        Время ожидания соединения и ответа ограничено значениями из timeouts. При превышении
+        времени ожидания или статусе 500 запрос повторяется с экспоненциальной задержкой
+        (см. __wait_retry), всего не более MAX_ATTEMPTS попыток.
+
         :param url: URL для выполнения GET-запроса.
         :param params: Параметры, которые будут переданы в запрос.
         :return: Ответ API в виде словаря, если запрос успешен.
         :raises SendRequestError: Если запрос неуспешен или произошла ошибка во время выполнения.
         """
+        if self.cassette and self.cassette.mode == CassetteMode.REPLAY:
+            return self.cassette.play(url, params)
+
+        timeout = self.timeouts.get(url, (CONNECT_TIMEOUT, READ_TIMEOUT))
+
+        def get() -> tuple[requests.Response, float]:
+            started_at = time.perf_counter()
+            response = self.session.get(url=url, params=params, timeout=timeout)
+            return response, time.perf_counter() - started_at
+
         count_errors = 1
         while True:
+            if self.cancel is not None and self.cancel.is_set():
+                raise SendRequestError(f"Сбор остановлен из-за ошибки в другом этапе | Url: {url}")
             try:
-                response = self.session.get(url=url, params=params)
-                
+                response, latency = self.__get(url, get)
+
+            except requests.Timeout as _ex:
+                if count_errors == MAX_ATTEMPTS:
+                    raise SendRequestError(f"Превышено время ожидания ответа: {_ex} | Url: {url}")
+                count_errors+=1
+                self.logger.warning(
+                    f"Повторная отправка запроса из за превышения времени ожидания! Попытка: {count_errors}"
+                )
+                self.__wait_retry(count_errors)
+                continue
             except Exception as _ex:
                 raise SendRequestError(f"Ошибка: {_ex} | Url: {url}")
-            
-            if count_errors == 5:
-                self.__error_notification(response)
-                raise SendRequestError(f"Ошибка. Url: {response.url} | Status: {response.status_code}")
+            self.latencies[url].add(latency)
             
             if response.status_code == 500:
+                if count_errors == MAX_ATTEMPTS:
+                    self.__error_notification(response)
+                    raise SendRequestError(f"Ошибка. Url: {response.url} | Status: {response.status_code}")
                 count_errors+=1
                 self.logger.warning(f"Повторная отправка запроса из за статуса 500! Попытка: {count_errors}")
+                self.__wait_retry(count_errors)
+                continue
 
             elif response.status_code != 200:
                 self.__error_notification(response)
                 raise SendRequestError(f"Ошибка. Url: {response.url} | Status: {response.status_code}")
-            return response.json()
+            body = response.json()
+            if self.cassette and self.cassette.mode == CassetteMode.RECORD:
+                self.cassette.record(url, params, body, latency)
+            return body
+
+    def __wait_retry(self, attempt: int) -> None:
+        """
+        Ожидает перед повтором запроса: RETRY_DELAY, удвоенная для каждой следующей попытки
+        (не больше MAX_RETRY_DELAY), плюс случайная добавка, чтобы параллельные повторы
+        не приходили в API одновременно. Ожидание прерывается событием отмены сбора.
+
+        :param attempt: Номер предстоящей попытки (начиная со второй).
+        """
+        delay = min(RETRY_DELAY * 2 ** (attempt - 2), MAX_RETRY_DELAY) + random.random() * RETRY_DELAY
+        if self.cancel is not None:
+            self.cancel.wait(delay)
+        else:
+            time.sleep(delay)
+
+    def __get(
+            self,
+            url: str,
+            get: Callable[[], tuple[requests.Response, float]]
+    ) -> tuple[requests.Response, float]:
+        """
+        Выполняет GET-запрос, при необходимости дублируя его (см. hedge_ratio).
+
+        :param url: URL запроса, по которому учитывается время ответа эндпоинта.
+        :param get: Функция, выполняющая запрос и возвращающая ответ и время ответа.
+        :return: Кортеж (ответ, время ответа в секундах).
+        """
+        if self.__hedge_executor is None:
+            return get()
+        delay = self.latencies[url].percentile(self.hedge_percentile)
+        # Ответ с ошибкой (например, 500) не выигрывает у дублирующего запроса
+        result, hedged = hedged_call(
+            self.__hedge_executor, get, delay, self.hedge_budget,
+            accept=lambda result: result[0].status_code == 200
+        )
+        if hedged:
+            self.logger.debug(f"Отправлен дублирующий запрос на {url} после {delay:.2f} с")
+        return result
 
 
     def get_views_statistics_by_days(
@@ -107,7 +266,7 @@ class CianApi:
         :return: Словарь с данными статистики.
         """
         url = Url.VIEWS_STATISTICS_BY_DAYS.value
-        self.logger.info(f"Отправляем запрос на {url} | offer_id: {offer_id}")
+        self.__log_request("Отправляем запрос на %s | offer_id: %s", url, offer_id)
         params = {
             "dateFrom": date_from,
             "dateTo": date_to,
@@ -135,7 +294,7 @@ class CianApi:
         :return: Словарь с данными чатов.
         """
         url = Url.CHATS.value 
-        self.logger.info(f"Отправляем запрос на {url} | page: {page} | page size: {page_size}]")
+        self.__log_request("Отправляем запрос на %s | page: %s | page size: %s", url, page, page_size)
         params = {
             "page": page,
             "page_size": page_size,
@@ -165,7 +324,7 @@ class CianApi:
         :return: Словарь с данными объявлений.
         """
         url = Url.MY_OFFERS.value
-        self.logger.info(f"Отправляем запрос на {url} | page: {page} | source: {source}]")
+        self.__log_request("Отправляем запрос на %s | page: %s | source: %s", url, page, source)
         params = {
             "page": page,
             "pageSize": page_size,
@@ -184,7 +343,7 @@ class CianApi:
         :raises SendRequestError: Если запрос неуспешен.
         """
         url = Url.MY_OFFERS_DETAI.value
-        self.logger.info(f"Отправляем запрос на {url}")
+        self.__log_request("Отправляем запрос на %s", url)
         params = {
             "offerIds": offer_ids
         }
@@ -199,7 +358,7 @@ class CianApi:
         :raises SendRequestError: Если запрос неуспешен.
         """
         url = Url.AUCTION.value
-        self.logger.info(f"Отправляем запрос на {url}")
+        self.__log_request("Отправляем запрос на %s", url)
         params = {
             "offerIds": offer_ids
         }
@@ -223,7 +382,7 @@ class CianApi:
 
         """
         url = Url.CALLS_REPORT.value
-        self.logger.info(f"Отправляем запрос на {url}")
+        self.__log_request("Отправляем запрос на %s", url)
         params = {
             "dateFrom": date_from,
             "dateTo": date_to,
@@ -233,4 +392,15 @@ class CianApi:
         }
         return self.__send(url, params)
 
-        
\ No newline at end of file
+        
+
+    def get_my_agents(self) -> dict[dict]:
+        """
+        Получает список сотрудников (агентов) агентства.
+
+        :return: Словарь с данными сотрудников.
+        :raises SendRequestError: Если запрос неуспешен.
+        """
+        url = Url.MY_AGENTS.value
+        self.__log_request("Отправляем запрос на %s", url)
+        return self.__send(url, {})
@@ -1,18 +1,40 @@
-import copy
+import dataclasses
 import logging
 import re
 import time
+import zlib
 
 from collections import defaultdict, Counter
-from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from dateutil import parser as dateutil_parser
+from functools import lru_cache, partial
 from itertools import islice
+from typing import Callable, Iterable, Iterator
 
 from .cian_api import CianApi
 from .datacls import OfferStatistics
+from .dead_letter import DeadLetterQueue
+from .memory import MemoryGuard, RowSpill
+from .pipeline import Stage
 
 # Регулярное выражение для извлечения типа недвижимости и площади из строки
 PATTERN = r'(.+?),\s(.+?\s(?:м²|сот\.))'
+# Максимальный период (в днях), который принимает get-views-statistics-by-days
+MAX_DAYS_PER_REQUEST = 180
+# Количество объявлений в одном запросе get-my-offers-detail и get-auction
+DETAILS_CHUNK_SIZE = 100
+AUCTION_CHUNK_SIZE = 20
+# Пауза после запроса страницы, пачки или объявления (секунды)
+REQUEST_PAUSE = 0.2
+# Статусы снятых с публикации объявлений, которые учитываются с include_inactive
+INACTIVE_STATUSES = ["inactive", "removedByModerator"]
+# Размер страницы чатов и звонков
+EVENTS_PAGE_SIZE = 50
+# Количество сотрудников, чаты и звонки которых загружаются одновременно
+EMPLOYEE_WORKERS = 8
+# Количество подряд неудачных страниц, после которого постраничная загрузка прекращается
+MAX_FAILED_PAGES = 3
 
 def chunk_list(data, chunk_size):
     """
@@ -26,52 +48,223 @@ def chunk_list(data, chunk_size):
     for _ in range(0, len(data), chunk_size):
         yield list(islice(it, chunk_size))
 
+def split_date_range(
+        date_from: datetime,
+        date_to: datetime,
+        max_days: int = MAX_DAYS_PER_REQUEST
+) -> list[tuple[datetime, datetime]]:
+    """
+    Разбивает период на окна, длина каждого из которых не превышает max_days дней.
+
+    :param date_from: Дата начала периода.
+    :param date_to: Дата окончания периода.
+    :param max_days: Максимальная длина окна в днях.
+    :return: Список кортежей (начало, конец) для каждого окна, без пересечений.
+    """
+    windows = []
+    window_start = date_from
+    while window_start <= date_to:
+        window_end = min(window_start + timedelta(days=max_days), date_to)
+        windows.append((window_start, window_end))
+        window_start = window_end + timedelta(days=1)
+    return windows
+
+def run_or_defer(
+        dead_letters: DeadLetterQueue | None,
+        stage: str,
+        key,
+        request: Callable[[], object]
+) -> None:
+    """
+    Выполняет запрос элемента. При ошибке элемент попадает в очередь dead_letters для повтора.
+
+    :param dead_letters: Очередь элементов с ошибками. Если не указана, ошибка пробрасывается.
+    :param stage: Этап сбора данных.
+    :param key: Идентификатор элемента.
+    :param request: Функция, выполняющая запрос и сохраняющая результат.
+    """
+    if dead_letters is None:
+        request()
+        return
+    try:
+        request()
+    except Exception as _ex:
+        dead_letters.add(stage, key, _ex, request)
+
+def paginate(
+        load_page: Callable[[int], bool],
+        stage: str,
+        dead_letters: DeadLetterQueue | None = None,
+        label: str = None,
+        max_pages: int = None
+) -> None:
+    """
+    Последовательно загружает страницы, пока load_page возвращает True.
+
+    Если указана очередь dead_letters, неудачная страница попадает в нее, а загрузка
+    продолжается со следующей страницы. После MAX_FAILED_PAGES неудачных страниц подряд
+    загрузка прекращается.
+
+    :param load_page: Функция, загружающая страницу по номеру. Возвращает False, если страниц больше нет.
+    :param stage: Этап сбора данных.
+    :param dead_letters: Очередь элементов с ошибками. Если не указана, ошибка пробрасывается.
+    :param label: Уточнение для ключа страницы в очереди (например, ID сотрудника).
+    :param max_pages: Максимальное количество страниц (по умолчанию - без ограничения).
+    """
+    page = 1
+    failed_pages = 0
+    while True:
+        if dead_letters is None:
+            has_next = load_page(page)
+        else:
+            try:
+                has_next = load_page(page)
+                failed_pages = 0
+            except Exception as _ex:
+                key = f"page: {page}" if label is None else f"{label} | page: {page}"
+                dead_letters.add(stage, key, _ex, partial(load_page, page))
+                failed_pages += 1
+                has_next = failed_pages < MAX_FAILED_PAGES
+                if not has_next:
+                    dead_letters.logger.error(
+                        f"Этап {stage}: {failed_pages} страниц подряд с ошибкой, загрузка прекращена!"
+                    )
+        if not has_next or page == max_pages:
+            break
+        page += 1
+
+def offer_in_shard(listing_id: int, shard: tuple[int, int]) -> bool:
+    """
+    Проверяет, относится ли объявление к шарду. 
+
+    Используется crc32 от ID объявления, поэтому разбиение одинаково на всех машинах 
+    и при каждом запуске (в отличие от встроенной hash()).
+
+    :param listing_id: ID объявления.
+    :param shard: Кортеж (номер шарда, количество шардов), номер шарда начинается с 0.
+    :return: True, если объявление относится к шарду.
+    """
+    index, count = shard
+    return zlib.crc32(str(listing_id).encode()) % count == index
+
 def fetch_all_my_offer_ids(
         cian: CianApi, 
-        logger: logging
+        logger: logging.Logger,
+        dead_letters: DeadLetterQueue = None,
+        include_inactive: bool = False
 ) -> list[OfferStatistics]:
     """
     Получает все идентификаторы объявлений пользователя из всех источников ('upload' и 'manual').
 
+    Если указана очередь dead_letters, неудачные страницы повторяются сразу после загрузки
+    всех страниц, а те, что снова не удались, остаются в очереди.
+
     :param cian: Объект класса CianApi для взаимодействия с API Cian.
     :param logger: Логгер для записи ошибок.
+    :param dead_letters: Очередь элементов с ошибками.
+    :param include_inactive: Дополнительно загрузить снятые с публикации объявления (INACTIVE_STATUSES).
     :return: Список объектов OfferStatistics с информацией о идентификаторах объявлений и датах публикации.
+    Объявление, попавшее на несколько страниц (например, при повторе страницы после
+    сдвига выдачи), учитывается один раз.
     """
-    my_offers_id = []
-    
-    for source in ["upload", "manual"]:
-        page = 1
-        while True:
-            try:
-                response = cian.get_my_offers(page=page, source=source)
-                result = response.get("result").get("announcements")
-                
-                if not result:
-                    break
-                
-                my_offers_id.extend(
-                    [
-                        OfferStatistics(
-                            listing_id =offer.get("id"), 
-                            publish_date = dateutil_parser.parse(
-                                offer.get("creationDate")
-                            ).strftime("%d.%m.%Y %H:%M:%S")
-                        )  
-                        for offer in result
-                    ]
+    my_offers_id = {}
+    status_groups = {"": ["published"]}
+    if include_inactive:
+        status_groups[", inactive"] = INACTIVE_STATUSES
+
+    def load_page(source: str, group: str, page: int) -> bool:
+        response = cian.get_my_offers(page=page, source=source, statuses=status_groups[group])
+        result = response.get("result").get("announcements")
+        if not result:
+            return False
+        for offer in result:
+            my_offers_id.setdefault(
+                offer.get("id"),
+                OfferStatistics(
+                    listing_id =offer.get("id"), 
+                    publish_date = dateutil_parser.parse(
+                        offer.get("creationDate")
+                    ).strftime("%d.%m.%Y %H:%M:%S")
                 )
-                page += 1
-                time.sleep(0.2)
-            except Exception as _ex:
-                logger.error(f"Ошибка при получении объявлений: {_ex}")
-                break
+            )
+        time.sleep(REQUEST_PAUSE)
+        return True
+
+    def load_page_or_stop(source: str, group: str, page: int) -> bool:
+        try:
+            return load_page(source, group, page)
+        except Exception as _ex:
+            logger.error(f"Ошибка при получении объявлений: {_ex}")
+            return False
+    
+    for group in status_groups:
+        for source in ["upload", "manual"]:
+            if dead_letters is None:
+                paginate(partial(load_page_or_stop, source, group), "ids")
+            else:
+                paginate(partial(load_page, source, group), f"ids ({source}{group})", dead_letters)
+
+    if dead_letters is not None:
+        dead_letters.retry(
+            *(f"ids ({source}{group})" for group in status_groups for source in ["upload", "manual"])
+        )
+    return list(my_offers_id.values())
+
+def offer_window(
+        offer: OfferStatistics,
+        date_from: datetime,
+        date_to: datetime
+) -> tuple[datetime, datetime] | None:
+    """
+    Сужает период статистики объявления до дней после его создания:
+    [max(date_from, дата создания), date_to].
+
+    Конец периода не сужается: get-my-offers не возвращает дату снятия с публикации
+    (editDate - дата последнего изменения, она может быть и раньше, и позже снятия),
+    поэтому снятые объявления учитываются до конца периода.
+
+    :param offer: Объект OfferStatistics с датой публикации (publish_date).
+    :param date_from: Дата начала периода.
+    :param date_to: Дата окончания периода.
+    :return: Кортеж (начало, конец) или None, если объявление создано после окончания периода.
+    """
+    window_start = date_from
+    if offer.publish_date:
+        # Дата публикации хранится без часового пояса (время из creationDate)
+        created = datetime.strptime(offer.publish_date, "%d.%m.%Y %H:%M:%S")
+        created = created.replace(hour=0, minute=0, second=0, tzinfo=date_from.tzinfo)
+        window_start = max(window_start, created)
+    if window_start.date() > date_to.date():
+        return None
+    return window_start, date_to
+
+def prune_offers(
+        offers: list[OfferStatistics],
+        date_from: datetime,
+        date_to: datetime
+) -> tuple[list[OfferStatistics], dict[int, tuple[datetime, datetime]]]:
+    """
+    Отбрасывает объявления, созданные после окончания периода, и сужает период остальных (см. offer_window).
 
-    return my_offers_id
+    :param offers: Список объектов OfferStatistics.
+    :param date_from: Дата начала периода.
+    :param date_to: Дата окончания периода.
+    :return: Кортеж (объявления в периоде, словарь: ID объявления -> период статистики).
+    """
+    kept, windows = [], {}
+    for offer in offers:
+        window = offer_window(offer, date_from, date_to)
+        if window is None:
+            continue
+        kept.append(offer)
+        windows[offer.listing_id] = window
+    return kept, windows
 
 def fetch_all_my_offers_detail(
         cian: CianApi, 
         offers: list[OfferStatistics], 
-        logger: logging
+        logger: logging.Logger,
+        dead_letters: DeadLetterQueue = None
 ) -> list[OfferStatistics]:
     """
     Получает детальную информацию по каждому объявлению из списка.
@@ -79,13 +272,14 @@ def fetch_all_my_offers_detail(
     :param cian: Объект класса CianApi для взаимодействия с API Cian.
     :param offers: Список объектов OfferStatistics с идентификаторами объявлений.
     :param logger: Логгер для записи ошибок и предупреждений.
+    :param dead_letters: Очередь элементов с ошибками. Если указана, неудачные пачки объявлений 
+    попадают в нее, а сбор продолжается.
     :return: Список объектов OfferStatistics с обновленной информацией по каждому объявлению.
     """
     offers_dict = {offer.listing_id: offer for offer in offers}
-    for chunk in chunk_list(offers, 100):
-        result = cian.get_my_offers_detail(
-            [offer.listing_id for offer in chunk]
-        )
+
+    def load_chunk(offer_ids: list[int]):
+        result = cian.get_my_offers_detail(offer_ids)
         for offer_detail in result.get("result").get("offers"):
             offer = offers_dict[offer_detail.get("id")]
             url_offer = offer_detail.get("url")
@@ -95,25 +289,30 @@ def fetch_all_my_offers_detail(
             elif "sale" in url_offer:
                 offer.offers = "Продажа"
             else:
-                logging.warning(f"Не удалось найти offers: url - {url_offer}")
+                logger.warning(f"Не удалось найти offers: url - {url_offer}")
 
             match = re.match(PATTERN, offer_detail.get("title"))
             if match:
                 offer.property_type = match.group(1).strip()
                 offer.area = match.group(2).strip().replace('\xa0', ' ')
             else:
-                logging.warning(f"Не удалось тип и площадь: title - {offer_detail.get('title')} ")
+                logger.warning(f"Не удалось тип и площадь: title - {offer_detail.get('title')} ")
             
             offer.listing_url = url_offer
             offer.address = offer_detail.get("address")
-        time.sleep(0.2)
+
+    for chunk in chunk_list(offers, DETAILS_CHUNK_SIZE):
+        offer_ids = [offer.listing_id for offer in chunk]
+        run_or_defer(dead_letters, "details", offer_ids, partial(load_chunk, offer_ids))
+        time.sleep(REQUEST_PAUSE)
 
     return list(offers_dict.values())
         
 def fetch_all_my_offers_auction(
         cian: CianApi,
         offers: list[OfferStatistics],
-        logger: logging
+        logger: logging.Logger,
+        dead_letters: DeadLetterQueue = None
 ) -> list[OfferStatistics]:
     """
     Получает информацию об аукционах по списку предложений и обновляет информацию в offers.
@@ -121,20 +320,165 @@ def fetch_all_my_offers_auction(
     :param cian: Объект класса CianApi для взаимодействия с API Cian.
     :param offers: Список объектов OfferStatistics с идентификаторами объявлений.
     :param logger: Логгер для записи ошибок.
+    :param dead_letters: Очередь элементов с ошибками. Если указана, неудачные пачки объявлений 
+    попадают в нее, а сбор продолжается.
     :return: Список объектов OfferStatistics с обновленной информацией об аукционах.
     """
     offers_dict = {offer.listing_id: offer for offer in offers}
-    for chunk in chunk_list(offers, 20):  
-        result = cian.get_auction([offer.listing_id for offer in chunk])
+
+    def load_chunk(offer_ids: list[int]):
+        result = cian.get_auction(offer_ids)
         for offer_auction in result.get("result").get("items"):
             offer = offers_dict[offer_auction.get("offerId")]
             offer.auction_points = offer_auction.get("currentBet")
 
-        
-        time.sleep(0.2)
+    for chunk in chunk_list(offers, AUCTION_CHUNK_SIZE):
+        offer_ids = [offer.listing_id for offer in chunk]
+        run_or_defer(dead_letters, "auction", offer_ids, partial(load_chunk, offer_ids))
+        time.sleep(REQUEST_PAUSE)
 
     return list(offers_dict.values())
 
+def fetch_views_by_days(
+        cian: CianApi,
+        date_from: datetime,
+        date_to: datetime,
+        offer_id: int
+) -> tuple[dict[str, int], dict[str, int]]:
+    """
+    Получает статистику просмотров и добавлений в избранное объявления по дням за период.
+
+    Если период длиннее MAX_DAYS_PER_REQUEST дней, он разбивается на окна, 
+    которые запрашиваются параллельно, а результаты объединяются по дате.
+
+    :param cian: Экземпляр класса CianApi для взаимодействия с API.
+    :param date_from: Дата начала периода для получения статистики.
+    :param date_to: Дата окончания периода для получения статистики.
+    :param offer_id: Идентификатор объявления.
+    :return: Кортеж из двух словарей: дата -> просмотры и дата -> добавления в избранное.
+    """
+    windows = split_date_range(date_from, date_to)
+    with ThreadPoolExecutor(max_workers=len(windows)) as executor:
+        results = list(
+            executor.map(
+                lambda window: cian.get_views_statistics_by_days(
+                    window[0].strftime("%Y-%m-%d"),
+                    window[1].strftime("%Y-%m-%d"),
+                    offer_id
+                ),
+                windows
+            )
+        )
+
+    views_dict = {}
+    favorites_dict = {}
+    for result in results:
+        for entry in result['result'].get('viewsByDays') or []:
+            views_dict[entry['date']] = entry['views']
+        for entry in result['result'].get('addToFavoritesByDays') or []:
+            favorites_dict[entry['date']] = entry['addToFavorites']
+    time.sleep(REQUEST_PAUSE)
+    return views_dict, favorites_dict
+
+def fetch_all_views_by_days(
+        cian: CianApi,
+        date_from: datetime,
+        date_to: datetime,
+        offers: list[OfferStatistics],
+        dead_letters: DeadLetterQueue = None,
+        sink: Callable[[int, tuple[dict[str, int], dict[str, int]]], None] = None,
+        windows: dict[int, tuple[datetime, datetime]] = None
+) -> dict[int, tuple[dict[str, int], dict[str, int]]]:
+    """
+    Получает статистику просмотров по дням для всех объявлений из списка.
+
+    :param cian: Экземпляр класса CianApi для взаимодействия с API.
+    :param date_from: Дата начала периода для получения статистики.
+    :param date_to: Дата окончания периода для получения статистики.
+    :param offers: Список объектов OfferStatistics с идентификаторами объявлений.
+    :param dead_letters: Очередь элементов с ошибками. Если указана, неудачные объявления 
+    попадают в нее, а сбор продолжается.
+    :param sink: Функция, принимающая ID объявления и результат fetch_views_by_days. Если указана,
+    статистика передается в нее сразу после получения и не накапливается в словаре.
+    :param windows: Периоды статистики отдельных объявлений (см. prune_offers). Для объявлений,
+    которых нет в словаре, используется весь период.
+    :return: Словарь: ID объявления -> результат fetch_views_by_days (пустой, если указан sink).
+    """
+    views_by_offer = {}
+    windows = windows or {}
+
+    def load_offer(offer_id: int):
+        offer_from, offer_to = windows.get(offer_id, (date_from, date_to))
+        views = fetch_views_by_days(cian, offer_from, offer_to, offer_id)
+        if sink is None:
+            views_by_offer[offer_id] = views
+        else:
+            sink(offer_id, views)
+
+    for offer in offers:
+        run_or_defer(dead_letters, "views", offer.listing_id, partial(load_offer, offer.listing_id))
+    return views_by_offer
+
+@lru_cache(maxsize=4096)
+def format_report_date(date_view: str) -> str:
+    """
+    Преобразует дату из ответа API в формат отчета "DD.MM.YYYY".
+
+    Даты одинаковы для всех объявлений периода, поэтому результат кэшируется.
+
+    :param date_view: Дата из статистики просмотров.
+    :return: Дата в формате "DD.MM.YYYY".
+    """
+    return dateutil_parser.parse(date_view).strftime("%d.%m.%Y")
+
+def build_offer_days(
+        offer: OfferStatistics,
+        views_dict: dict[str, int],
+        favorites_dict: dict[str, int]
+) -> list[OfferStatistics]:
+    """
+    Создает по одному клону объявления на каждый день статистики просмотров.
+
+    Все поля OfferStatistics неизменяемые (строки и числа), поэтому клоны создаются
+    поверхностным копированием и ссылаются на те же строки URL, адреса и типа.
+
+    :param offer: Объект OfferStatistics с заполненными данными объявления.
+    :param views_dict: Словарь: дата -> количество просмотров.
+    :param favorites_dict: Словарь: дата -> количество добавлений в избранное.
+    :return: Список клонированных и обновленных объектов OfferStatistics.
+    """
+    return [
+        dataclasses.replace(
+            offer,
+            report_date=format_report_date(date_view),
+            views=views_dict[date_view],
+            likes=favorites_dict.get(date_view)
+        )
+        for date_view in sorted(views_dict)
+    ]
+
+def join_offers_with_views(
+        offers: list[OfferStatistics],
+        views_by_offer: dict[int, tuple[dict[str, int], dict[str, int]]]
+) -> list[OfferStatistics]:
+    """
+    Объединяет данные объявлений со статистикой просмотров по дням.
+
+    Статистика каждого объявления удаляется из views_by_offer сразу после обработки, 
+    чтобы просмотры и строки отчета не занимали память одновременно.
+
+    :param offers: Список объектов OfferStatistics с заполненными данными объявлений.
+    :param views_by_offer: Результат fetch_all_views_by_days.
+    :return: Список объектов OfferStatistics, по одному на каждое объявление и день статистики.
+    """
+    updated_offers = []
+    for offer in offers:
+        if offer.listing_id in views_by_offer:
+            updated_offers.extend(
+                build_offer_days(offer, *views_by_offer.pop(offer.listing_id))
+            )
+    return updated_offers
+
 def update_my_offer_with_views_data(
         cian: CianApi,
         date_from: datetime,
@@ -151,61 +495,93 @@ def update_my_offer_with_views_data(
     
     :return: Список клонированных и обновленных объектов OfferStatistics, по одному на каждый день статистики.
     """
-    result = cian.get_views_statistics_by_days(
-        date_from.strftime("%Y-%m-%d"),
-        date_to.strftime("%Y-%m-%d"),
-        offer.listing_id
+    window = offer_window(offer, date_from, date_to)
+    if window is None:
+        return []
+    return build_offer_days(
+        offer, 
+        *fetch_views_by_days(cian, *window, offer.listing_id)
     )
-    views_by_days = result['result'].get('viewsByDays')
-    favorites_by_days = result['result'].get('addToFavoritesByDays')
 
-    favorites_dict = {entry['date']: entry['addToFavorites'] for entry in favorites_by_days}
-    
-    updated_offers = []
-    for view_data in views_by_days:
-        cloned_offer = copy.deepcopy(offer)
-        cloned_offer.report_date = dateutil_parser.parse(
-            view_data['date']
-        ).strftime("%d.%m.%Y")
-        cloned_offer.views = view_data['views']
-        cloned_offer.likes = favorites_dict.get(view_data['date'])
-        updated_offers.append(cloned_offer)
-    time.sleep(0.2)
-    return updated_offers
+def fetch_employee_ids(cian: CianApi) -> list[int]:
+    """
+    Получает идентификаторы сотрудников агентства.
+
+    Список содержит только текущих сотрудников: чаты и звонки владельца аккаунта и удаленных
+    сотрудников в выдачу по сотрудникам не попадают (см. merge_unpartitioned).
+
+    :param cian: Экземпляр класса CianApi для взаимодействия с API.
+    :return: Список ID сотрудников без повторов.
+    """
+    agents = cian.get_my_agents().get("result", {}).get("agents") or []
+    employee_ids = []
+    for agent in agents:
+        employee_id = agent.get("id") or agent.get("userId")
+        if employee_id is not None and employee_id not in employee_ids:
+            employee_ids.append(employee_id)
+    return employee_ids
+
+def fetch_by_employees(
+        fetch: Callable[[int], object],
+        employee_ids: list[int],
+        max_workers: int = EMPLOYEE_WORKERS
+) -> list:
+    """
+    Выполняет постраничную загрузку отдельно по каждому сотруднику, параллельно.
+
+    :param fetch: Функция загрузки, принимающая ID сотрудника.
+    :param employee_ids: Список ID сотрудников.
+    :param max_workers: Количество одновременно загружаемых сотрудников.
+    :return: Список результатов fetch в порядке employee_ids.
+    """
+    if not employee_ids:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(employee_ids))) as executor:
+        return list(executor.map(fetch, employee_ids))
 
 def fetch_filtered_chats(
         cian: CianApi, 
         date_from: datetime, 
-        page_size: int = 50
-) -> list[dict]:
+        page_size: int = EVENTS_PAGE_SIZE,
+        dead_letters: DeadLetterQueue = None,
+        employee_id: int = None,
+        max_pages: int = None,
+        chats: dict = None
+) -> dict[object, dict]:
     """
     Получает все свежие чаты с сервера CianApi постранично, начиная с первой страницы.
     
     Прерывает загрузку, если дата последнего обновления чата (updatedAt) больше или равна указанной date_from.
     
-    Возвращает список словарей с полями chatId, updatedAt и offerId для всех отфильтрованных чатов.
+    Возвращает словарь с полями chatId, updatedAt и offerId для всех отфильтрованных чатов.
+    Страницы из очереди dead_letters при повторе дописывают чаты в этот же словарь, поэтому
+    результат нужно читать после повтора этапа "chats".
     
     :param cian: Экземпляр класса CianApi для взаимодействия с API.
     :param date_from: Дата, до которой нужно получить данные (чаты).
     :param page_size: Размер страницы для пагинации.
-    :return: Список словарей с полями chatId, updatedAt и offerId для всех отфильтрованных чатов.
+    :param dead_letters: Очередь элементов с ошибками. Если указана, неудачные страницы 
+    попадают в нее, а загрузка продолжается.
+    :param employee_id: ID сотрудника. Если указан, загружаются только чаты этого сотрудника.
+    :param max_pages: Максимальное количество страниц (по умолчанию - все страницы).
+    :param chats: Словарь, в который добавляются чаты (по умолчанию - новый словарь).
+    :return: Словарь: chatId -> словарь с полями chatId, updatedAt и offerId. Чат, попавший 
+    на несколько страниц (например, при повторе страницы после сдвига выдачи), учитывается 
+    один раз.
     """
-    all_chats = []
-    page = 1
-    loop = True
+    all_chats = {} if chats is None else chats
     if date_from.tzinfo is None:
         date_from = date_from.replace(tzinfo=timezone.utc)
-    
-    while loop:
-        all_msg = cian.get_chats(page, page_size=page_size)
+
+    def load_page(page: int) -> bool:
+        all_msg = cian.get_chats(page, page_size=page_size, employee_id=employee_id)
         chats = all_msg.get("result").get("chats")
         if not chats:
-            break
+            return False
         for chat in chats:
             updated_at = dateutil_parser.parse(chat.get("updatedAt"))
             if updated_at <= date_from:
-                loop = False
-                break
+                return False
             
             if chat.get("lastMessage").get("direction") != "in":
                 continue
@@ -215,10 +591,103 @@ def fetch_filtered_chats(
                 "updatedAt": updated_at.strftime("%d.%m.%Y"),
                 "offerId": chat.get("offer", {}).get("id")
             }
-            all_chats.append(chat_data)
-        page += 1
+            all_chats.setdefault(chat_data["chatId"], chat_data)
+        return True
+
+    label = None if employee_id is None else f"employee: {employee_id}"
+    paginate(load_page, "chats", dead_letters, label, max_pages)
     return all_chats
 
+def merge_unpartitioned(
+        events: dict,
+        fetch_sample: Callable[[], dict],
+        fetch_all: Callable[[], dict],
+        kind: str,
+        logger: logging.Logger = None
+) -> dict:
+    """
+    Сверяет события, загруженные по сотрудникам, с первой страницей выдачи по всему агентству.
+
+    Выдача по сотрудникам не содержит событий владельца аккаунта и удаленных сотрудников.
+    Если хотя бы одного события первой страницы общей выдачи нет среди загруженных, 
+    загружается вся общая выдача и недостающие события добавляются по ключу. Проверяются 
+    только последние события, поэтому более старые потери обнаруживаются, только если 
+    они есть и среди последних.
+
+    :param events: События, загруженные по сотрудникам: ключ события -> событие.
+    :param fetch_sample: Загрузка первой страницы общей выдачи (словарь в том же формате).
+    :param fetch_all: Загрузка всей общей выдачи (словарь в том же формате). Может дописывать
+    события прямо в events, чтобы в него попали и страницы, повторенные позже из очереди 
+    dead_letters.
+    :param kind: Название событий для лога ("чатов", "звонков").
+    :param logger: Логгер для записи расхождений.
+    :return: Словарь events, дополненный недостающими событиями.
+    """
+    logger = logger or logging.getLogger(__name__)
+    try:
+        sample = fetch_sample()
+    except Exception as _ex:
+        logger.warning(f"Не удалось сверить загрузку {kind} по сотрудникам с общей выдачей: {_ex}")
+        return events
+    missing = sum(key not in events for key in sample)
+    if not missing:
+        return events
+    logger.warning(
+        f"На первой странице общей выдачи {kind} нет в выдаче по сотрудникам: {missing} из {len(sample)}. "\
+        f"Загружается общая выдача {kind} по всему агентству"
+    )
+    for key, event in fetch_all().items():
+        events.setdefault(key, event)
+    return events
+
+def fetch_chats_by_employees(
+        cian: CianApi,
+        date_from: datetime,
+        employee_ids: list[int],
+        page_size: int = EVENTS_PAGE_SIZE,
+        dead_letters: DeadLetterQueue = None,
+        logger: logging.Logger = None
+) -> dict[object, dict]:
+    """
+    Получает свежие чаты отдельно по каждому сотруднику (параллельно) и объединяет их.
+
+    Чат, попавший в выдачу нескольких сотрудников, учитывается один раз (по chatId).
+    Результат сверяется с первой страницей выдачи по всему агентству (см. merge_unpartitioned).
+    Все загрузки пишут в один словарь, поэтому в него попадают и повторенные позже страницы.
+
+    :param cian: Экземпляр класса CianApi для взаимодействия с API.
+    :param date_from: Дата, до которой нужно получить данные (чаты).
+    :param employee_ids: Список ID сотрудников.
+    :param page_size: Размер страницы для пагинации.
+    :param dead_letters: Очередь элементов с ошибками.
+    :param logger: Логгер для записи расхождений с выдачей по всему агентству.
+    :return: Словарь чатов в формате fetch_filtered_chats.
+    """
+    chats = {}
+    fetch_by_employees(
+        lambda employee_id: fetch_filtered_chats(
+            cian, date_from, page_size, dead_letters, employee_id, chats=chats
+        ),
+        employee_ids
+    )
+    merge_unpartitioned(
+        chats,
+        lambda: fetch_filtered_chats(cian, date_from, page_size, max_pages=1),
+        lambda: fetch_filtered_chats(cian, date_from, page_size, dead_letters, chats=chats),
+        "чатов",
+        logger
+    )
+    return chats
+
+
+def count_chats(chats: list[dict]) -> Counter:
+    """
+    Считает количество чатов по объявлению и дате.
+
+    :param chats: Список словарей с информацией о чатах, содержащих chatId, updatedAt и offerId.
+    :return: Счетчик: (ID объявления, дата "DD.MM.YYYY") -> количество чатов.
+    """
+    return Counter((chat["offerId"], chat["updatedAt"]) for chat in chats)
 
 def update_my_offer_with_chats(
         offers: list[OfferStatistics], 
@@ -231,57 +700,173 @@ def update_my_offer_with_chats(
     :param chats: Список словарей с информацией о чатах, содержащих chatId, updatedAt и offerId.
     :return: Обновленный список объектов OfferStatistics.
     """
-    for chat in chats:
-        for offer_stat in offers:
-            if (offer_stat.listing_id == chat["offerId"] and 
-                offer_stat.report_date == chat["updatedAt"]
-            ):
-                offer_stat.chats += 1
+    chats_count = count_chats(chats)
+    for offer_stat in offers:
+        offer_stat.chats += chats_count.get((offer_stat.listing_id, offer_stat.report_date), 0)
     return offers
 
-def fetch_filtered_calls(
+def call_key(call: dict) -> object:
+    """
+    Возвращает идентификатор звонка для удаления повторов.
+
+    Если в записи нет ID звонка, идентификатором служит вся запись.
+
+    :param call: Запись звонка из get_calls_report.
+    :return: ID звонка или кортеж из полей записи.
+    """
+    key = call.get("callId") or call.get("id")
+    if key is not None:
+        return key
+    return tuple(sorted((name, str(value)) for name, value in call.items()))
+
+def fetch_calls(
         cian: CianApi,
         date_from: datetime,
         date_to: datetime,
-        page_size: int = 50
-) -> dict[int, list[str]]:
+        page_size: int = EVENTS_PAGE_SIZE,
+        dead_letters: DeadLetterQueue = None,
+        employee_id: int = None,
+        max_pages: int = None,
+        calls: dict = None
+) -> dict[object, tuple[int, str]]:
     """
-    Получает данные о звонках с фильтрацией по статусу и дате, разбивая их на страницы.
+    Получает успешные звонки по объявлениям за период, разбивая их на страницы.
+
+    Страницы из очереди dead_letters при повторе дописывают звонки в возвращенный словарь,
+    поэтому группировать звонки (см. group_calls) нужно после повтора этапа "calls".
 
     :param cian: Экземпляр класса CianApi для взаимодействия с API.
     :param date_from: Дата начала периода для фильтрации звонков.
     :param date_to: Дата окончания периода для фильтрации звонков.
     :param page_size: Количество элементов на одной странице (по умолчанию 50).
-    
-    :return: Словарь, где ключом является ID объявления (offer_id), 
-             а значением - список строк, содержащих даты звонков в формате "DD.MM.YYYY".
+    :param dead_letters: Очередь элементов с ошибками. Если указана, неудачные страницы 
+    попадают в нее, а загрузка продолжается.
+    :param employee_id: ID сотрудника. Если указан, загружаются только звонки этого сотрудника.
+    :param max_pages: Максимальное количество страниц (по умолчанию - все страницы).
+    :param calls: Словарь, в который добавляются звонки (по умолчанию - новый словарь).
+    :return: Словарь: идентификатор звонка (см. call_key) -> (ID объявления, дата "DD.MM.YYYY").
     """
-    page = 1
-    calls_data = defaultdict(list)
-    while True:
+    calls = {} if calls is None else calls
+
+    def load_page(page: int) -> bool:
         response = cian.get_calls_report(
             page, 
             page_size, 
             date_from.strftime("%Y-%m-%d"), 
-            date_to.strftime("%Y-%m-%d")
+            date_to.strftime("%Y-%m-%d"),
+            employee_id
         )
         calls_response = response.get("result").get("calls")
         if not calls_response:
-            break
+            return False
         for call in calls_response:
             if call.get("status") != "success":
                 continue
             if not call.get("offer"):
                 continue
-            calls_data[call.get("offer").get("id")].append(
+            calls[call_key(call)] = (
+                call.get("offer").get("id"),
                 dateutil_parser.parse(
                     call.get("date")
                 ).strftime("%d.%m.%Y")
             )
-        page+=1
-        
+        return True
+
+    label = None if employee_id is None else f"employee: {employee_id}"
+    paginate(load_page, "calls", dead_letters, label, max_pages)
+    return calls
+
+def group_calls(calls: dict[object, tuple[int, str]]) -> dict[int, list[str]]:
+    """
+    Группирует звонки по объявлениям.
+
+    :param calls: Результат fetch_calls.
+    :return: Словарь: ID объявления -> список дат звонков в формате "DD.MM.YYYY".
+    """
+    calls_data = defaultdict(list)
+    for offer_id, date_call in calls.values():
+        calls_data[offer_id].append(date_call)
     return calls_data
 
+def fetch_filtered_calls(
+        cian: CianApi,
+        date_from: datetime,
+        date_to: datetime,
+        page_size: int = EVENTS_PAGE_SIZE,
+        dead_letters: DeadLetterQueue = None
+) -> dict[int, list[str]]:
+    """
+    Получает данные о звонках с фильтрацией по статусу и дате, разбивая их на страницы.
+
+    Звонки группируются сразу, поэтому страницы, повторенные позже из очереди dead_letters,
+    в результат не попадают. При сборе с повтором используются fetch_calls и group_calls.
+
+    :param cian: Экземпляр класса CianApi для взаимодействия с API.
+    :param date_from: Дата начала периода для фильтрации звонков.
+    :param date_to: Дата окончания периода для фильтрации звонков.
+    :param page_size: Количество элементов на одной странице (по умолчанию 50).
+    :param dead_letters: Очередь элементов с ошибками. Если указана, неудачные страницы 
+    попадают в нее, а загрузка продолжается.
+    
+    :return: Словарь, где ключом является ID объявления (offer_id), 
+             а значением - список строк, содержащих даты звонков в формате "DD.MM.YYYY".
+    """
+    return group_calls(fetch_calls(cian, date_from, date_to, page_size, dead_letters))
+
+def fetch_calls_by_employees(
+        cian: CianApi,
+        date_from: datetime,
+        date_to: datetime,
+        employee_ids: list[int],
+        page_size: int = EVENTS_PAGE_SIZE,
+        dead_letters: DeadLetterQueue = None,
+        logger: logging.Logger = None
+) -> dict[object, tuple[int, str]]:
+    """
+    Получает звонки отдельно по каждому сотруднику (параллельно) и объединяет их.
+
+    Повторы удаляются по идентификатору звонка.
+    Результат сверяется с первой страницей выдачи по всему агентству (см. merge_unpartitioned).
+    Все загрузки пишут в один словарь, поэтому в него попадают и повторенные позже страницы.
+
+    :param cian: Экземпляр класса CianApi для взаимодействия с API.
+    :param date_from: Дата начала периода для фильтрации звонков.
+    :param date_to: Дата окончания периода для фильтрации звонков.
+    :param employee_ids: Список ID сотрудников.
+    :param page_size: Количество элементов на одной странице.
+    :param dead_letters: Очередь элементов с ошибками.
+    :param logger: Логгер для записи расхождений с выдачей по всему агентству.
+    :return: Словарь звонков в формате fetch_calls.
+    """
+    calls = {}
+    fetch_by_employees(
+        lambda employee_id: fetch_calls(
+            cian, date_from, date_to, page_size, dead_letters, employee_id, calls=calls
+        ),
+        employee_ids
+    )
+    merge_unpartitioned(
+        calls,
+        lambda: fetch_calls(cian, date_from, date_to, page_size, max_pages=1),
+        lambda: fetch_calls(cian, date_from, date_to, page_size, dead_letters, calls=calls),
+        "звонков",
+        logger
+    )
+    return calls
+
+def count_calls(calls_data: dict[int, list]) -> Counter:
+    """
+    Считает количество звонков по объявлению и дате.
+
+    :param calls_data: Результат fetch_filtered_calls.
+    :return: Счетчик: (ID объявления, дата "DD.MM.YYYY") -> количество звонков.
+    """
+    return Counter(
+        (offer_id, date_call)
+        for offer_id, dates in calls_data.items()
+        for date_call in dates
+    )
+
 def update_my_offer_with_calls(
         offers: list[OfferStatistics],
         calls_data: dict[int, list]
@@ -295,20 +880,202 @@ def update_my_offer_with_calls(
     
     :return: Обновленный список объектов OfferStatistics с добавленным количеством звонков.
     """
+    calls_count = count_calls(calls_data)
     for offer in offers:
-        if offer.listing_id in calls_data:
-            calls_list = Counter(calls_data.get(offer.listing_id))
-            if offer.report_date in calls_list:
-                offer.calls = calls_data.get(offer.report_date)
-            for date_call, count_call in calls_list.items():
-                if offer.report_date == date_call:
-                    offer.calls = count_call
-                    break
+        key = (offer.listing_id, offer.report_date)
+        if key in calls_count:
+            offer.calls = calls_count[key]
     return offers
 
-    
-        
-        
+def attribute_events(
+        offers: Iterable[OfferStatistics],
+        chats: list[dict],
+        calls_data: dict[int, list]
+) -> Iterator[OfferStatistics]:
+    """
+    Построчно добавляет к объявлениям количество чатов и звонков.
 
-    
-    
\ No newline at end of file
+    В отличие от update_my_offer_with_chats и update_my_offer_with_calls не требует,
+    чтобы все строки находились в памяти, поэтому подходит для строк, перенесенных на диск.
+
+    :param offers: Строки OfferStatistics.
+    :param chats: Список чатов из результата fetch_filtered_chats.
+    :param calls_data: Результат fetch_filtered_calls.
+    :return: Генератор обновленных строк.
+    """
+    chats_count = count_chats(chats)
+    calls_count = count_calls(calls_data)
+    for offer in offers:
+        key = (offer.listing_id, offer.report_date)
+        offer.chats += chats_count.get(key, 0)
+        if key in calls_count:
+            offer.calls = calls_count[key]
+        yield offer
+
+def collection_stages(
+        cian: CianApi,
+        date_from: datetime,
+        date_to: datetime,
+        logger: logging.Logger,
+        dead_letters: DeadLetterQueue = None,
+        shard: tuple[int, int] = None,
+        memory_guard: MemoryGuard = None,
+        by_employees: bool = False,
+        include_inactive: bool = False
+) -> list[Stage]:
+    """
+    Формирует граф этапов сбора статистики для run_stages.
+
+    Детали, аукцион и просмотры зависят только от списка объявлений, а чаты и звонки -
+    только от периода, поэтому они выполняются параллельно. Этап "join" возвращает
+    объявления по дням без чатов и звонков, итоговый этап "result" - отсортированный 
+    список OfferStatistics с учетом чатов и звонков.
+
+    Если указана очередь dead_letters, ошибки отдельных страниц, пачек и объявлений не
+    прерывают сбор, а этапы "retry_offers" и "retry_events" повторяют только их.
+
+    :param cian: Экземпляр класса CianApi для взаимодействия с API.
+    :param date_from: Дата начала периода.
+    :param date_to: Дата окончания периода.
+    :param logger: Логгер для записи ошибок.
+    :param dead_letters: Очередь элементов с ошибками.
+    :param shard: Кортеж (номер шарда, количество шардов). Если указан, собираются 
+    данные только по объявлениям этого шарда (см. offer_in_shard).
+    :param memory_guard: Ограничение памяти. Если указано, этап "views" запускается после 
+    "details" и "auction" и сразу превращает просмотры каждого объявления в строки отчета, 
+    а этапы "join" и "result" возвращают RowSpill, который при превышении лимита переносит 
+    строки на диск (без сортировки по дате).
+    :param by_employees: Загружать чаты и звонки отдельно по каждому сотруднику агентства,
+    параллельно. Этапы "chats" и "calls" при этом зависят от этапа "employees". Если список
+    сотрудников пуст или не получен, загрузка выполняется по всему агентству, а результат
+    загрузки по сотрудникам сверяется с общей выдачей (см. merge_unpartitioned).
+    :param include_inactive: Учитывать также снятые с публикации объявления. Период статистики 
+    каждого объявления начинается с даты его создания (см. prune_offers).
+    :return: Список этапов.
+    """
+    offer_windows = {}
+
+    def fetch_ids():
+        offers = fetch_all_my_offer_ids(cian, logger, dead_letters, include_inactive)
+        if shard is not None:
+            offers = [offer for offer in offers if offer_in_shard(offer.listing_id, shard)]
+            logger.info(f"Объявлений в шарде {shard[0]}/{shard[1]}: {len(offers)}")
+        kept, windows = prune_offers(offers, date_from, date_to)
+        offer_windows.update(windows)
+        full_days = len(offers) * ((date_to.date() - date_from.date()).days + 1)
+        kept_days = sum((end.date() - start.date()).days + 1 for start, end in windows.values())
+        logger.info(
+            f"Объявлений вне периода: {len(offers) - len(kept)} | "\
+            f"Дней статистики просмотров: {kept_days} из {full_days}"
+        )
+        return kept
+
+    def fetch_employees():
+        try:
+            employee_ids = fetch_employee_ids(cian)
+        except Exception as _ex:
+            logger.warning(
+                f"Не удалось получить список сотрудников: {_ex}. "\
+                f"Чаты и звонки загружаются по всему агентству"
+            )
+            return None
+        if not employee_ids:
+            logger.warning("Список сотрудников пуст. Чаты и звонки загружаются по всему агентству")
+            return None
+        logger.info(f"Сотрудников агентства: {len(employee_ids)}")
+        return employee_ids
+
+    def load_chats(employee_ids=None):
+        if employee_ids is None:
+            return fetch_filtered_chats(cian, date_from, dead_letters=dead_letters)
+        return fetch_chats_by_employees(
+            cian, date_from, employee_ids, dead_letters=dead_letters, logger=logger
+        )
+
+    def load_calls(employee_ids=None):
+        if employee_ids is None:
+            return fetch_calls(cian, date_from, date_to, dead_letters=dead_letters)
+        return fetch_calls_by_employees(
+            cian, date_from, date_to, employee_ids, dead_letters=dead_letters, logger=logger
+        )
+
+    events_depend_on = ("employees",) if by_employees else ()
+
+    def stream_views(offers, *_):
+        # Строки клонируются из объявлений сразу, поэтому детали и аукцион должны быть уже получены
+        retry("details", "auction")
+        offers_by_id = {offer.listing_id: offer for offer in offers}
+        store = RowSpill(memory_guard)
+        fetch_all_views_by_days(
+            cian, date_from, date_to, offers, dead_letters,
+            sink=lambda offer_id, views: store.extend(build_offer_days(offers_by_id[offer_id], *views)),
+            windows=offer_windows
+        )
+        return store
+
+    def join(offers, views, _):
+        if isinstance(views, RowSpill):
+            return views
+        return join_offers_with_views(offers, views)
+
+    def attribute(updated_offers, chats, calls, _):
+        # Словари чатов и звонков читаются только здесь: страницы, повторенные
+        # на этапе retry_events, дописывают события в них
+        chats = list(chats.values())
+        calls_data = group_calls(calls)
+        if isinstance(updated_offers, RowSpill) and updated_offers.spilled:
+            # Строки на диске не сортируются: они уже упорядочены по объявлению и дате
+            result = RowSpill(memory_guard)
+            result.extend(attribute_events(updated_offers, chats, calls_data))
+            updated_offers.close()
+            return result
+        if isinstance(updated_offers, RowSpill):
+            rows = next(updated_offers.batches(), [])
+            updated_offers.close()
+            updated_offers = rows
+        updated_offers = update_my_offer_with_chats(updated_offers, chats)
+        updated_offers = update_my_offer_with_calls(updated_offers, calls_data)
+        updated_offers.sort(key=lambda x: x.report_date)
+        return updated_offers
+
+    # Страницы списка объявлений повторяются внутри этапа ids: их результат
+    # нужен этапам details, auction и views, которые к этому моменту уже завершены
+    def retry(*stages):
+        if dead_letters is not None:
+            dead_letters.retry(*stages)
+
+    return [
+        Stage("ids", fetch_ids),
+        Stage(
+            "details", 
+            lambda offers: fetch_all_my_offers_detail(cian, offers, logger, dead_letters), 
+            ("ids",)
+        ),
+        Stage(
+            "auction", 
+            lambda offers: fetch_all_my_offers_auction(cian, offers, logger, dead_letters), 
+            ("ids",)
+        ),
+        Stage(
+            "views", 
+            lambda offers: fetch_all_views_by_days(
+                cian, date_from, date_to, offers, dead_letters, windows=offer_windows
+            ), 
+            ("ids",)
+        ) if memory_guard is None else Stage("views", stream_views, ("details", "auction")),
+        *([Stage("employees", fetch_employees)] if by_employees else []),
+        Stage("chats", load_chats, events_depend_on),
+        Stage("calls", load_calls, events_depend_on),
+        Stage(
+            "retry_offers", 
+            lambda *_: retry("details", "auction", "views"), 
+            ("details", "auction", "views")
+        ),
+        Stage("retry_events", lambda *_: retry("chats", "calls"), ("chats", "calls")),
+        Stage(
+            "join", 
+            join, 
+            ("details", "views", "retry_offers")
+        ),
+        Stage("result", attribute, ("join", "chats", "calls", "retry_events")),
+    ]
@@ -1,18 +1,51 @@
 import argparse
 
 from datetime import datetime
-from dateutil import parser as dateutil_parser
 
 from app.exceptions import DateRangeError
 
 
-def parse_args() -> tuple[datetime, datetime]:
+def parse_shard(value: str) -> tuple[int, int]:
+    """
+    Разбирает номер шарда в формате "I/N".
+
+    :param value: Строка вида "0/4".
+    :return: Кортеж (номер шарда, количество шардов).
+    :raises argparse.ArgumentTypeError: Если формат неверный или номер шарда вне диапазона.
+    """
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Шард должен быть указан в формате I/N: {value}")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"Номер шарда должен быть от 0 до N-1: {value}")
+    return index, count
+
+
+def parse_memory(value: str) -> int:
+    """
+    Разбирает лимит памяти для --max-memory.
+
+    :param value: Строка вида "512M" или "2G".
+    :return: Лимит в байтах.
+    :raises argparse.ArgumentTypeError: Если формат неверный.
+    """
+    from app.memory import parse_size
+
+    try:
+        return parse_size(value)
+    except ValueError as _ex:
+        raise argparse.ArgumentTypeError(str(_ex))
+
+
+def parse_args() -> argparse.Namespace:
     """
     Разбирает аргументы командной строки для задания периода дат и проверяет корректность введенных данных.
 
-    :return: Кортеж с двумя объектами datetime - начальной (date_from) и конечной (date_to) датой периода.
+    :return: Пространство имен с аргументами. Поля date_from и date_to - объекты datetime 
+    с начальной и конечной датой периода.
     
-    :raises DateRangeError: Если дата начала больше даты окончания или диапазон дат превышает допустимое количество дней.
+    :raises DateRangeError: Если дата начала больше даты окончания.
     """
     parser = argparse.ArgumentParser(
         description="Скрипт для получения данных от api cian по датам и записью в google sheets"
@@ -23,15 +56,102 @@ def parse_args() -> tuple[datetime, datetime]:
     parser.add_argument(
         "-dt", "--date_to", help="Дата окончания периода (по умолчанию - текущая дата)"
     )
+    parser.add_argument(
+        "-r", "--rollup", action="store_true",
+        help="Построить недельные и месячные сводки на отдельных листах таблицы"
+    )
+    parser.add_argument(
+        "--archive", metavar="DIR",
+        help="Дописать собранные метрики в локальный архив (папка с файлами фиксированного формата, "\
+             "читается через numpy.memmap с выборкой по объявлениям и диапазону дней)"
+    )
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument(
+        "--record", metavar="PATH",
+        help="Записать все запросы к API Циан и ответы на них в файл"
+    )
+    cassette.add_argument(
+        "--replay", metavar="PATH",
+        help="Воспроизвести ответы API Циан из файла, записанного с --record, без обращения к API"
+    )
+    parser.add_argument(
+        "--replay-latency", choices=["zero", "recorded"], default="zero",
+        help="Задержка ответов при воспроизведении: без задержки или записанная (по умолчанию - zero)"
+    )
+    parser.add_argument(
+        "--log-level", choices=["DEBUG", "INFO", "WARNING", "ERROR"], default="INFO",
+        help="Уровень логирования (по умолчанию - INFO)"
+    )
+    parser.add_argument(
+        "--log-json", action="store_true",
+        help="Выводить лог в формате JSON (одна запись на строку)"
+    )
+    parser.add_argument(
+        "--request-log", choices=["info", "debug", "sample"], default="info",
+        help="Логирование запросов к API Циан: каждый запрос (info), только на уровне DEBUG (debug) "\
+             "или каждый N-й запрос (sample), по умолчанию - info"
+    )
+    parser.add_argument(
+        "--request-log-rate", type=int, default=100,
+        help="Для --request-log sample: логировать каждый N-й запрос (по умолчанию - 100)"
+    )
+    distributed = parser.add_mutually_exclusive_group()
+    distributed.add_argument(
+        "--shard", metavar="I/N", type=parse_shard,
+        help="Собрать просмотры, детали и аукцион только для I-го из N шардов объявлений "\
+             "(I от 0 до N-1) и сохранить частичный результат в файл без записи в таблицу"
+    )
+    distributed.add_argument(
+        "--merge", metavar="FILE", nargs="+",
+        help="Объединить частичные результаты шардов, добавить чаты и звонки и записать в таблицу"
+    )
+    parser.add_argument(
+        "--shard-output", metavar="PATH",
+        help="Файл для частичного результата шарда (по умолчанию - shard_I_of_N.json)"
+    )
+    parser.add_argument(
+        "--plan", action="store_true",
+        help="Только получить список объявлений и вывести план сбора: количество запросов по "\
+             "эндпоинтам (с учетом кассеты --record/--replay) и ожидаемую длительность"
+    )
+    parser.add_argument(
+        "--include-inactive", action="store_true",
+        help="Учитывать также снятые с публикации объявления (с даты создания до конца периода)"
+    )
+    parser.add_argument(
+        "--by-employees", action="store_true",
+        help="Загружать чаты и звонки отдельно по каждому сотруднику агентства, параллельно"
+    )
+    parser.add_argument(
+        "--hedge-ratio", type=float, default=0.0,
+        help="Доля дублирующих запросов к API Циан (например, 0.05). Если ответ задерживается дольше "\
+             "--hedge-percentile перцентиля времени ответа, отправляется такой же запрос и используется "\
+             "ответ, пришедший первым (по умолчанию - 0, без дублирования)"
+    )
+    parser.add_argument(
+        "--hedge-percentile", type=float, default=95.0,
+        help="Перцентиль времени ответа, после которого отправляется дублирующий запрос (по умолчанию - 95)"
+    )
+    parser.add_argument(
+        "--max-memory", metavar="SIZE", type=parse_memory,
+        help="Лимит памяти процесса (например, 2G). При превышении строки отчета переносятся "\
+             "во временный файл на диске и записываются в таблицу пачками"
+    )
     args = parser.parse_args()
-    date_from = dateutil_parser.parse(args.date_from)
-    date_to = dateutil_parser.parse(args.date_to) if args.date_to else datetime.now()
-    if date_from > date_to:
+    if args.plan and args.merge:
+        parser.error("--plan нельзя использовать вместе с --merge")
+    if not 0 <= args.hedge_ratio <= 1:
+        parser.error("--hedge-ratio должен быть от 0 до 1")
+    if not 0 < args.hedge_percentile < 100:
+        parser.error("--hedge-percentile должен быть от 0 до 100")
+    if args.shard and not args.shard_output:
+        args.shard_output = f"shard_{args.shard[0]}_of_{args.shard[1]}.json"
+
+    from dateutil import parser as dateutil_parser
+
+    args.date_from = dateutil_parser.parse(args.date_from)
+    args.date_to = dateutil_parser.parse(args.date_to) if args.date_to else datetime.now()
+    if args.date_from > args.date_to:
         raise DateRangeError("Дата начала периода (-df) не может быть больше даты окончания периода (-dt).")
-    
-    max_days = 180
-    if (date_to - date_from).days > max_days:
-        print((date_to - date_from).days)
-        raise DateRangeError(f"Ошибка: Диапазон дат не может превышать {max_days} дней.")
 
-    return date_from, date_to
+    return args
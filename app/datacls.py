@@ -1,7 +1,9 @@
 from dataclasses import dataclass
 from datetime import date
 
-@dataclass
+from .enums import PartitionPeriod
+
+@dataclass(slots=True)
 class OfferStatistics:
     """
     Класс для хранения статистики по объявлениям недвижимости.
@@ -42,10 +44,12 @@ class GoogleConfig:
     :param path_creds_json: Путь к файлу JSON с учетными данными для Google API.
     :param spreadsheet_id: Идентификатор Google таблицы.
     :param worksheet_id: Идентификатор листа в таблице.
+    :param partition_period: Период разбиения данных по листам (None - все данные на лист worksheet_id).
     """
     path_creds_json: str
     spreadsheet_id: str
     worksheet_id: int
+    partition_period: PartitionPeriod = None
 
 @dataclass(frozen=True, slots=True)
 class CianConfig:
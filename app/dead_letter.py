@@ -0,0 +1,86 @@
+import logging
+import threading
+
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+
+@dataclass
+class FailedItem:
+    """
+    Элемент сбора данных (страница, пачка объявлений или объявление), запрос которого не удался.
+
+    :param stage: Этап сбора данных, на котором произошла ошибка.
+    :param key: Идентификатор элемента: номер страницы, список ID объявлений или ID объявления.
+    :param error: Текст последней ошибки.
+    :param retry: Функция, повторяющая запрос и добавляющая результат к уже собранным данным.
+    """
+    stage: str
+    key: Any
+    error: str
+    retry: Callable[[], None] = field(repr=False, compare=False)
+
+
+class DeadLetterQueue:
+    def __init__(self, logger: logging.Logger) -> None:
+        """
+        Очередь элементов, запрос которых не удался.
+
+        Ошибка одного элемента не прерывает сбор данных: элемент попадает в очередь,
+        а в конце сбора повторно запрашиваются только такие элементы.
+
+        :param logger: Логгер для записи ошибок и результатов повторов.
+        """
+        self.logger = logger
+        self.items: list[FailedItem] = []
+        self.__lock = threading.Lock()
+
+    def add(self, stage: str, key: Any, error: Exception, retry: Callable[[], None]) -> None:
+        """
+        Добавляет элемент в очередь.
+
+        :param stage: Этап сбора данных.
+        :param key: Идентификатор элемента.
+        :param error: Возникшая ошибка.
+        :param retry: Функция для повторного запроса элемента.
+        """
+        self.logger.error(f"Ошибка на этапе {stage} | {key}: {error}. Запрос будет повторен в конце сбора")
+        with self.__lock:
+            self.items.append(FailedItem(stage, key, str(error), retry))
+
+    def retry(self, *stages: str) -> list[FailedItem]:
+        """
+        Повторяет запросы элементов из очереди. Успешные элементы удаляются из очереди.
+
+        :param stages: Этапы, элементы которых нужно повторить (по умолчанию - все).
+        :return: Элементы, запрос которых снова не удался.
+        """
+        with self.__lock:
+            selected = [item for item in self.items if not stages or item.stage in stages]
+            self.items = [item for item in self.items if stages and item.stage not in stages]
+        if selected:
+            self.logger.info(f"Повторный запрос элементов с ошибками: {len(selected)}")
+
+        failed = []
+        for item in selected:
+            try:
+                item.retry()
+            except Exception as _ex:
+                item.error = str(_ex)
+                failed.append(item)
+        with self.__lock:
+            self.items.extend(failed)
+        return failed
+
+    def report(self) -> None:
+        """
+        Записывает в лог итоговый список элементов, которые не удалось получить.
+        """
+        if not self.items:
+            return
+        self.logger.error(f"Не удалось получить данные для элементов: {len(self.items)}")
+        for item in self.items:
+            self.logger.error(f"Этап {item.stage} | {item.key}: {item.error}")
+
+    def __len__(self) -> int:
+        return len(self.items)
@@ -8,4 +8,18 @@ class Url(str,Enum):
     MY_OFFERS_DETAI = f"{HOST}/v1/get-my-offers-detail"
     AUCTION = f"{HOST}/v1/get-auction"
     CALLS_REPORT = f"{HOST}/v2/get-calls-report"
-    
\ No newline at end of file
+    MY_AGENTS = f"{HOST}/v1/get-my-agents"
+
+class PartitionPeriod(str, Enum):
+    MONTH = "month"
+    QUARTER = "quarter"
+    YEAR = "year"
+
+class CassetteMode(str, Enum):
+    RECORD = "record"
+    REPLAY = "replay"
+
+class RequestLog(str, Enum):
+    INFO = "info"
+    DEBUG = "debug"
+    SAMPLE = "sample"
@@ -16,4 +16,14 @@ class MissingSpreadsheetId(Exception):...
 
 class MissingWorksheetId(Exception):...
 
-class MissingAccessToken(Exception):...
\ No newline at end of file
+class MissingAccessToken(Exception):...
+
+class InvalidPartitionPeriod(Exception):...
+
+class CassetteNotFound(Exception):...
+
+class ArchiveFormatError(Exception):...
+
+class ShardSetError(Exception):...
+
+class InvalidCredentials(Exception):...
@@ -1,17 +1,92 @@
+from __future__ import annotations
+
 import logging
-import gspread
+import threading
 
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import astuple
 from pathlib import Path
-from google.oauth2.service_account import Credentials
-
+from typing import TYPE_CHECKING
 
 from .datacls import OfferStatistics
+from .enums import PartitionPeriod
 from .exceptions import (
+    InvalidCredentials,
     SpreadsheetNotFound,
     WorksheetNotFound,
     UpdateWorksheetError
 )
+from .sheets_cache import SheetsCache, default_cache_path
+from .sheets_quota import QuotaAwareWorksheet, SheetsQuota
+
+if TYPE_CHECKING:
+    import gspread
+
+HEADERS = [
+    "Дата ( за какое число собирался отчет)",
+    "Ссылка на объявление",
+    "id объявление",
+    "Просмотры",
+    "Звонки",
+    "Чаты",
+    "Лайки",
+    "Баллы на аукцион",
+    "Дата публикации объявления",
+    "Тип недвижимости",
+    "Предложения",
+    "Адрес",
+    "Площадь"
+]
+
+# Области доступа сервисного аккаунта
+SCOPES = [
+    'https://www.googleapis.com/auth/spreadsheets',
+    'https://www.googleapis.com/auth/drive'
+]
+
+# Клиенты, таблицы и листы, открытые в текущем процессе. Общие для всех экземпляров GoogleSheet
+# с теми же учетными данными: ключ клиента - путь к учетным данным, таблицы - (путь к учетным
+# данным, ID таблицы), листа - (путь к учетным данным, ID таблицы, ID листа)
+_CLIENTS: dict[str, gspread.Client] = {}
+_SPREADSHEETS: dict[tuple[str, str], gspread.spreadsheet.Spreadsheet] = {}
+_WORKSHEETS: dict[tuple[str, str, int], QuotaAwareWorksheet] = {}
+_HANDLES_LOCK = threading.RLock()
+
+
+def upsert_rows(existing: list[list], rows: list[list], key_size: int) -> list[list]:
+    """
+    Объединяет строки листа с новыми строками по ключу - первым key_size значениям строки.
+
+    Строки с уже существующим ключом заменяются на месте, новые добавляются в конец
+    в исходном порядке. Ключи сравниваются как строки, поэтому число и его строковое
+    представление считаются одним ключом.
+
+    :param existing: Строки листа (без заголовков).
+    :param rows: Новые строки.
+    :param key_size: Количество первых значений строки, составляющих ключ.
+    :return: Объединенные строки.
+    """
+    merged = {}
+    for row in [*existing, *rows]:
+        merged[tuple(str(value) for value in row[:key_size])] = row
+    return list(merged.values())
+
+
+def partition_title(report_date: str, period: PartitionPeriod) -> str:
+    """
+    Возвращает название листа-раздела, в который попадает строка с указанной датой отчета.
+
+    :param report_date: Дата отчета в формате "DD.MM.YYYY".
+    :param period: Период разбиения листов.
+    :return: Название листа: "YYYY-MM" для месяца, "YYYY-Qn" для квартала, "YYYY" для года.
+    """
+    year, month = report_date[6:10], report_date[3:5]
+    if period == PartitionPeriod.MONTH:
+        return f"{year}-{month}"
+    if period == PartitionPeriod.QUARTER:
+        return f"{year}-Q{(int(month) - 1) // 3 + 1}"
+    return year
 
 
 class GoogleSheet:
@@ -20,43 +95,146 @@ class GoogleSheet:
             path_creds_json: Path,
             spreadsheet_id: str,
             worksheet_id: int,
-            logger: logging.Logger
+            logger: logging.Logger,
+            partition_period: PartitionPeriod = None,
+            cache_path: Path = None
     ) -> None:
         """
         Конструктор класса GoogleSheet.
 
-        Инициализирует соединение с Google Sheets, получает доступ к конкретной таблице
-        и листу на основании переданных параметров.
+        Сохраняет параметры подключения. Соединение с Google Sheets открывается
+        лениво — при первом обращении к таблице (см. свойства spreadsheet и sheet)
+        и один раз на процесс для каждой таблицы и листа. Токен доступа и отметка
+        о проверке заголовков сохраняются между запусками (см. SheetsCache).
+        Все запросы к Google Sheets API выполняются с учетом квот (см. SheetsQuota).
 
         :param path_creds_json: Путь к JSON файлу с учетными данными для Google API.
         :param spreadsheet_id: Идентификатор Google таблицы.
         :param sheet_id: Идентификатор листа в Google таблице.
         :param logger: Объект логгера для ведения логов.
+        :param partition_period: Период разбиения данных по листам. Если указан, строки
+        записываются не на лист worksheet_id, а на листы-разделы (см. partition_title).
+        :param cache_path: Путь к файлу кэша подключения (по умолчанию - рядом с файлом
+        учетных данных, см. default_cache_path).
+        """
+        self.path_creds_json = path_creds_json
+        self.spreadsheet_id = spreadsheet_id
+        self.worksheet_id = worksheet_id
+        self.logger = logger
+        self.partition_period = partition_period
+        self.quota = SheetsQuota(logger)
+        self.cache = SheetsCache(cache_path or default_cache_path(path_creds_json), logger)
+        self.client = None
+        self.__spreadsheet = None
+        self.__sheet = None
+        self.__partitions = None
+        self.__partitions_lock = threading.Lock()
+
+    @property
+    def spreadsheet(self) -> gspread.spreadsheet.Spreadsheet:
+        """
+        Google таблица. При первом обращении в процессе устанавливает соединение и открывает таблицу,
+        последующие экземпляры GoogleSheet используют уже открытую.
+
+        :raises SpreadsheetNotFound: Если таблица не найдена.
+        """
+        if self.__spreadsheet is None:
+            key = (str(self.path_creds_json), self.spreadsheet_id)
+            with _HANDLES_LOCK:
+                spreadsheet = _SPREADSHEETS.get(key)
+                if spreadsheet is None:
+                    self.logger.info("Подключение к Google Spreadsheet!")
+                    self.client = self.connect(self.path_creds_json)
+                    spreadsheet = self.get_spreadsheet(self.spreadsheet_id)
+                    _SPREADSHEETS[key] = spreadsheet
+            self.__spreadsheet = spreadsheet
+        return self.__spreadsheet
+
+    @property
+    def sheet(self) -> QuotaAwareWorksheet:
         """
-        self.client = self.connect(path_creds_json)
-        self.spreadsheet = self.get_spreadsheet(spreadsheet_id)
-        self.sheet = self.get_worksheet(worksheet_id)
-        self.check_headers()
+        Лист Google таблицы с ID worksheet_id. Открывается при первом обращении в процессе,
+        последующие экземпляры GoogleSheet используют уже открытый лист (и его учет квот).
+
+        Заголовки не проверяются отдельным запросом: update записывает их
+        вместе с данными, если лист пуст.
+
+        :raises SpreadsheetNotFound: Если таблица не найдена.
+        :raises WorksheetNotFound: Если лист с указанным ID не найден.
+        """
+        if self.__sheet is None:
+            key = (str(self.path_creds_json), self.spreadsheet_id, self.worksheet_id)
+            with _HANDLES_LOCK:
+                sheet = _WORKSHEETS.get(key)
+                if sheet is None:
+                    sheet = QuotaAwareWorksheet.from_worksheet(
+                        self.get_worksheet(self.worksheet_id),
+                        self.quota
+                    )
+                    _WORKSHEETS[key] = sheet
+            self.__sheet = sheet
+        return self.__sheet
+
+    @property
+    def cache_key(self) -> str:
+        """
+        Ключ листа worksheet_id в кэше подключения.
+        """
+        return f"{self.spreadsheet_id}:{self.worksheet_id}"
     
-    def connect(self, path_creds_json: Path):
+    def connect(self, path_creds_json: Path) -> gspread.Client:
         """
         Устанавливает соединение с Google API и авторизуется с помощью учетных данных.
 
+        Клиент создается один раз на процесс для каждого файла учетных данных. Токен доступа
+        берется из кэша подключения, пока не истек его срок; новый токен запрашивается
+        сразу и сохраняется в кэш для следующих запусков.
+
         :param path_creds_json: Путь к JSON файлу с учетными данными для Google API.
         :return: Авторизованный клиент gspread для работы с Google Sheets.
+        :raises InvalidCredentials: Если файл учетных данных не прочитан или токен не получен.
         """
-        SCOPES = [
-            'https://www.googleapis.com/auth/spreadsheets',
-            'https://www.googleapis.com/auth/drive'
-        ]
-        creds = Credentials.from_service_account_file(
-            path_creds_json, 
-            scopes=SCOPES
-        )
+        import gspread
+        from google.auth.exceptions import GoogleAuthError
+        from google.auth.transport.requests import Request
+
+        with _HANDLES_LOCK:
+            client = _CLIENTS.get(str(path_creds_json))
+            if client is not None:
+                return client
+
+        creds = self.load_credentials(path_creds_json)
+        if not self.cache.load_token(creds):
+            try:
+                creds.refresh(Request())
+            except GoogleAuthError as _ex:
+                raise InvalidCredentials(f"Не удалось получить токен доступа Google: {_ex}")
+            self.cache.save_token(creds)
 
         client = gspread.authorize(creds)
-        return client
+        with _HANDLES_LOCK:
+            return _CLIENTS.setdefault(str(path_creds_json), client)
     
+    @staticmethod
+    def load_credentials(path_creds_json: Path):
+        """
+        Читает учетные данные сервисного аккаунта из файла без обращения к Google API.
+
+        Вызывается при подключении и до начала сбора (см. cian_statistics.main), чтобы
+        ошибка в файле учетных данных не обнаружилась только после сбора статистики.
+
+        :param path_creds_json: Путь к JSON файлу с учетными данными для Google API.
+        :return: Учетные данные google.oauth2.service_account.Credentials.
+        :raises InvalidCredentials: Если файл не найден или не является файлом учетных данных.
+        """
+        from google.auth.exceptions import GoogleAuthError
+        from google.oauth2.service_account import Credentials
+
+        try:
+            return Credentials.from_service_account_file(path_creds_json, scopes=SCOPES)
+        except (OSError, ValueError, GoogleAuthError) as _ex:
+            raise InvalidCredentials(f"Ошибка чтения файла учетных данных {path_creds_json}: {_ex}")
+
     def get_spreadsheet(
             self, 
             spreadsheet_id: str
@@ -68,8 +246,10 @@ class GoogleSheet:
         :return: Объект Spreadsheet, представляющий Google таблицу.
         :raises SpreadsheetNotFound: Если таблица не найдена.
         """
+        import gspread
+
         try:
-            return self.client.open_by_key(spreadsheet_id)
+            return self.quota.read(self.client.open_by_key, spreadsheet_id)
         except gspread.exceptions.SpreadsheetNotFound:
             raise SpreadsheetNotFound("Google таблица не найдена!")
     
@@ -81,34 +261,43 @@ class GoogleSheet:
         :return: Объект Worksheet, представляющий лист таблицы.
         :raises WorksheetNotFound: Если лист с указанным ID не найден.
         """
+        import gspread
+
         try:
-            return self.spreadsheet.get_worksheet_by_id(sheet_id)
+            return self.quota.read(self.spreadsheet.get_worksheet_by_id, sheet_id)
         except gspread.exceptions.WorksheetNotFound:
             raise WorksheetNotFound(f"Google лист c ID: {sheet_id} не найден!")
 
+    def headers_verified(self, metadata: dict) -> bool:
+        """
+        Проверяет, можно ли писать на лист без чтения его содержимого.
+
+        Отметка о проверке заголовков в кэше подключения (см. SheetsCache.headers_verified)
+        перепроверяется чтением одной первой строки листа: если лист очистили или заголовки
+        изменили после предыдущего запуска, лист читается целиком, как при первом запуске.
+
+        :param metadata: Текущие метаданные листа (см. QuotaAwareWorksheet.metadata).
+        :return: True, если заголовки проверены и первая строка листа совпадает с HEADERS.
+        """
+        if not self.cache.headers_verified(self.cache_key, metadata):
+            return False
+        return self.sheet.get_first_row(len(HEADERS)) == HEADERS
+
     def check_headers(self):
         """
         Проверяет наличие заголовков на листе и добавляет их, если они отсутствуют.
 
         Заголовки добавляются в первую строку таблицы. Если лист пустой, метод добавляет
-        стандартный набор заголовков для отчетов.
+        стандартный набор заголовков для отчетов. Если заголовки уже проверялись, читается
+        только первая строка листа (см. headers_verified).
         """
+        metadata = self.sheet.metadata()
+        if self.headers_verified(metadata):
+            return
         data_sheet = self.sheet.get_all_values()
-        if data_sheet==[[]]:
-            headers = ["Дата ( за какое число собирался отчет)",
-            "Ссылка на объявление",
-            "id объявление",
-            "Просмотры",
-            "Звонки",
-            "Чаты",
-            "Лайки",
-            "Баллы на аукцион",
-            "Дата публикации объявления",
-            "Тип недвижимости",
-            "Предложения",
-            "Адрес",
-            "Площадь"]
-            self.sheet.update(range_name="A1",values=[headers])
+        if data_sheet in ([], [[]]):
+            self.sheet.write_rows(0, [HEADERS])
+        self.cache.mark_headers_verified(self.cache_key, metadata)
             
     def add_rows_to_sheet(self, number_of_rows: int = 1000):
         """
@@ -119,31 +308,158 @@ class GoogleSheet:
 
         :param number_of_rows: Количество строк, которое нужно добавить.
         """
-        current_row_count = len(self.sheet.get_all_values())
-        new_row_count = current_row_count + number_of_rows
-        self.sheet.resize(rows=new_row_count)
+        self.sheet.add_rows(number_of_rows)
 
-    def update(self, my_offers: list[OfferStatistics]):
+    def update(self, my_offers: list[OfferStatistics], start_row_index: int = None) -> int | None:
         """
         Обновляет Google таблицу новыми данными.
 
         Вычисляет следующую доступную строку и добавляет в нее данные из списка объектов
-        OfferStatistics.
+        OfferStatistics. Расширение листа, заголовки (для пустого листа) и данные
+        записываются одним запросом batchUpdate.
+
+        Если заголовки листа уже проверялись (см. headers_verified), читается только первая
+        строка листа: строки дописываются после последней заполненной строки.
+
+        При записи пачками (см. RowSpill.batches) в следующий вызов передается результат
+        предыдущего: строки записываются с известной строки без чтения листа.
 
         :param my_offers: Список объектов OfferStatistics, которые нужно добавить в таблицу.
+        :param start_row_index: Индекс строки (с нуля), с которой записываются данные
+        (результат предыдущего вызова). Если не указан, строка определяется по листу.
+        :return: Индекс строки, следующей за записанными, или None, если он неизвестен
+        (запись по листам-разделам или ответ Google API без диапазона).
+        :raises SpreadsheetNotFound: Если таблица не найдена.
+        :raises WorksheetNotFound: Если лист с указанным ID не найден.
+        :raises UpdateWorksheetError: Если Google API вернул ошибку при записи.
         """
+        import gspread
+
+        if self.partition_period:
+            self.update_partitions(my_offers)
+            return None
         try:
+            data = [list(astuple(offer)) for offer in my_offers]
+            if start_row_index is not None:
+                self.sheet.write_rows(start_row_index, data)
+                return start_row_index + len(data)
+            metadata = self.sheet.metadata()
+            if self.headers_verified(metadata):
+                return self.sheet.append_rows(data)
             data_sheet = self.sheet.get_all_values()
-            if data_sheet == [[]]:
-                last_row_index = 0  
+            if data_sheet in ([], [[]]):
+                start_row_index = 0
+                data.insert(0, HEADERS)
             else:
-                last_row_index = len(data_sheet)
-            data = [astuple(offer) for offer in my_offers]
-            number_of_rows_needed = last_row_index + len(data)
-            if number_of_rows_needed > len(data_sheet):
-                self.add_rows_to_sheet(number_of_rows_needed - len(data_sheet))
-            next_row = last_row_index + 1
-            cell_range = f"A{next_row}"
-            self.sheet.update(range_name=cell_range, values=data)
+                start_row_index = len(data_sheet)
+            self.sheet.write_rows(start_row_index, data)
+            self.cache.mark_headers_verified(self.cache_key, metadata)
+            return start_row_index + len(data)
+        except gspread.exceptions.APIError as _ex:
+            raise UpdateWorksheetError(_ex)
+
+    def write_summary(self, title: str, headers: list[str], rows: list[list], key_size: int):
+        """
+        Записывает строки сводки на отдельный лист Google таблицы.
+
+        Если листа с указанным названием нет, он создается, и первой строкой
+        записываются заголовки. Иначе строки объединяются с содержимым листа по ключу
+        (см. upsert_rows), и лист перезаписывается целиком одним запросом: повторный
+        или пересекающийся запуск заменяет строки тех же периодов, а не дублирует их.
+
+        :param title: Название листа для сводки.
+        :param headers: Заголовки столбцов сводки.
+        :param rows: Строки сводки.
+        :param key_size: Количество первых столбцов, определяющих строку сводки.
+        :raises UpdateWorksheetError: Если Google API вернул ошибку при записи.
+        """
+        import gspread
+
+        if not rows:
+            return
+        try:
+            worksheet = self.get_worksheets_by_title().get(title)
+            if worksheet is None:
+                self.append_to_worksheet(title, headers, rows)
+                return
+            existing = worksheet.get_all_values(unformatted=True)[1:]
+            worksheet.write_rows(0, [headers, *upsert_rows(existing, rows, key_size)])
+        except gspread.exceptions.APIError as _ex:
+            raise UpdateWorksheetError(_ex)
+
+    def get_worksheets_by_title(self) -> dict[str, QuotaAwareWorksheet]:
+        """
+        Возвращает листы таблицы по их названиям. Список запрашивается один раз и кэшируется.
+
+        :return: Словарь: название листа -> объект QuotaAwareWorksheet.
+        """
+        if self.__partitions is None:
+            self.__partitions = {
+                worksheet.title: QuotaAwareWorksheet.from_worksheet(worksheet, self.quota)
+                for worksheet in self.quota.read(self.spreadsheet.worksheets)
+            }
+        return self.__partitions
+
+    def append_to_worksheet(self, title: str, headers: list[str], rows: list[list]):
+        """
+        Дописывает строки в конец листа с указанным названием, не читая его содержимое.
+
+        Если листа нет, он создается нужного размера и заполняется заголовками и строками
+        одним запросом. Список листов таблицы запрашивается один раз и кэшируется.
+        Метод вызывается из нескольких потоков (см. update_partitions): список листов
+        читается и дополняется под блокировкой, а запросы к API выполняются без нее.
+
+        :param title: Название листа.
+        :param headers: Заголовки столбцов для нового листа.
+        :param rows: Строки для записи.
+        :raises gspread.exceptions.APIError: Если Google API вернул ошибку.
+        """
+        worksheet = self.get_worksheets_by_title().get(title)
+        if worksheet is None:
+            with self.__partitions_lock:
+                existing_ids = {sheet.id for sheet in self.__partitions.values()}
+            worksheet = QuotaAwareWorksheet.create(
+                self.spreadsheet,
+                title,
+                [headers, *rows],
+                self.quota,
+                existing_ids=existing_ids
+            )
+            with self.__partitions_lock:
+                self.__partitions[title] = worksheet
+            return
+        worksheet.append_rows(rows)
+
+    def update_partitions(self, my_offers: list[OfferStatistics]):
+        """
+        Записывает данные на листы-разделы по дате отчета.
+
+        Строки группируются по разделам (см. partition_title), недостающие листы создаются
+        с заголовками, а запись в разные разделы выполняется параллельно. Содержимое
+        листов не читается, поэтому время записи не зависит от объема истории.
+
+        :param my_offers: Список объектов OfferStatistics, которые нужно добавить в таблицу.
+        :raises SpreadsheetNotFound: Если таблица не найдена.
+        :raises UpdateWorksheetError: Если Google API вернул ошибку при записи.
+        """
+        import gspread
+
+        partitions = defaultdict(list)
+        for offer in my_offers:
+            partitions[partition_title(offer.report_date, self.partition_period)].append(
+                list(astuple(offer))
+            )
+        if not partitions:
+            return
+        try:
+            # Список листов запрашивается до запуска потоков, чтобы не дублировать запрос
+            self.get_worksheets_by_title()
+            with ThreadPoolExecutor(max_workers=min(len(partitions), 8)) as executor:
+                futures = [
+                    executor.submit(self.append_to_worksheet, title, HEADERS, rows)
+                    for title, rows in sorted(partitions.items())
+                ]
+                for future in futures:
+                    future.result()
         except gspread.exceptions.APIError as _ex:
-            raise UpdateWorksheetError(_ex)
\ No newline at end of file
+            raise UpdateWorksheetError(_ex)
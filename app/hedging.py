@@ -0,0 +1,138 @@
+import threading
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable
+
+# Количество последних запросов, по которым считается порог задержки
+LATENCY_WINDOW = 200
+# Минимальное количество замеров, после которого порог считается надежным
+MIN_LATENCY_SAMPLES = 20
+
+
+class LatencyTracker:
+    def __init__(self, window: int = LATENCY_WINDOW, min_samples: int = MIN_LATENCY_SAMPLES) -> None:
+        """
+        Скользящая статистика времени ответа одного эндпоинта.
+
+        :param window: Количество последних замеров, по которым считается перцентиль.
+        :param min_samples: Минимальное количество замеров для расчета перцентиля.
+        """
+        self.min_samples = min_samples
+        self.__latencies = deque(maxlen=window)
+        self.__lock = threading.Lock()
+
+    def add(self, latency: float) -> None:
+        """
+        Добавляет замер времени ответа.
+
+        :param latency: Время ответа в секундах.
+        """
+        with self.__lock:
+            self.__latencies.append(latency)
+
+    def average(self) -> float | None:
+        """
+        Возвращает среднее время ответа по последним замерам.
+
+        :return: Время ответа в секундах или None, если замеров нет.
+        """
+        with self.__lock:
+            if not self.__latencies:
+                return None
+            return sum(self.__latencies) / len(self.__latencies)
+
+    def percentile(self, percent: float) -> float | None:
+        """
+        Возвращает перцентиль времени ответа по последним замерам.
+
+        :param percent: Перцентиль от 0 до 100.
+        :return: Время ответа в секундах или None, если замеров меньше min_samples.
+        """
+        with self.__lock:
+            if len(self.__latencies) < self.min_samples:
+                return None
+            latencies = sorted(self.__latencies)
+        index = min(int(len(latencies) * percent / 100), len(latencies) - 1)
+        return latencies[index]
+
+
+class HedgeBudget:
+    def __init__(self, ratio: float) -> None:
+        """
+        Бюджет дублирующих запросов: не больше ratio от общего количества запросов.
+
+        :param ratio: Допустимая доля дублирующих запросов (например, 0.05 - 5%).
+        """
+        self.ratio = ratio
+        self.requests = 0
+        self.hedges = 0
+        self.__lock = threading.Lock()
+
+    def count_request(self) -> None:
+        """
+        Учитывает основной запрос.
+        """
+        with self.__lock:
+            self.requests += 1
+
+    def try_acquire(self) -> bool:
+        """
+        Занимает место под дублирующий запрос, если бюджет позволяет.
+
+        :return: True, если дублирующий запрос можно отправить.
+        """
+        with self.__lock:
+            if self.hedges + 1 > self.requests * self.ratio:
+                return False
+            self.hedges += 1
+            return True
+
+
+def hedged_call(
+        executor: ThreadPoolExecutor,
+        func: Callable[[], Any],
+        delay: float | None,
+        budget: HedgeBudget,
+        accept: Callable[[Any], bool] = None
+) -> tuple[Any, bool]:
+    """
+    Выполняет идемпотентный запрос и, если он не завершился за delay секунд,
+    отправляет дублирующий запрос. Возвращается результат того, который первым
+    завершится успешно.
+
+    Запрос считается неудачным, если он завершился исключением или его результат
+    не прошел проверку accept (например, ответ со статусом 500). Если не удались оба
+    запроса, возвращается последний отклоненный результат, а если результатов нет -
+    пробрасывается исключение. Проигравший запрос не прерывается (requests не
+    поддерживает отмену), его результат отбрасывается.
+
+    :param executor: Пул потоков для выполнения запросов.
+    :param func: Функция, выполняющая запрос.
+    :param delay: Задержка перед дублирующим запросом в секундах (None - без дублирования).
+    :param budget: Бюджет дублирующих запросов.
+    :param accept: Проверка результата func (по умолчанию успешен любой результат).
+    :return: Кортеж (результат func, был ли отправлен дублирующий запрос).
+    """
+    budget.count_request()
+    primary = executor.submit(func)
+    if delay is None:
+        return primary.result(), False
+    done, _ = wait([primary], timeout=delay)
+    if done or not budget.try_acquire():
+        return primary.result(), False
+
+    pending: set[Future] = {primary, executor.submit(func)}
+    error, rejected = None, None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is not None:
+                error = future.exception()
+            elif accept is None or accept(future.result()):
+                return future.result(), True
+            else:
+                rejected = future
+    if rejected is not None:
+        return rejected.result(), True
+    raise error
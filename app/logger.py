@@ -1,14 +1,92 @@
+import atexit
+import json
 import logging
+import queue
 
-def init_logging() -> logging:
+from logging.handlers import QueueHandler, QueueListener
+
+LOGGER_NAME = "cian_statistics"
+TEXT_FORMAT = "%(asctime)s - [%(levelname)s] - %(message)s"
+
+# Стандартные атрибуты LogRecord, которые не попадают в поля JSON
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_handler: logging.Handler = None
+_listener: QueueListener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Форматирует записи лога в одну строку JSON.
+
+    Помимо времени, уровня и сообщения в JSON попадают дополнительные поля,
+    переданные через параметр extra.
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        data.update(
+            (key, value) for key, value in vars(record).items()
+            if key not in _RECORD_ATTRIBUTES
+        )
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exc_info"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class LazyQueueHandler(QueueHandler):
     """
-    Инициализирует настройки логирования.
+    QueueHandler, который не форматирует запись в вызывающем потоке.
 
-    Настраивает глобальное логирование с уровнем INFO и определенным форматом вывода,
-    включающим метку времени, уровень логирования и сообщение.
+    Очередь находится в том же процессе, поэтому запись кладется в нее как есть:
+    подстановка аргументов сообщения, трассировка исключения, время, уровень и JSON
+    форматируются в потоке QueueListener. Аргументы сообщения не должны изменяться
+    после вызова логгера (в скрипте сообщения формируются f-строками).
     """
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s - [%(levelname)s] - %(message)s"
-    )
-    return logging
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def init_logging(level: int | str = None, json_format: bool = None) -> logging.Logger:
+    """
+    Инициализирует настройки логирования и возвращает логгер скрипта.
+
+    При первом вызове записи направляются в очередь, а вывод в консоль выполняет
+    фоновый поток QueueListener, поэтому логирование не блокирует отправку запросов.
+    Повторные вызовы возвращают тот же логгер и применяют только явно переданные параметры:
+    слушатель запускается один раз, а формат меняется только при смене json_format.
+
+    :param level: Уровень логирования (по умолчанию INFO).
+    :param json_format: Выводить записи в формате JSON (по умолчанию - текстовый формат
+    с меткой времени, уровнем логирования и сообщением).
+    :return: Логгер скрипта.
+    """
+    global _handler, _listener
+
+    logger = logging.getLogger(LOGGER_NAME)
+    if _listener is None:
+        _handler = logging.StreamHandler()
+        _handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+        _listener = QueueListener(queue.SimpleQueue(), _handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+        logger.addHandler(LazyQueueHandler(_listener.queue))
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+    if level is not None:
+        logger.setLevel(level)
+    if json_format is not None and json_format != isinstance(_handler.formatter, JsonFormatter):
+        # Формат меняется под блокировкой обработчика, без перезапуска слушателя
+        with _handler.lock:
+            _handler.setFormatter(
+                JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT)
+            )
+    return logger
@@ -0,0 +1,187 @@
+import logging
+import os
+import pickle
+import re
+import tempfile
+
+from dataclasses import astuple
+from itertools import islice
+from typing import Iterable, Iterator
+
+from .datacls import OfferStatistics
+
+# Множители для суффиксов размера в --max-memory
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+# Количество строк в одной пачке, записываемой на диск
+SPILL_CHUNK_SIZE = 2_000
+
+
+def parse_size(value: str) -> int:
+    """
+    Разбирает размер памяти вида "512M", "2G" или число байт.
+
+    :param value: Строка с размером.
+    :return: Размер в байтах.
+    :raises ValueError: Если формат неверный.
+    """
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMG]?)B?\s*", value.upper())
+    if not match:
+        raise ValueError(f"Размер памяти должен быть указан в формате 512M или 2G: {value}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+
+def current_rss() -> int | None:
+    """
+    Возвращает текущий объем резидентной памяти процесса (RSS).
+
+    На Linux значение читается из /proc/self/statm, на других Unix-системах
+    используется пиковое значение из resource.getrusage.
+
+    :return: Объем памяти в байтах или None, если его не удалось определить.
+    """
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        import sys
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # На macOS ru_maxrss в байтах, на Linux - в килобайтах
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+class MemoryGuard:
+    def __init__(self, max_bytes: int, logger: logging.Logger) -> None:
+        """
+        Ограничение памяти процесса на один запуск.
+
+        :param max_bytes: Допустимый объем резидентной памяти в байтах.
+        :param logger: Логгер для записи превышения лимита.
+        """
+        self.max_bytes = max_bytes
+        self.logger = logger
+        self.peak = 0
+        self.tripped = False
+        self.__warned = False
+
+    def exceeded(self) -> bool:
+        """
+        Проверяет, превышен ли лимит памяти.
+
+        :return: True, если текущий RSS процесса не меньше лимита.
+        """
+        rss = current_rss()
+        if rss is None:
+            if not self.__warned:
+                self.logger.warning("Не удалось определить объем памяти процесса, лимит не проверяется!")
+                self.__warned = True
+            return False
+        self.peak = max(self.peak, rss)
+        if rss < self.max_bytes:
+            return False
+        if not self.tripped:
+            self.logger.warning(
+                f"Превышен лимит памяти {self.max_bytes // 1024 ** 2} МБ "\
+                f"(используется {rss // 1024 ** 2} МБ)! Строки отчета переносятся на диск."
+            )
+            self.tripped = True
+        return True
+
+
+class RowSpill:
+    def __init__(self, guard: MemoryGuard = None, chunk_size: int = SPILL_CHUNK_SIZE) -> None:
+        """
+        Хранилище строк OfferStatistics, которое переносит строки на диск при превышении лимита памяти.
+
+        Пока лимит guard не превышен, строки хранятся в памяти. После превышения все строки
+        записываются во временный файл пачками по chunk_size в виде кортежей, а при чтении
+        объекты OfferStatistics создаются заново по одной пачке.
+
+        :param guard: Ограничение памяти. Если не указано, строки всегда хранятся в памяти.
+        :param chunk_size: Количество строк в одной пачке на диске.
+        """
+        self.guard = guard
+        self.chunk_size = chunk_size
+        self.__rows: list[OfferStatistics] = []
+        self.__file = None
+        self.__spilled_count = 0
+        self.__spilled_chunks = 0
+
+    @property
+    def spilled(self) -> bool:
+        """
+        True, если строки перенесены на диск.
+        """
+        return self.__file is not None
+
+    def extend(self, rows: Iterable[OfferStatistics]) -> None:
+        """
+        Добавляет строки в хранилище.
+
+        :param rows: Строки OfferStatistics.
+        """
+        it = iter(rows)
+        while chunk := list(islice(it, self.chunk_size)):
+            self.__rows.extend(chunk)
+            if self.spilled:
+                if len(self.__rows) >= self.chunk_size:
+                    self.__flush()
+            elif self.guard is not None and self.guard.exceeded():
+                self.__file = tempfile.TemporaryFile(prefix="cian_statistics_", suffix=".spill")
+                self.__flush()
+
+    def append(self, row: OfferStatistics) -> None:
+        """
+        Добавляет одну строку в хранилище.
+
+        :param row: Строка OfferStatistics.
+        """
+        self.extend((row,))
+
+    def __flush(self) -> None:
+        it = iter(self.__rows)
+        while chunk := [astuple(row) for row in islice(it, self.chunk_size)]:
+            pickle.dump(chunk, self.__file, protocol=pickle.HIGHEST_PROTOCOL)
+            self.__spilled_count += len(chunk)
+            self.__spilled_chunks += 1
+        self.__rows = []
+
+    def batches(self, size: int = None) -> Iterator[list[OfferStatistics]]:
+        """
+        Возвращает строки пачками: сначала перенесенные на диск, затем оставшиеся в памяти.
+
+        :param size: Размер пачки для строк в памяти (по умолчанию - все строки одной пачкой).
+        :return: Генератор списков OfferStatistics.
+        """
+        if self.__file is not None:
+            self.__file.seek(0)
+            for _ in range(self.__spilled_chunks):
+                yield [OfferStatistics(*values) for values in pickle.load(self.__file)]
+            self.__file.seek(0, os.SEEK_END)
+        if not self.__rows:
+            return
+        size = size or len(self.__rows)
+        for start in range(0, len(self.__rows), size):
+            yield self.__rows[start:start + size]
+
+    def __iter__(self) -> Iterator[OfferStatistics]:
+        for batch in self.batches():
+            yield from batch
+
+    def __len__(self) -> int:
+        return self.__spilled_count + len(self.__rows)
+
+    def close(self) -> None:
+        """
+        Удаляет временный файл со строками.
+        """
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+        self.__rows = []
+        self.__spilled_count = 0
+        self.__spilled_chunks = 0
@@ -0,0 +1,131 @@
+import logging
+import threading
+import time
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+
+@dataclass
+class Stage:
+    """
+    Этап сбора данных.
+
+    :param name: Уникальное название этапа.
+    :param func: Функция этапа. Принимает результаты этапов из depends_on в том же порядке.
+    :param depends_on: Названия этапов, результаты которых нужны для запуска.
+    """
+    name: str
+    func: Callable[..., Any]
+    depends_on: tuple[str, ...] = field(default_factory=tuple)
+
+
+def check_stages(stages: list[Stage]) -> None:
+    """
+    Проверяет, что названия этапов уникальны, все зависимости существуют и в графе нет циклов.
+
+    :param stages: Список этапов.
+    :raises ValueError: Если граф этапов некорректен.
+    """
+    names = [stage.name for stage in stages]
+    if len(names) != len(set(names)):
+        raise ValueError(f"Названия этапов должны быть уникальны: {names}")
+    stages_by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        for dependency in stage.depends_on:
+            if dependency not in stages_by_name:
+                raise ValueError(f"Этап {stage.name} зависит от неизвестного этапа {dependency}")
+
+    resolved = set()
+    while len(resolved) < len(stages):
+        ready = [
+            stage.name for stage in stages
+            if stage.name not in resolved and set(stage.depends_on) <= resolved
+        ]
+        if not ready:
+            raise ValueError(f"Циклическая зависимость между этапами: {set(names) - resolved}")
+        resolved.update(ready)
+
+
+def select_stages(stages: list[Stage], target: str) -> list[Stage]:
+    """
+    Выбирает этап target и все этапы, от которых он прямо или косвенно зависит.
+
+    :param stages: Список этапов.
+    :param target: Название итогового этапа.
+    :return: Список выбранных этапов в исходном порядке.
+    :raises ValueError: Если этап target или одна из зависимостей не найдены.
+    """
+    stages_by_name = {stage.name: stage for stage in stages}
+    selected = set()
+    to_visit = [target]
+    while to_visit:
+        name = to_visit.pop()
+        if name in selected:
+            continue
+        if name not in stages_by_name:
+            raise ValueError(f"Этап {name} не найден")
+        selected.add(name)
+        to_visit.extend(stages_by_name[name].depends_on)
+    return [stage for stage in stages if stage.name in selected]
+
+
+def run_stages(
+        stages: list[Stage],
+        logger: logging.Logger,
+        max_workers: int = None,
+        cancel: threading.Event = None
+) -> dict[str, Any]:
+    """
+    Выполняет этапы параллельно с учетом зависимостей между ними.
+
+    Этап запускается, как только завершены все этапы из его depends_on, поэтому общее
+    время работы определяется самой длинной цепочкой зависимостей, а не суммой этапов.
+    Время выполнения каждого этапа записывается в лог.
+
+    :param stages: Список этапов.
+    :param logger: Логгер для записи времени выполнения этапов.
+    :param max_workers: Максимальное количество одновременно выполняемых этапов
+    (по умолчанию - количество этапов).
+    :param cancel: Событие отмены сбора. Устанавливается при ошибке этапа, чтобы выполняющиеся
+    этапы завершились при следующей проверке (например, перед запросом к API, см. CianApi).
+    :return: Словарь: название этапа -> результат его функции.
+    :raises ValueError: Если граф этапов некорректен.
+    :raises Exception: Первое исключение, возникшее в одном из этапов. Пробрасывается сразу,
+    без ожидания выполняющихся этапов; этапы, которые еще не запущены, отменяются.
+    """
+    check_stages(stages)
+    results = {}
+    pending = list(stages)
+    running: dict[Future, tuple[Stage, float]] = {}
+    started_at = time.perf_counter()
+
+    executor = ThreadPoolExecutor(max_workers=max_workers or len(stages) or 1)
+    try:
+        while pending or running:
+            for stage in [stage for stage in pending if all(name in results for name in stage.depends_on)]:
+                pending.remove(stage)
+                logger.info(f"Запуск этапа: {stage.name}")
+                future = executor.submit(
+                    stage.func,
+                    *(results[name] for name in stage.depends_on)
+                )
+                running[future] = (stage, time.perf_counter())
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, stage_started_at = running.pop(future)
+                results[stage.name] = future.result()
+                logger.info(
+                    f"Этап {stage.name} завершен за {time.perf_counter() - stage_started_at:.2f} с"
+                )
+    except BaseException:
+        if cancel is not None:
+            cancel.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown()
+
+    logger.info(f"Все этапы завершены за {time.perf_counter() - started_at:.2f} с")
+    return results
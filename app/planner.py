@@ -0,0 +1,314 @@
+import logging
+import time
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from .cassette import Cassette, request_key
+from .cian_api import CianApi
+from .cian_helpers import (
+    AUCTION_CHUNK_SIZE,
+    DETAILS_CHUNK_SIZE,
+    EMPLOYEE_WORKERS,
+    EVENTS_PAGE_SIZE,
+    REQUEST_PAUSE,
+    chunk_list,
+    fetch_all_my_offer_ids,
+    fetch_employee_ids,
+    offer_in_shard,
+    prune_offers,
+    split_date_range
+)
+from .enums import CassetteMode, RequestLog, Url
+
+# Время ответа, если для эндпоинта нет ни записанных, ни замеренных значений (секунды)
+DEFAULT_LATENCY = 0.5
+
+
+@dataclass
+class EndpointPlan:
+    """
+    Оценка запросов одного этапа сбора.
+
+    :param stage: Название этапа.
+    :param url: URL эндпоинта.
+    :param requests: Количество запросов.
+    :param cached: Сколько из них уже есть в кассете.
+    :param exact: False, если количество запросов - нижняя оценка (постраничная загрузка).
+    :param latency: Ожидаемое время ответа в секундах.
+    :param parallel: Сколько запросов этапа выполняется одновременно.
+    :param pauses: Количество пауз REQUEST_PAUSE между запросами этапа.
+    """
+    stage: str
+    url: str
+    requests: int
+    cached: int = 0
+    exact: bool = True
+    latency: float = DEFAULT_LATENCY
+    parallel: int = 1
+    pauses: int = 0
+
+    @property
+    def network_requests(self) -> int:
+        """
+        Количество запросов, которые нужно отправить в API.
+        """
+        return self.requests - self.cached
+
+    @property
+    def duration(self) -> float:
+        """
+        Ожидаемая длительность этапа в секундах.
+        """
+        return self.network_requests * self.latency / self.parallel + self.pauses * REQUEST_PAUSE
+
+
+@dataclass
+class CollectionPlan:
+    """
+    План сбора статистики.
+
+    :param offers: Количество объявлений.
+    :param windows: Количество окон статистики просмотров по всем объявлениям.
+    :param ids_duration: Фактическая длительность получения списка объявлений в секундах.
+    :param endpoints: Оценки по этапам.
+    :param views_after_details: Этап просмотров выполняется после деталей и аукциона (--max-memory).
+    """
+    offers: int
+    windows: int
+    ids_duration: float
+    endpoints: list[EndpointPlan] = field(default_factory=list)
+    views_after_details: bool = False
+
+    @property
+    def requests(self) -> int:
+        """
+        Общее количество запросов к API.
+        """
+        return sum(endpoint.network_requests for endpoint in self.endpoints)
+
+    @property
+    def duration(self) -> float:
+        """
+        Ожидаемая длительность сбора в секундах с учетом параллельных этапов (см. collection_stages).
+        """
+        durations = defaultdict(float)
+        for endpoint in self.endpoints:
+            durations[endpoint.stage] += endpoint.duration
+        if self.views_after_details:
+            offers_stages = max(durations["details"], durations["auction"]) + durations["views"]
+        else:
+            offers_stages = max(durations["details"], durations["auction"], durations["views"])
+        events_stages = durations["employees"] + max(durations["chats"], durations["calls"])
+        return max(self.ids_duration + offers_stages, events_stages)
+
+    def format(self) -> list[str]:
+        """
+        Форматирует план в виде таблицы.
+
+        :return: Строки для вывода в лог.
+        """
+        lines = [
+            f"Объявлений в периоде: {self.offers} | Окон статистики просмотров: {self.windows} | "\
+            f"Список объявлений получен за {self.ids_duration:.1f} с",
+            f"{'Этап':<10} {'Запросов':>10} {'В кэше':>8} {'К API':>10} {'Ответ, с':>9} {'Время, с':>10}",
+        ]
+        for endpoint in self.endpoints:
+            prefix = "" if endpoint.exact else ">="
+            lines.append(
+                f"{endpoint.stage:<10} {prefix + str(endpoint.requests):>10} {endpoint.cached:>8} "\
+                f"{prefix + str(endpoint.network_requests):>10} {endpoint.latency:>9.2f} {endpoint.duration:>10.1f}"
+            )
+        lines.append(f"Запросов к API: {self.requests}")
+        lines.append(f"Ожидаемая длительность сбора: {timedelta(seconds=round(self.duration))}")
+        return lines
+
+
+class KeyRecorder:
+    def __init__(self) -> None:
+        """
+        Заменяет кассету CianApi в режиме воспроизведения: запоминает ключи запросов
+        (см. request_key) вместо их отправки. Позволяет получить параметры запросов
+        из тех же методов CianApi, что используются при сборе.
+        """
+        self.mode = CassetteMode.REPLAY
+        self.keys: list[str] = []
+
+    def play(self, url: str, params: dict) -> dict:
+        """
+        Запоминает ключ запроса и возвращает пустой ответ.
+        """
+        self.keys.append(request_key(url, params))
+        return {}
+
+    def pop_key(self) -> str:
+        """
+        Возвращает ключ последнего запроса.
+        """
+        return self.keys.pop()
+
+
+def plan_collection(
+        cian: CianApi,
+        date_from: datetime,
+        date_to: datetime,
+        logger: logging.Logger,
+        cassette: Cassette = None,
+        shard: tuple[int, int] = None,
+        by_employees: bool = False,
+        views_after_details: bool = False,
+        include_inactive: bool = False
+) -> CollectionPlan:
+    """
+    Составляет план сбора статистики без запросов статистики.
+
+    Список объявлений запрашивается (это один проход по get-my-offers), остальные запросы
+    только подсчитываются с учетом размеров пачек, периода публикации объявлений (см. prune_offers)
+    и разбиения периода на окна. Запросы,
+    ответы на которые уже записаны в кассету, учитываются отдельно. Время ответа берется
+    из кассеты, а если в ней нет записей эндпоинта - из замеров при получении списка объявлений.
+
+    Количество страниц чатов и звонков заранее неизвестно: если они не записаны в кассету,
+    учитывается одна страница на каждого сотрудника (или на агентство), как нижняя оценка.
+
+    :param cian: Экземпляр класса CianApi для взаимодействия с API.
+    :param date_from: Дата начала периода.
+    :param date_to: Дата окончания периода.
+    :param logger: Логгер.
+    :param cassette: Кассета с записанными ответами.
+    :param shard: Кортеж (номер шарда, количество шардов).
+    :param by_employees: Чаты и звонки загружаются по сотрудникам (см. collection_stages).
+    :param views_after_details: Этап просмотров выполняется после деталей и аукциона (--max-memory).
+    :param include_inactive: Учитывать снятые с публикации объявления (см. collection_stages).
+    :return: План сбора.
+    """
+    recorder = KeyRecorder()
+    probe_logger = logger.getChild("plan")
+    probe_logger.setLevel(logging.WARNING)
+    probe = CianApi("", logger=probe_logger, cassette=recorder, request_log=RequestLog.DEBUG)
+
+    def latency(url: str) -> float:
+        recorded = cassette.median_latency(url) if cassette else None
+        if recorded is not None:
+            return recorded
+        for observed_url in (url, Url.MY_OFFERS.value):
+            observed = cian.latencies[observed_url].average()
+            if observed is not None:
+                return observed
+        return DEFAULT_LATENCY
+
+    def cached_count(url: str, keys: list[str]) -> int:
+        if cassette is None:
+            return 0
+        recorded = cassette.recorded_keys(url)
+        return sum(key in recorded for key in keys)
+
+    def endpoint_plan(stage: str, url: str, keys: list[str], **kwargs) -> EndpointPlan:
+        return EndpointPlan(
+            stage, url, len(keys), cached_count(url, keys), latency=latency(url), **kwargs
+        )
+
+    def pages_plan(stage: str, url: str, request_page, partitions: list) -> EndpointPlan:
+        recorded = cassette.recorded_keys(url) if cassette else set()
+        requests, cached, exact = 0, 0, True
+        for partition in partitions:
+            page = 1
+            while True:
+                request_page(page, partition)
+                if recorder.pop_key() not in recorded:
+                    break
+                page += 1
+            if page == 1:
+                requests += 1
+                exact = False
+            else:
+                requests += page - 1
+                cached += page - 1
+        if partitions != [None]:
+            # Сверка с первой страницей выдачи по всему агентству (см. merge_unpartitioned)
+            request_page(1, None)
+            requests += 1
+            cached += recorder.pop_key() in recorded
+        return EndpointPlan(
+            stage, url, requests, cached, exact, latency(url),
+            parallel=min(EMPLOYEE_WORKERS, len(partitions))
+        )
+
+    started_at = time.perf_counter()
+    offers = fetch_all_my_offer_ids(cian, logger, include_inactive=include_inactive)
+    ids_duration = time.perf_counter() - started_at
+    if shard is not None:
+        offers = [offer for offer in offers if offer_in_shard(offer.listing_id, shard)]
+    offers, offer_windows = prune_offers(offers, date_from, date_to)
+    offer_ids = [offer.listing_id for offer in offers]
+
+    endpoints = []
+    for chunk in chunk_list(offer_ids, DETAILS_CHUNK_SIZE):
+        probe.get_my_offers_detail(chunk)
+    detail_keys = recorder.keys[:]
+    recorder.keys.clear()
+    endpoints.append(
+        endpoint_plan("details", Url.MY_OFFERS_DETAI.value, detail_keys, pauses=len(detail_keys))
+    )
+
+    for chunk in chunk_list(offer_ids, AUCTION_CHUNK_SIZE):
+        probe.get_auction(chunk)
+    auction_keys = recorder.keys[:]
+    recorder.keys.clear()
+    endpoints.append(
+        endpoint_plan("auction", Url.AUCTION.value, auction_keys, pauses=len(auction_keys))
+    )
+
+    max_windows = 1
+    for offer_id in offer_ids:
+        windows = split_date_range(*offer_windows[offer_id])
+        max_windows = max(max_windows, len(windows))
+        for window_start, window_end in windows:
+            probe.get_views_statistics_by_days(
+                window_start.strftime("%Y-%m-%d"), window_end.strftime("%Y-%m-%d"), offer_id
+            )
+    views_keys = recorder.keys[:]
+    recorder.keys.clear()
+    endpoints.append(
+        endpoint_plan(
+            "views", Url.VIEWS_STATISTICS_BY_DAYS.value, views_keys,
+            parallel=max_windows, pauses=len(offer_ids)
+        )
+    )
+
+    partitions = [None]
+    if by_employees:
+        employees_started_at = time.perf_counter()
+        try:
+            partitions = fetch_employee_ids(cian) or [None]
+        except Exception as _ex:
+            logger.warning(f"Не удалось получить список сотрудников: {_ex}")
+        endpoints.append(
+            EndpointPlan(
+                "employees", Url.MY_AGENTS.value, 1,
+                latency=time.perf_counter() - employees_started_at
+            )
+        )
+    endpoints.append(
+        pages_plan(
+            "chats", Url.CHATS.value,
+            lambda page, employee_id: probe.get_chats(
+                page, page_size=EVENTS_PAGE_SIZE, employee_id=employee_id
+            ),
+            partitions
+        )
+    )
+    endpoints.append(
+        pages_plan(
+            "calls", Url.CALLS_REPORT.value,
+            lambda page, employee_id: probe.get_calls_report(
+                page, EVENTS_PAGE_SIZE, date_from.strftime("%Y-%m-%d"),
+                date_to.strftime("%Y-%m-%d"), employee_id
+            ),
+            partitions
+        )
+    )
+    return CollectionPlan(
+        len(offers), len(views_keys), ids_duration, endpoints, views_after_details
+    )
@@ -0,0 +1,218 @@
+import numpy as np
+
+from datetime import datetime
+
+from .datacls import OfferStatistics
+
+# Периоды агрегации и названия листов Google таблицы для сводок
+PERIODS = {
+    "week": "Сводка по неделям",
+    "month": "Сводка по месяцам",
+}
+# Разрезы агрегации: название в таблице -> способ получения значения из OfferStatistics
+DIMENSIONS = {
+    "Объявление": lambda offer: offer.listing_id,
+    "Тип недвижимости": lambda offer: offer.property_type,
+    "Предложения": lambda offer: offer.offers,
+    "Регион": lambda offer: extract_region(offer.address),
+}
+SUMMARY_HEADERS = [
+    "Начало периода",
+    "Разрез",
+    "Значение",
+    "Просмотры",
+    "Звонки",
+    "Чаты",
+    "Лайки",
+    "Конверсия в звонки, %",
+    "Конверсия в чаты, %",
+]
+METRICS = ("views", "calls", "chats", "likes")
+# Количество первых столбцов SUMMARY_HEADERS, которые определяют строку сводки (период и разрез)
+SUMMARY_KEY_SIZE = 3
+EMPTY_VALUE = "Не указано"
+
+
+def extract_region(address: str | None) -> str | None:
+    """
+    Извлекает регион из адреса объявления (первая часть адреса до запятой).
+
+    :param address: Адрес объявления, например "Тульская область, Венёв, улица Гагарина, 4".
+    :return: Регион, например "Тульская область", или None, если адрес не указан.
+    """
+    if not address:
+        return None
+    return address.split(",", 1)[0].strip()
+
+
+def factorize(values: list) -> tuple[np.ndarray, list]:
+    """
+    Кодирует значения целыми числами в порядке первого появления.
+
+    :param values: Список значений (любых хешируемых объектов).
+    :return: Кортеж из массива кодов и списка уникальных значений.
+    """
+    index = {}
+    codes = np.fromiter(
+        (index.setdefault(value, len(index)) for value in values),
+        dtype=np.int64,
+        count=len(values)
+    )
+    return codes, list(index)
+
+
+def parse_report_dates(report_dates: list[str]) -> np.ndarray:
+    """
+    Преобразует даты отчета в формате "DD.MM.YYYY" в массив numpy.datetime64[D].
+
+    Каждая уникальная дата разбирается один раз, поэтому стоимость не зависит от числа объявлений.
+
+    :param report_dates: Список дат отчета.
+    :return: Массив дат numpy.datetime64[D].
+    """
+    codes, unique_dates = factorize(report_dates)
+    parsed = np.array(
+        [f"{date[6:10]}-{date[3:5]}-{date[0:2]}" for date in unique_dates],
+        dtype="datetime64[D]"
+    )
+    return parsed[codes]
+
+
+def period_starts(days: np.ndarray, period: str) -> np.ndarray:
+    """
+    Вычисляет начало периода (понедельник недели или первое число месяца) для каждой даты.
+
+    :param days: Массив дат numpy.datetime64[D].
+    :param period: Период агрегации: "week" или "month".
+    :return: Массив дат начала периода numpy.datetime64[D].
+    """
+    if period == "week":
+        # 1970-01-01 — четверг, сдвиг на 3 дня дает понедельник как начало недели
+        return days - (days.astype(np.int64) + 3) % 7
+    if period == "month":
+        return days.astype("datetime64[M]").astype("datetime64[D]")
+    raise ValueError(f"Неизвестный период агрегации: {period}")
+
+
+def period_ends(starts: np.ndarray, period: str) -> np.ndarray:
+    """
+    Вычисляет последний день периода (воскресенье недели или последнее число месяца).
+
+    :param starts: Массив дат начала периода numpy.datetime64[D] (см. period_starts).
+    :param period: Период агрегации: "week" или "month".
+    :return: Массив дат numpy.datetime64[D].
+    """
+    if period == "week":
+        return starts + 6
+    if period == "month":
+        return (starts.astype("datetime64[M]") + 1).astype("datetime64[D]") - 1
+    raise ValueError(f"Неизвестный период агрегации: {period}")
+
+
+def offers_to_columns(offers: list[OfferStatistics]) -> dict[str, np.ndarray]:
+    """
+    Преобразует список OfferStatistics в набор колонок numpy.
+
+    :param offers: Список объектов OfferStatistics (по одному на объявление и день).
+    :return: Словарь колонок: "day" с датами и по одной колонке на каждую метрику из METRICS.
+    """
+    columns = {
+        "day": parse_report_dates([offer.report_date for offer in offers])
+    }
+    for metric in METRICS:
+        columns[metric] = np.fromiter(
+            (getattr(offer, metric) or 0 for offer in offers),
+            dtype=np.int64,
+            count=len(offers)
+        )
+    return columns
+
+
+def rollup(
+        columns: dict[str, np.ndarray],
+        starts: np.ndarray,
+        dimension_codes: np.ndarray,
+        dimension_values: list,
+        dimension_name: str
+) -> list[list]:
+    """
+    Суммирует метрики по паре (начало периода, значение разреза) и считает конверсии.
+
+    :param columns: Колонки, полученные из offers_to_columns.
+    :param starts: Начало периода для каждой строки.
+    :param dimension_codes: Код значения разреза для каждой строки.
+    :param dimension_values: Значения разреза, индексируемые кодом.
+    :param dimension_name: Название разреза для вывода в таблицу.
+    :return: Строки сводной таблицы в формате SUMMARY_HEADERS.
+    """
+    unique_starts, start_codes = np.unique(starts, return_inverse=True)
+    keys = start_codes * len(dimension_values) + dimension_codes
+    unique_keys, group = np.unique(keys, return_inverse=True)
+
+    sums = {
+        metric: np.bincount(group, weights=columns[metric], minlength=len(unique_keys))
+        for metric in METRICS
+    }
+    views = sums["views"]
+    conversion_calls = np.divide(
+        sums["calls"] * 100, views, out=np.zeros_like(views), where=views > 0
+    ).round(2)
+    conversion_chats = np.divide(
+        sums["chats"] * 100, views, out=np.zeros_like(views), where=views > 0
+    ).round(2)
+
+    group_starts = unique_starts[unique_keys // len(dimension_values)].astype(object)
+    group_values = (unique_keys % len(dimension_values)).tolist()
+    rows = []
+    for i in range(len(unique_keys)):
+        value = dimension_values[group_values[i]]
+        rows.append([
+            group_starts[i].strftime("%d.%m.%Y"),
+            dimension_name,
+            EMPTY_VALUE if value is None else value,
+            *(int(sums[metric][i]) for metric in METRICS),
+            float(conversion_calls[i]),
+            float(conversion_chats[i]),
+        ])
+    return rows
+
+
+def build_rollups(
+        offers: list[OfferStatistics],
+        date_from: datetime,
+        date_to: datetime,
+        periods: tuple[str, ...] = tuple(PERIODS)
+) -> dict[str, list[list]]:
+    """
+    Строит сводки по периодам для всех разрезов из DIMENSIONS.
+
+    В сводку попадают только периоды, целиком лежащие внутри собранного периода
+    [date_from, date_to]: неполные недели и месяцы на границах пропускаются, чтобы
+    их частичные суммы не записывались как итоговые.
+
+    :param offers: Список объектов OfferStatistics (по одному на объявление и день).
+    :param date_from: Дата начала собранного периода.
+    :param date_to: Дата окончания собранного периода.
+    :param periods: Периоды агрегации (ключи PERIODS).
+    :return: Словарь: период -> строки сводной таблицы в формате SUMMARY_HEADERS.
+    """
+    if not offers:
+        return {period: [] for period in periods}
+
+    columns = offers_to_columns(offers)
+    dimensions = {
+        name: factorize([get_value(offer) for offer in offers])
+        for name, get_value in DIMENSIONS.items()
+    }
+    first_day = np.datetime64(date_from.date(), "D")
+    last_day = np.datetime64(date_to.date(), "D")
+    rollups = {}
+    for period in periods:
+        starts = period_starts(columns["day"], period)
+        complete = (starts >= first_day) & (period_ends(starts, period) <= last_day)
+        period_columns = {name: column[complete] for name, column in columns.items()}
+        rows = []
+        for name, (codes, values) in dimensions.items():
+            rows.extend(rollup(period_columns, starts[complete], codes[complete], values, name))
+        rollups[period] = rows
+    return rollups
@@ -2,6 +2,7 @@ import yaml
 
 from pathlib import Path
 
+from .enums import PartitionPeriod
 from .datacls import (
     CianConfig,
     GoogleConfig,
@@ -13,7 +14,8 @@ from .exceptions import (
     MissingPathToCreds,
     MissingSpreadsheetId,
     MissingWorksheetId,
-    MissingAccessToken
+    MissingAccessToken,
+    InvalidPartitionPeriod
 )
 
 
@@ -63,6 +65,16 @@ class SettingsYamlFile:
         if not worksheet_id:
             raise MissingWorksheetId("Id листа таблицы не указан в файле settings.yaml!")
 
+        partition_period = self.__settings.get("Google").get("partition_period")
+        if partition_period:
+            try:
+                partition_period = PartitionPeriod(partition_period)
+            except ValueError:
+                raise InvalidPartitionPeriod(
+                    f"Неизвестный период разбиения листов: {partition_period}! "\
+                    f"Допустимые значения: {', '.join(period.value for period in PartitionPeriod)}"
+                )
+
         access_token = self.__settings.get("Cian").get("access_token")
         if not access_token:
             raise MissingAccessToken("Отсутсвует ключ для доступа к API Cian!")
@@ -71,7 +83,8 @@ class SettingsYamlFile:
             GoogleConfig(
                 path_to_creds,
                 spreadsheet_id,
-                worksheet_id
+                worksheet_id,
+                partition_period or None
             ),
             CianConfig(
                access_token
@@ -0,0 +1,161 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Iterator
+
+# Суффикс файла кэша подключения, который создается рядом с файлом учетных данных
+CACHE_SUFFIX = ".sheets_cache.json"
+# Запас до истечения токена доступа, после которого он считается недействительным (секунды)
+TOKEN_EXPIRY_MARGIN = 300
+# Суффикс файла блокировки кэша между процессами
+LOCK_SUFFIX = ".lock"
+
+
+def default_cache_path(path_creds_json: Path) -> Path:
+    """
+    Возвращает путь к файлу кэша подключения для файла учетных данных.
+
+    :param path_creds_json: Путь к JSON файлу с учетными данными для Google API.
+    :return: Путь вида "<имя файла учетных данных>.sheets_cache.json" в той же папке.
+    """
+    path_creds_json = Path(path_creds_json)
+    return path_creds_json.with_name(path_creds_json.stem + CACHE_SUFFIX)
+
+
+class SheetsCache:
+    def __init__(self, path: Path, logger: logging.Logger) -> None:
+        """
+        Локальный кэш подключения к Google Sheets между запусками.
+
+        Хранит токены доступа сервисных аккаунтов до истечения их срока и отметки
+        о проверке заголовков листов вместе с метаданными листа, при которых проверка
+        выполнялась. Файл содержит токен доступа, поэтому создается с правами 0600.
+        Изменение файла выполняется под блокировкой файла "<путь к кэшу>.lock" (fcntl.flock,
+        где он доступен): записи параллельных процессов не затирают друг друга.
+        Ошибки чтения и записи файла не прерывают работу: кэш просто не используется.
+
+        :param path: Путь к файлу кэша.
+        :param logger: Логгер для записи ошибок работы с файлом.
+        """
+        self.path = Path(path)
+        self.logger = logger
+        self.__lock = threading.Lock()
+        self.__data = None
+
+    def __load(self) -> dict:
+        if self.__data is None:
+            try:
+                with open(self.path, encoding="utf-8") as file:
+                    self.__data = json.load(file)
+            except FileNotFoundError:
+                self.__data = {}
+            except (OSError, ValueError) as _ex:
+                self.logger.warning(f"Не удалось прочитать кэш подключения {self.path}: {_ex}")
+                self.__data = {}
+        return self.__data
+
+    def __save(self) -> None:
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=self.path.name, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                json.dump(self.__data, file, ensure_ascii=False, indent=2)
+            os.chmod(tmp_path, 0o600)
+            # Замена файла атомарна: параллельные запуски не прочитают его наполовину записанным
+            os.replace(tmp_path, self.path)
+        except OSError as _ex:
+            self.logger.warning(f"Не удалось сохранить кэш подключения {self.path}: {_ex}")
+
+    @contextmanager
+    def __locked(self) -> Iterator[None]:
+        with self.__lock:
+            lock_file = None
+            try:
+                import fcntl
+
+                lock_file = open(self.path.with_name(self.path.name + LOCK_SUFFIX), "a")
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            except ImportError:
+                # Без fcntl (Windows) файл защищен только от потоков текущего процесса
+                pass
+            except OSError as _ex:
+                self.logger.warning(f"Не удалось заблокировать кэш подключения {self.path}: {_ex}")
+            try:
+                yield
+            finally:
+                # Закрытие файла снимает блокировку
+                if lock_file is not None:
+                    lock_file.close()
+
+    def __update(self, section: str, key: str, value: Any) -> None:
+        with self.__locked():
+            # Файл перечитывается под блокировкой: его мог изменить другой процесс
+            self.__data = None
+            self.__load().setdefault(section, {})[key] = value
+            self.__save()
+
+    @staticmethod
+    def __token_key(credentials) -> str:
+        return f"{credentials.service_account_email} {' '.join(sorted(credentials.scopes or []))}"
+
+    def load_token(self, credentials) -> bool:
+        """
+        Подставляет в учетные данные сохраненный токен доступа, если он еще действителен.
+
+        :param credentials: Учетные данные сервисного аккаунта (google.oauth2.service_account.Credentials).
+        :return: True, если токен подставлен и запрашивать новый не нужно.
+        """
+        with self.__lock:
+            cached = self.__load().get("tokens", {}).get(self.__token_key(credentials))
+        if not cached:
+            return False
+        try:
+            expiry = datetime.fromisoformat(cached["expiry"])
+        except (KeyError, TypeError, ValueError):
+            return False
+        # google-auth хранит срок действия токена как naive datetime в UTC
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        if expiry - timedelta(seconds=TOKEN_EXPIRY_MARGIN) <= now:
+            return False
+        credentials.token = cached["token"]
+        credentials.expiry = expiry
+        return True
+
+    def save_token(self, credentials) -> None:
+        """
+        Сохраняет токен доступа учетных данных и срок его действия.
+
+        :param credentials: Учетные данные сервисного аккаунта с полученным токеном.
+        """
+        if not credentials.token or credentials.expiry is None:
+            return
+        self.__update(
+            "tokens",
+            self.__token_key(credentials),
+            {"token": credentials.token, "expiry": credentials.expiry.isoformat()}
+        )
+
+    def headers_verified(self, key: str, metadata: dict) -> bool:
+        """
+        Проверяет, были ли заголовки листа проверены при тех же метаданных листа.
+
+        :param key: Ключ листа ("<ID таблицы>:<ID листа>").
+        :param metadata: Текущие метаданные листа (см. QuotaAwareWorksheet.metadata).
+        :return: True, если повторная проверка не нужна.
+        """
+        with self.__lock:
+            return self.__load().get("headers", {}).get(key) == metadata
+
+    def mark_headers_verified(self, key: str, metadata: dict) -> None:
+        """
+        Сохраняет отметку о проверке заголовков листа.
+
+        :param key: Ключ листа ("<ID таблицы>:<ID листа>").
+        :param metadata: Метаданные листа, при которых выполнялась проверка.
+        """
+        self.__update("headers", key, metadata)
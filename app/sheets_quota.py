@@ -0,0 +1,407 @@
+from __future__ import annotations
+
+import logging
+import random
+import threading
+import time
+
+from collections import deque
+from typing import TYPE_CHECKING, Any, Callable, Collection
+
+if TYPE_CHECKING:
+    import gspread
+
+# Статусы ответа Google API, при которых запрос повторяется с задержкой
+RETRY_STATUSES = (429, 500, 503)
+# Статусы, при которых повторяется неидемпотентный запрос (дописывание строк, создание листа):
+# 429 означает, что запрос отклонен до выполнения, а после 500/503 он мог быть уже выполнен
+NON_IDEMPOTENT_RETRY_STATUSES = (429,)
+# Квоты Google Sheets API на одного пользователя по умолчанию (запросов в минуту)
+READ_REQUESTS_PER_MINUTE = 60
+WRITE_REQUESTS_PER_MINUTE = 60
+
+
+class QuotaLimiter:
+    def __init__(self, requests_per_period: int, period: float = 60.0) -> None:
+        """
+        Ограничитель количества запросов в скользящем окне.
+
+        :param requests_per_period: Допустимое количество запросов за период.
+        :param period: Длительность периода в секундах.
+        """
+        self.requests_per_period = requests_per_period
+        self.period = period
+        self.__calls = deque()
+        self.__lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Ожидает, пока в текущем окне освободится место под запрос, и занимает его.
+
+        :return: Время ожидания в секундах.
+        """
+        waited = 0.0
+        while True:
+            with self.__lock:
+                now = time.monotonic()
+                while self.__calls and now - self.__calls[0] >= self.period:
+                    self.__calls.popleft()
+                if len(self.__calls) < self.requests_per_period:
+                    self.__calls.append(now)
+                    return waited
+                delay = self.__calls[0] + self.period - now
+            time.sleep(delay)
+            waited += delay
+
+
+class SheetsQuota:
+    def __init__(
+            self,
+            logger: logging.Logger,
+            read_per_minute: int = READ_REQUESTS_PER_MINUTE,
+            write_per_minute: int = WRITE_REQUESTS_PER_MINUTE,
+            max_retries: int = 6
+    ) -> None:
+        """
+        Учет квот Google Sheets API на чтение и запись.
+
+        Перед каждым запросом ожидает освобождения квоты, а при ответах 429/5xx повторяет
+        запрос с экспоненциальной задержкой вместо того, чтобы сразу завершаться ошибкой.
+
+        :param logger: Логгер для записи ожиданий и повторов.
+        :param read_per_minute: Квота запросов на чтение в минуту.
+        :param write_per_minute: Квота запросов на запись в минуту.
+        :param max_retries: Максимальное количество повторов одного запроса.
+        """
+        self.logger = logger
+        self.read_limiter = QuotaLimiter(read_per_minute)
+        self.write_limiter = QuotaLimiter(write_per_minute)
+        self.max_retries = max_retries
+        # Количество фактически выполненных запросов (включая повторы)
+        self.reads = 0
+        self.writes = 0
+
+    def read(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Выполняет запрос на чтение с учетом квоты.
+
+        :param func: Функция gspread, выполняющая запрос.
+        :return: Результат функции.
+        :raises gspread.exceptions.APIError: Если запрос не удался после всех повторов.
+        """
+        return self.__call("reads", self.read_limiter, RETRY_STATUSES, func, *args, **kwargs)
+
+    def write(self, func: Callable[..., Any], *args, idempotent: bool = True, **kwargs) -> Any:
+        """
+        Выполняет запрос на запись с учетом квоты.
+
+        :param func: Функция gspread, выполняющая запрос.
+        :param idempotent: Повторное выполнение запроса не меняет результат. Если False,
+        запрос повторяется только при статусе 429 (см. NON_IDEMPOTENT_RETRY_STATUSES).
+        :return: Результат функции.
+        :raises gspread.exceptions.APIError: Если запрос не удался после всех повторов.
+        """
+        retry_statuses = RETRY_STATUSES if idempotent else NON_IDEMPOTENT_RETRY_STATUSES
+        return self.__call("writes", self.write_limiter, retry_statuses, func, *args, **kwargs)
+
+    def __call(
+            self,
+            counter: str,
+            limiter: QuotaLimiter,
+            retry_statuses: tuple[int, ...],
+            func: Callable[..., Any],
+            *args,
+            **kwargs
+    ) -> Any:
+        import gspread
+
+        attempt = 0
+        while True:
+            waited = limiter.acquire()
+            setattr(self, counter, getattr(self, counter) + 1)
+            if waited:
+                self.logger.info(f"Ожидание квоты Google Sheets API: {waited:.1f} с")
+            try:
+                return func(*args, **kwargs)
+            except gspread.exceptions.APIError as _ex:
+                status = _ex.response.status_code
+                if status not in retry_statuses or attempt >= self.max_retries:
+                    raise
+                delay = min(2 ** attempt, 64) + random.random()
+                attempt += 1
+                self.logger.warning(
+                    f"Google Sheets API вернул статус {status}! "\
+                    f"Повтор через {delay:.1f} с. Попытка: {attempt}"
+                )
+                time.sleep(delay)
+
+
+def quote_title(title: str) -> str:
+    """
+    Экранирует название листа для использования в A1-нотации.
+
+    :param title: Название листа.
+    :return: Название в одинарных кавычках.
+    """
+    return "'{}'".format(title.replace("'", "''"))
+
+
+def to_row_data(rows: list[list]) -> list[dict]:
+    """
+    Преобразует строки значений в формат RowData для запроса updateCells.
+
+    Значения записываются как есть, без интерпретации (аналог valueInputOption=RAW).
+
+    :param rows: Строки значений.
+    :return: Список RowData.
+    """
+    row_data = []
+    for row in rows:
+        values = []
+        for value in row:
+            if value is None:
+                values.append({})
+            elif isinstance(value, bool):
+                values.append({"userEnteredValue": {"boolValue": value}})
+            elif isinstance(value, (int, float)):
+                values.append({"userEnteredValue": {"numberValue": value}})
+            else:
+                values.append({"userEnteredValue": {"stringValue": str(value)}})
+        row_data.append({"values": values})
+    return row_data
+
+
+def update_cells_request(sheet_id: int, start_row_index: int, rows: list[list]) -> dict:
+    """
+    Формирует запрос updateCells для записи строк начиная с указанной строки.
+
+    :param sheet_id: Идентификатор листа.
+    :param start_row_index: Индекс первой строки (с нуля).
+    :param rows: Строки значений.
+    :return: Запрос для spreadsheets.batchUpdate.
+    """
+    return {
+        "updateCells": {
+            "start": {"sheetId": sheet_id, "rowIndex": start_row_index, "columnIndex": 0},
+            "rows": to_row_data(rows),
+            "fields": "userEnteredValue",
+        }
+    }
+
+
+class QuotaAwareWorksheet:
+    def __init__(
+            self,
+            spreadsheet: gspread.spreadsheet.Spreadsheet,
+            sheet_id: int,
+            title: str,
+            row_count: int,
+            quota: SheetsQuota,
+            column_count: int = None
+    ) -> None:
+        """
+        Обертка над листом Google таблицы, выполняющая запросы с учетом квот.
+
+        Изменение размера листа и запись данных объединяются в один запрос batchUpdate.
+
+        :param spreadsheet: Google таблица, которой принадлежит лист.
+        :param sheet_id: Идентификатор листа.
+        :param title: Название листа.
+        :param row_count: Текущее количество строк в сетке листа.
+        :param quota: Учет квот Google Sheets API.
+        :param column_count: Текущее количество столбцов в сетке листа.
+        """
+        self.spreadsheet = spreadsheet
+        self.id = sheet_id
+        self.title = title
+        self.row_count = row_count
+        self.quota = quota
+        self.column_count = column_count
+
+    @classmethod
+    def from_worksheet(
+            cls,
+            worksheet: gspread.worksheet.Worksheet,
+            quota: SheetsQuota
+    ) -> QuotaAwareWorksheet:
+        """
+        Создает обертку для существующего листа gspread.
+
+        :param worksheet: Лист gspread.
+        :param quota: Учет квот Google Sheets API.
+        :return: Объект QuotaAwareWorksheet.
+        """
+        return cls(
+            worksheet.spreadsheet,
+            worksheet.id,
+            worksheet.title,
+            worksheet.row_count,
+            quota,
+            worksheet.col_count
+        )
+
+    @classmethod
+    def create(
+            cls,
+            spreadsheet: gspread.spreadsheet.Spreadsheet,
+            title: str,
+            rows: list[list],
+            quota: SheetsQuota,
+            existing_ids: Collection[int] = ()
+    ) -> QuotaAwareWorksheet:
+        """
+        Создает новый лист нужного размера и записывает в него строки одним запросом.
+
+        Запрос не идемпотентен (повтор после выполнения создал бы ошибку "лист уже существует"),
+        поэтому повторяется только при статусе 429.
+
+        :param spreadsheet: Google таблица.
+        :param title: Название нового листа.
+        :param rows: Строки для записи (включая заголовки).
+        :param quota: Учет квот Google Sheets API.
+        :param existing_ids: Идентификаторы существующих листов таблицы.
+        :return: Объект QuotaAwareWorksheet для созданного листа.
+        """
+        # Идентификатор листа задается заранее, чтобы записать данные в том же запросе
+        sheet_id = random.randint(1, 2 ** 31 - 1)
+        while sheet_id in existing_ids:
+            sheet_id = random.randint(1, 2 ** 31 - 1)
+        row_count = max(len(rows), 1)
+        column_count = max((len(row) for row in rows), default=1)
+        quota.write(
+            spreadsheet.batch_update,
+            {
+                "requests": [
+                    {
+                        "addSheet": {
+                            "properties": {
+                                "sheetId": sheet_id,
+                                "title": title,
+                                "gridProperties": {
+                                    "rowCount": row_count,
+                                    "columnCount": column_count,
+                                },
+                            }
+                        }
+                    },
+                    update_cells_request(sheet_id, 0, rows),
+                ]
+            },
+            idempotent=False
+        )
+        return cls(spreadsheet, sheet_id, title, row_count, quota, column_count)
+
+    def metadata(self) -> dict:
+        """
+        Возвращает метаданные листа, от которых зависит результат проверки заголовков.
+
+        Количество строк не учитывается: оно меняется при каждой записи.
+
+        :return: Словарь с идентификатором, названием и количеством столбцов листа.
+        """
+        return {"id": self.id, "title": self.title, "column_count": self.column_count}
+
+    def get_all_values(self, unformatted: bool = False) -> list[list]:
+        """
+        Возвращает все заполненные значения листа.
+
+        :param unformatted: Вернуть значения без форматирования (числа - числами, а не строками).
+        :return: Список строк листа (пустой список, если лист пуст).
+        """
+        params = {"valueRenderOption": "UNFORMATTED_VALUE"} if unformatted else None
+        response = self.quota.read(self.spreadsheet.values_get, quote_title(self.title), params)
+        return response.get("values", [])
+
+    def get_first_row(self, column_count: int) -> list:
+        """
+        Возвращает первую строку листа, читая только ее первые column_count ячеек.
+
+        :param column_count: Количество столбцов.
+        :return: Значения первой строки (пустой список, если строка пуста).
+        """
+        from gspread.utils import rowcol_to_a1
+
+        response = self.quota.read(
+            self.spreadsheet.values_get,
+            f"{quote_title(self.title)}!A1:{rowcol_to_a1(1, column_count)}"
+        )
+        values = response.get("values", [])
+        return values[0] if values else []
+
+    def add_rows(self, number_of_rows: int):
+        """
+        Добавляет строки в конец сетки листа.
+
+        :param number_of_rows: Количество строк.
+        """
+        self.quota.write(
+            self.spreadsheet.batch_update,
+            {
+                "requests": [
+                    {
+                        "appendDimension": {
+                            "sheetId": self.id,
+                            "dimension": "ROWS",
+                            "length": number_of_rows,
+                        }
+                    }
+                ]
+            }
+        )
+        self.row_count += number_of_rows
+
+    def write_rows(self, start_row_index: int, rows: list[list]):
+        """
+        Записывает строки начиная с указанной строки одним запросом batchUpdate.
+
+        Если строк в сетке листа не хватает, в тот же запрос добавляется appendDimension.
+
+        :param start_row_index: Индекс первой строки (с нуля).
+        :param rows: Строки значений.
+        """
+        if not rows:
+            return
+        requests = []
+        missing_rows = start_row_index + len(rows) - self.row_count
+        if missing_rows > 0:
+            requests.append(
+                {
+                    "appendDimension": {
+                        "sheetId": self.id,
+                        "dimension": "ROWS",
+                        "length": missing_rows,
+                    }
+                }
+            )
+        requests.append(update_cells_request(self.id, start_row_index, rows))
+        self.quota.write(self.spreadsheet.batch_update, {"requests": requests})
+        if missing_rows > 0:
+            self.row_count += missing_rows
+
+    def append_rows(self, rows: list[list]) -> int | None:
+        """
+        Дописывает строки после последней заполненной строки листа, не читая его содержимое.
+
+        Запрос не идемпотентен (повтор после выполнения продублировал бы строки),
+        поэтому повторяется только при статусе 429.
+
+        :param rows: Строки значений.
+        :return: Индекс строки (с нуля), следующей за дописанными, по диапазону из ответа
+        Google API, или None, если диапазон в ответе не указан.
+        """
+        from gspread.utils import a1_range_to_grid_range
+
+        if not rows:
+            return None
+        response = self.quota.write(
+            self.spreadsheet.values_append,
+            quote_title(self.title),
+            {"valueInputOption": "RAW", "insertDataOption": "INSERT_ROWS"},
+            {"values": rows},
+            idempotent=False
+        )
+        self.row_count += len(rows)
+        updated_range = (response or {}).get("updates", {}).get("updatedRange")
+        if not updated_range:
+            return None
+        return a1_range_to_grid_range(updated_range.rsplit("!", 1)[-1])["endRowIndex"]
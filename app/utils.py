@@ -3,11 +3,30 @@ import json
 from dataclasses import asdict
 from pathlib import Path
 from datetime import datetime
+from typing import IO, Iterable
 
 from .datacls import OfferStatistics
+from .exceptions import DateRangeError, ShardSetError
 
 
-def json_alarm_record(offers: list[OfferStatistics]) -> Path:
+def dump_offers(file: IO[str], offers: Iterable[OfferStatistics], indent: int = None) -> None:
+    """
+    Записывает объекты OfferStatistics в файл как JSON-массив по одному объекту за раз,
+    не формируя весь массив в памяти.
+
+    :param file: Открытый текстовый файл.
+    :param offers: Объекты OfferStatistics.
+    :param indent: Отступ для форматирования JSON (по умолчанию - без форматирования).
+    """
+    separator = ",\n" if indent is not None else ", "
+    file.write("[")
+    for index, offer in enumerate(offers):
+        if index:
+            file.write(separator)
+        file.write(json.dumps(asdict(offer), indent=indent, ensure_ascii=False))
+    file.write("]")
+
+def json_alarm_record(offers: Iterable[OfferStatistics]) -> Path:
     """
     Создает JSON-файл, содержащий данные о предложениях из списка OfferStatistics.
 
@@ -17,10 +36,84 @@ def json_alarm_record(offers: list[OfferStatistics]) -> Path:
     date_now_str = datetime.now().strftime("%d-%m-%YT%H-%M%-%S")
     name_file = Path(f"{date_now_str}_alarm_record.json")
     with open(name_file, "w", encoding="utf-8") as file:
-        json.dump(
-            [asdict(offer) for offer in offers], 
-            file, 
-            indent=4, 
-            ensure_ascii=False
-        )
+        dump_offers(file, offers, indent=4)
     return name_file.absolute()
+
+def write_shard_result(
+        path: Path,
+        offers: Iterable[OfferStatistics],
+        date_from: datetime,
+        date_to: datetime,
+        shard: tuple[int, int]
+) -> Path:
+    """
+    Сохраняет частичный результат шарда (объявления по дням без чатов и звонков) в JSON-файл.
+
+    :param path: Путь к файлу результата.
+    :param offers: Список объектов OfferStatistics шарда.
+    :param date_from: Дата начала периода.
+    :param date_to: Дата окончания периода.
+    :param shard: Кортеж (номер шарда, количество шардов).
+    :return: Путь к созданному JSON-файлу.
+    """
+    header = json.dumps(
+        {
+            "date_from": date_from.strftime("%Y-%m-%d"),
+            "date_to": date_to.strftime("%Y-%m-%d"),
+            "shard": list(shard),
+        }
+    )
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(header[:-1] + ', "offers": ')
+        dump_offers(file, offers)
+        file.write("}")
+    return Path(path).absolute()
+
+def read_shard_results(
+        paths: list[Path],
+        date_from: datetime,
+        date_to: datetime
+) -> list[OfferStatistics]:
+    """
+    Читает и объединяет частичные результаты шардов.
+
+    :param paths: Пути к файлам результатов шардов.
+    :param date_from: Дата начала периода, за который собирались шарды.
+    :param date_to: Дата окончания периода, за который собирались шарды.
+    :return: Объединенный список объектов OfferStatistics.
+    :raises DateRangeError: Если период в файле шарда не совпадает с указанным.
+    :raises ShardSetError: Если файлы относятся к разбиениям с разным количеством шардов
+    или не покрывают каждый шард 0..N-1 ровно один раз.
+    """
+    period = (date_from.strftime("%Y-%m-%d"), date_to.strftime("%Y-%m-%d"))
+    offers = []
+    shard_paths = {}
+    shards_count = None
+    for path in paths:
+        with open(path, encoding="utf-8") as file:
+            result = json.load(file)
+        if (result["date_from"], result["date_to"]) != period:
+            raise DateRangeError(
+                f"Период в файле {path} ({result['date_from']} - {result['date_to']}) "\
+                f"не совпадает с указанным ({period[0]} - {period[1]})!"
+            )
+        index, count = result["shard"]
+        if shards_count is None:
+            shards_count = count
+        elif count != shards_count:
+            raise ShardSetError(
+                f"Файл {path} относится к разбиению на {count} шардов, "\
+                f"а предыдущие файлы - на {shards_count}!"
+            )
+        if not 0 <= index < count:
+            raise ShardSetError(f"В файле {path} указан несуществующий шард {index}/{count}!")
+        if index in shard_paths:
+            raise ShardSetError(f"Шард {index}/{count} указан дважды: {shard_paths[index]} и {path}!")
+        shard_paths[index] = path
+        offers.extend(OfferStatistics(**offer) for offer in result["offers"])
+    missing = sorted(set(range(shards_count or 0)) - set(shard_paths))
+    if missing:
+        raise ShardSetError(
+            f"Нет результатов шардов {', '.join(f'{index}/{shards_count}' for index in missing)}!"
+        )
+    return offers
@@ -0,0 +1,140 @@
+"""
+Проверка скорости выборки из локального архива метрик (--archive).
+
+Записывает в архив несколько запусков со строками OfferStatistics синтетического аккаунта
+(каждый запуск - период с перекрытием с предыдущим) и замеряет выборки:
+
+- история одного объявления за все время;
+- все объявления за последние 30 дней;
+- выгрузка всего архива обратно в объекты OfferStatistics.
+
+Завершается с кодом 1, если выборка одного объявления дольше бюджета, если выборка
+не совпадает с записанными данными последнего запуска (в том числе неполученные
+метрики - None) или если повторно записанные дни не заменяются данными последнего запуска.
+
+Пример запуска из корня проекта:
+    python benchmarks/archive_query.py --offers 2000 --runs 12 --days 30
+"""
+import argparse
+import sys
+import tempfile
+import time
+
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.archive import MetricsArchive
+from app.datacls import OfferStatistics
+
+
+def run_offers(offers_count: int, date_from: datetime, days: int, run: int) -> list[OfferStatistics]:
+    """
+    Формирует строки одного запуска: по строке на объявление и день.
+
+    :param offers_count: Количество объявлений.
+    :param date_from: Первый день периода запуска.
+    :param days: Длина периода в днях.
+    :param run: Номер запуска (от него зависят значения метрик).
+    :return: Список OfferStatistics.
+    """
+    offers = []
+    for day in range(days):
+        report_date = (date_from + timedelta(days=day)).strftime("%d.%m.%Y")
+        for index in range(offers_count):
+            listing_id = 100_000_000 + index
+            offers.append(
+                OfferStatistics(
+                    report_date, f"https://cian.ru/sale/flat/{listing_id}/", listing_id,
+                    (listing_id + day + run) % 40, run % 3,
+                    # Часть метрик не получена: в архиве они должны остаться None, а не 0
+                    None if index % 7 == 0 else day % 2,
+                    None if index % 11 == 0 else index % 5,
+                    None if index % 13 == 0 else float(index % 50),
+                    "01.01.2024", "Квартира", "Продажа", f"Москва, улица Тестовая, {index % 100}", "54.3"
+                )
+            )
+    return offers
+
+
+def timed(func, repeat: int = 1) -> tuple[object, float]:
+    """
+    Выполняет func repeat раз и возвращает результат и лучшее время в миллисекундах.
+    Первое обращение к memmap включает чтение страниц файла с диска, поэтому выборки
+    замеряются несколькими повторами.
+    """
+    best = None
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        result = func()
+        elapsed = (time.perf_counter() - started_at) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка скорости выборки из архива метрик")
+    parser.add_argument("--offers", type=int, default=2000, help="Количество объявлений")
+    parser.add_argument("--runs", type=int, default=12, help="Количество запусков")
+    parser.add_argument("--days", type=int, default=30, help="Длина периода одного запуска в днях")
+    parser.add_argument(
+        "--budget-ms", type=float, default=50,
+        help="Допустимое время выборки истории одного объявления, мс"
+    )
+    args = parser.parse_args()
+
+    errors = []
+    with tempfile.TemporaryDirectory() as directory:
+        archive = MetricsArchive(Path(directory))
+        date_from = datetime(2024, 1, 1)
+        # Периоды запусков перекрываются на 2 дня, как при ежедневном запуске за "вчера и позавчера"
+        step = max(args.days - 2, 1)
+        last_run = None
+        write_ms = 0.0
+        for run in range(args.runs):
+            last_run = run_offers(args.offers, date_from + timedelta(days=run * step), args.days, run)
+            _, elapsed = timed(lambda: archive.append(last_run))
+            write_ms += elapsed
+        rows = len(archive.records())
+        size = sum(path.stat().st_size for path in Path(directory).iterdir())
+        print(
+            f"Строк в архиве: {rows} ({size / 1024 ** 2:.1f} МБ), "\
+            f"запись: {write_ms / args.runs:.0f} мс на запуск"
+        )
+
+        listing_id = 100_000_000 + args.offers // 2
+        history, single_ms = timed(lambda: archive.query([listing_id]), repeat=5)
+        print(f"История одного объявления: {len(history)} дней за {single_ms:.2f} мс")
+        if single_ms > args.budget_ms:
+            errors.append(f"Выборка одного объявления {single_ms:.2f} мс превышает бюджет {args.budget_ms} мс")
+
+        last_day = date_from + timedelta(days=(args.runs - 1) * step + args.days - 1)
+        recent, recent_ms = timed(
+            lambda: archive.query(day_from=last_day - timedelta(days=29), day_to=last_day), repeat=5
+        )
+        print(f"Все объявления за 30 дней: {len(recent)} строк за {recent_ms:.1f} мс")
+
+        exported, export_ms = timed(lambda: list(archive.offers(archive.query())))
+        print(f"Выгрузка архива в OfferStatistics: {len(exported)} строк за {export_ms:.0f} мс")
+
+        expected_days = (args.runs - 1) * step + args.days
+        if len(history) != expected_days:
+            errors.append(f"История объявления: {len(history)} дней вместо {expected_days}")
+        if len(exported) != expected_days * args.offers:
+            errors.append(f"Выгружено {len(exported)} строк вместо {expected_days * args.offers}")
+
+        last_rows = {(offer.listing_id, offer.report_date): offer for offer in last_run}
+        restored = archive.offers(archive.query(day_from=date_from + timedelta(days=(args.runs - 1) * step)))
+        mismatches = sum(offer != last_rows[(offer.listing_id, offer.report_date)] for offer in restored)
+        if mismatches:
+            errors.append(f"Строк последнего запуска не совпадает с записанными: {mismatches}")
+
+    for error in errors:
+        print(f"ОШИБКА: {error}")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Синтетическая замена CianApi для бенчмарков.
+
+Возвращает ответы той же структуры, что и API Циан, но формирует их в памяти
+без сетевых запросов. Данные детерминированы и зависят только от параметров.
+"""
+import random
+
+from datetime import datetime, timedelta, timezone
+
+
+class FakeCianApi:
+    def __init__(
+            self,
+            offers_count: int,
+            date_from: datetime,
+            date_to: datetime,
+            chats_per_offer: int = 2,
+            calls_per_offer: int = 2,
+            employees_count: int = 4,
+            inactive_count: int = 0,
+            created_within_period: float = 0.0,
+            seed: int = 0
+    ) -> None:
+        """
+        Синтетический аккаунт Циан с заданным количеством объявлений.
+
+        :param offers_count: Количество опубликованных объявлений.
+        :param date_from: Дата начала периода, за который генерируются чаты и звонки.
+        :param date_to: Дата окончания периода.
+        :param chats_per_offer: Количество входящих чатов на одно объявление за период.
+        :param calls_per_offer: Количество успешных звонков на одно объявление за период.
+        :param employees_count: Количество сотрудников, между которыми распределены объявления.
+        :param inactive_count: Количество снятых с публикации объявлений (сняты в середине периода).
+        :param created_within_period: Доля объявлений, созданных внутри периода (остальные
+        созданы до его начала).
+        :param seed: Зерно генератора случайных чисел.
+        """
+        self.offer_ids = [100_000_000 + index for index in range(offers_count)]
+        self.employee_ids = [1_000 + index for index in range(employees_count)]
+        self.requests = 0
+        days = max((date_to - date_from).days, 1)
+        rnd = random.Random(seed)
+        self.creation_dates = {
+            offer_id: (
+                date_from + timedelta(days=rnd.randrange(days))
+                if rnd.random() < created_within_period
+                else date_from - timedelta(days=30)
+            )
+            for offer_id in self.offer_ids
+        }
+        self.inactive_offers = {
+            200_000_000 + index: date_from + timedelta(days=days // 2)
+            for index in range(inactive_count)
+        }
+        self.creation_dates.update(
+            (offer_id, date_from - timedelta(days=30)) for offer_id in self.inactive_offers
+        )
+
+        self.chats = sorted(
+            (
+                {
+                    "chatId": f"{offer_id}-{index}",
+                    "updatedAt": (
+                        date_from + timedelta(days=rnd.randrange(days) + 1, hours=12)
+                    ).replace(tzinfo=timezone.utc).isoformat(),
+                    "lastMessage": {"direction": "in"},
+                    "offer": {"id": offer_id},
+                    "employeeId": self.employee_of(offer_id),
+                }
+                for offer_id in self.offer_ids
+                for index in range(chats_per_offer)
+            ),
+            key=lambda chat: chat["updatedAt"],
+            reverse=True
+        )
+        self.calls = [
+            {
+                "callId": f"{offer_id}-{index}",
+                "employeeId": self.employee_of(offer_id),
+                "status": "success",
+                "date": (date_from + timedelta(days=rnd.randrange(days))).strftime("%Y-%m-%dT%H:%M:%S"),
+                "offer": {"id": offer_id},
+            }
+            for offer_id in self.offer_ids
+            for index in range(calls_per_offer)
+        ]
+
+    def employee_of(self, offer_id: int) -> int:
+        return self.employee_ids[offer_id % len(self.employee_ids)]
+
+    @staticmethod
+    def by_employee(items: list[dict], employee_id: int | None) -> list[dict]:
+        if employee_id is None:
+            return items
+        return [item for item in items if item["employeeId"] == employee_id]
+
+    @staticmethod
+    def page(items: list, page: int, page_size: int) -> list:
+        return items[(page - 1) * page_size:page * page_size]
+
+    def get_my_offers(
+            self,
+            page: int = 1,
+            page_size: int = 100,
+            source: str = "manual",
+            statuses: list[str] = ["published"],
+            **kwargs
+    ) -> dict:
+        self.requests += 1
+        offer_ids = []
+        if source == "upload":
+            if "published" in statuses:
+                offer_ids.extend(self.offer_ids)
+            if "inactive" in statuses:
+                offer_ids.extend(self.inactive_offers)
+        announcements = []
+        for offer_id in self.page(offer_ids, page, page_size):
+            announcement = {
+                "id": offer_id,
+                "creationDate": self.creation_dates[offer_id].strftime("%Y-%m-%dT10:00:00"),
+            }
+            if offer_id in self.inactive_offers:
+                announcement["editDate"] = self.inactive_offers[offer_id].strftime("%Y-%m-%dT18:00:00")
+            announcements.append(announcement)
+        return {"result": {"announcements": announcements}}
+
+    def get_my_offers_detail(self, offer_ids: list[int]) -> dict:
+        self.requests += 1
+        return {
+            "result": {
+                "offers": [
+                    {
+                        "id": offer_id,
+                        "url": f"https://cian.ru/sale/flat/{offer_id}/",
+                        "title": "2-комн. квартира, 54,3\xa0м²",
+                        "address": f"Москва, улица Тестовая, {offer_id % 100}",
+                    }
+                    for offer_id in offer_ids
+                ]
+            }
+        }
+
+    def get_auction(self, offer_ids: list[int]) -> dict:
+        self.requests += 1
+        return {
+            "result": {
+                "items": [
+                    {"offerId": offer_id, "currentBet": float(offer_id % 50)}
+                    for offer_id in offer_ids
+                ]
+            }
+        }
+
+    def get_views_statistics_by_days(self, date_from: str, date_to: str, offer_id: int) -> dict:
+        self.requests += 1
+        day = datetime.strptime(date_from, "%Y-%m-%d")
+        last_day = datetime.strptime(date_to, "%Y-%m-%d")
+        views, favorites = [], []
+        while day <= last_day:
+            date = day.strftime("%Y-%m-%d")
+            views.append({"date": date, "views": (offer_id + day.day) % 40})
+            favorites.append({"date": date, "addToFavorites": (offer_id + day.day) % 3})
+            day += timedelta(days=1)
+        return {"result": {"viewsByDays": views, "addToFavoritesByDays": favorites}}
+
+    def get_chats(self, page: int = 1, page_size: int = 100, employee_id: int = None, **kwargs) -> dict:
+        self.requests += 1
+        chats = self.by_employee(self.chats, employee_id)
+        return {"result": {"chats": self.page(chats, page, page_size)}}
+
+    def get_calls_report(
+            self,
+            page: int = 1,
+            page_size: int = 50,
+            date_from: str = None,
+            date_to: str = None,
+            employee_id: int = None
+    ) -> dict:
+        self.requests += 1
+        calls = self.by_employee(self.calls, employee_id)
+        return {"result": {"calls": self.page(calls, page, page_size)}}
+
+    def get_my_agents(self) -> dict:
+        self.requests += 1
+        return {"result": {"agents": [{"id": employee_id} for employee_id in self.employee_ids]}}
@@ -0,0 +1,372 @@
+"""
+Синтетическая замена Google Sheets API для бенчмарков.
+
+Реализует методы gspread, которые использует GoogleSheet (open_by_key, worksheets,
+get_worksheet_by_id, values_get, values_append, batch_update), и хранит значения листов
+в памяти. Время не тратится на самом деле: задержка ответа, ожидание квот и повторы
+учитываются виртуальными часами (VirtualClock), которые подставляются вместо модуля time
+в app.sheets_quota. Ограничения API воспроизводятся ошибками gspread.exceptions.APIError
+с теми же статусами, что и у Google:
+
+- квоты запросов на чтение и запись в минуту - статус 429;
+- размер тела запроса - статус 400;
+- количество ячеек в таблице и выход за границы сетки листа - статус 400.
+"""
+import functools
+import json
+import threading
+
+from collections import Counter, deque
+
+import gspread
+import requests
+
+# Задержка ответа Google Sheets API без учета передачи данных (секунды)
+DEFAULT_LATENCY = 0.3
+# Скорость передачи данных (байт в секунду)
+DEFAULT_BANDWIDTH = 5 * 1024 ** 2
+# Квоты на одного пользователя (запросов в минуту)
+READ_REQUESTS_PER_MINUTE = 60
+WRITE_REQUESTS_PER_MINUTE = 60
+# Максимальный размер тела запроса (байт)
+MAX_REQUEST_BYTES = 10 * 1024 ** 2
+# Максимальное количество ячеек в таблице
+MAX_CELLS = 10_000_000
+# Методы, которые расходуют квоту на чтение (остальные - на запись)
+READ_METHODS = ("open_by_key", "worksheets", "get_worksheet_by_id", "values_get")
+
+
+def api_error(status: int, message: str) -> gspread.exceptions.APIError:
+    """
+    Формирует ошибку gspread так же, как для ответа Google API.
+
+    :param status: HTTP статус.
+    :param message: Текст ошибки.
+    :return: Объект APIError.
+    """
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps({"error": {"code": status, "message": message}}).encode()
+    return gspread.exceptions.APIError(response)
+
+
+def json_size(value) -> int:
+    return len(json.dumps(value, ensure_ascii=False).encode())
+
+
+def cell_value(cell: dict):
+    """
+    Возвращает значение ячейки из CellData запроса updateCells (None для пустой ячейки).
+    """
+    for value in cell.get("userEnteredValue", {}).values():
+        return value
+    return None
+
+
+class VirtualClock:
+    def __init__(self) -> None:
+        """
+        Виртуальные часы с интерфейсом модуля time (monotonic, time, sleep): sleep
+        не ждет, а переводит часы вперед.
+        """
+        self.now = 0.0
+        self.__lock = threading.Lock()
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        with self.__lock:
+            self.now += max(seconds, 0.0)
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet: "FakeSpreadsheet", sheet_id: int, title: str, row_count: int, col_count: int) -> None:
+        """
+        Лист синтетической таблицы.
+
+        :param spreadsheet: Таблица, которой принадлежит лист.
+        :param sheet_id: Идентификатор листа.
+        :param title: Название листа.
+        :param row_count: Количество строк в сетке листа.
+        :param col_count: Количество столбцов в сетке листа.
+        """
+        self.spreadsheet = spreadsheet
+        self.id = sheet_id
+        self.title = title
+        self.row_count = row_count
+        self.col_count = col_count
+        self.values: list[list] = []
+        # Размер значений листа в JSON, чтобы не сериализовать их при каждом чтении
+        self.values_bytes = 0
+
+    def fill(self, rows_count: int, row: list) -> None:
+        """
+        Заполняет лист одинаковыми строками без учета квот и задержек (начальное состояние).
+
+        :param rows_count: Количество строк.
+        :param row: Значения строки (одна и та же строка используется для всех строк).
+        """
+        self.values.extend([row] * rows_count)
+        self.values_bytes += json_size(row) * rows_count
+        self.row_count = max(self.row_count, len(self.values))
+
+    def set_rows(self, start_row_index: int, rows: list[list]) -> None:
+        missing = start_row_index + len(rows) - len(self.values)
+        if missing > 0:
+            self.values.extend([] for _ in range(missing))
+        for index, row in enumerate(rows, start_row_index):
+            self.values_bytes += json_size(row) - json_size(self.values[index])
+            self.values[index] = row
+
+
+def serialized(method):
+    """
+    Выполняет метод таблицы под ее блокировкой: как и Google, таблица применяет
+    запросы из параллельных потоков по одному и целиком.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class FakeSpreadsheet:
+    def __init__(self, backend: "FakeSheetsBackend", key: str) -> None:
+        """
+        Синтетическая Google таблица. Методы повторяют сигнатуры gspread.Spreadsheet.
+
+        :param backend: Бэкенд, который учитывает запросы, квоты и ограничения.
+        :param key: Идентификатор таблицы.
+        """
+        self.backend = backend
+        self.id = key
+        self.sheets: dict[int, FakeWorksheet] = {}
+        self.lock = threading.RLock()
+
+    def add_worksheet(self, sheet_id: int, title: str, row_count: int = 1000, col_count: int = 26) -> FakeWorksheet:
+        """
+        Создает лист без учета квот и задержек (начальное состояние).
+        """
+        worksheet = self.sheets[sheet_id] = FakeWorksheet(self, sheet_id, title, row_count, col_count)
+        return worksheet
+
+    def cells(self) -> int:
+        return sum(sheet.row_count * sheet.col_count for sheet in self.sheets.values())
+
+    def by_title(self, a1_range: str) -> FakeWorksheet:
+        title = a1_range.split("!", 1)[0]
+        if title.startswith("'"):
+            title = title[1:-1].replace("''", "'")
+        for sheet in self.sheets.values():
+            if sheet.title == title:
+                return sheet
+        raise api_error(400, f"Unable to parse range: {a1_range}")
+
+    @serialized
+    def worksheets(self) -> list[FakeWorksheet]:
+        self.backend.request("worksheets", response=[sheet.title for sheet in self.sheets.values()])
+        return list(self.sheets.values())
+
+    @serialized
+    def get_worksheet_by_id(self, sheet_id: int) -> FakeWorksheet:
+        self.backend.request("get_worksheet_by_id", response=[sheet.title for sheet in self.sheets.values()])
+        try:
+            return self.sheets[int(sheet_id)]
+        except KeyError:
+            raise gspread.exceptions.WorksheetNotFound(f"worksheet id {sheet_id} not found")
+
+    @serialized
+    def values_get(self, a1_range: str, params: dict = None) -> dict:
+        sheet = self.by_title(a1_range)
+        response = {"range": a1_range, "majorDimension": "ROWS"}
+        if "!" not in a1_range:
+            self.backend.request("values_get", {"range": a1_range}, response_bytes=sheet.values_bytes)
+            self.backend.full_reads += 1
+            if sheet.values:
+                # Копия, как при разборе ответа: последующая запись не меняет прочитанные значения
+                response["values"] = list(sheet.values)
+            return response
+        grid = gspread.utils.a1_range_to_grid_range(a1_range.rsplit("!", 1)[1])
+        values = [
+            row[grid.get("startColumnIndex", 0):grid.get("endColumnIndex")]
+            for row in sheet.values[grid.get("startRowIndex", 0):grid.get("endRowIndex")]
+        ]
+        while values and not values[-1]:
+            values.pop()
+        self.backend.request("values_get", {"range": a1_range}, response=values)
+        if values:
+            response["values"] = values
+        return response
+
+    @serialized
+    def values_append(self, a1_range: str, params: dict, body: dict) -> dict:
+        sheet = self.by_title(a1_range)
+        rows = body.get("values", [])
+        self.backend.request("values_append", body)
+        start_row_index = len(sheet.values)
+        grow = len(rows) if params.get("insertDataOption") == "INSERT_ROWS" else max(
+            start_row_index + len(rows) - sheet.row_count, 0
+        )
+        self.backend.check_cells(self, grow * sheet.col_count)
+        sheet.row_count += grow
+        sheet.set_rows(start_row_index, rows)
+        updated_range = "{}!A{}:{}".format(
+            a1_range.split("!", 1)[0],
+            start_row_index + 1,
+            gspread.utils.rowcol_to_a1(start_row_index + len(rows), max(map(len, rows), default=1))
+        )
+        return {"updates": {"updatedRange": updated_range, "updatedRows": len(rows)}}
+
+    @serialized
+    def batch_update(self, body: dict) -> dict:
+        self.backend.request("batch_update", body)
+        # Запросы batchUpdate применяются атомарно: сначала проверяются все, затем выполняются
+        row_counts = {sheet_id: sheet.row_count for sheet_id, sheet in self.sheets.items()}
+        new_sheets, writes, added_cells = {}, [], 0
+        for request in body["requests"]:
+            if "addSheet" in request:
+                properties = request["addSheet"]["properties"]
+                grid = properties.get("gridProperties", {})
+                new_sheets[properties["sheetId"]] = (
+                    properties["title"], grid.get("rowCount", 1000), grid.get("columnCount", 26)
+                )
+                row_counts[properties["sheetId"]] = grid.get("rowCount", 1000)
+                added_cells += grid.get("rowCount", 1000) * grid.get("columnCount", 26)
+            elif "appendDimension" in request:
+                append = request["appendDimension"]
+                if append["sheetId"] in new_sheets:
+                    col_count = new_sheets[append["sheetId"]][2]
+                else:
+                    col_count = self.sheets[append["sheetId"]].col_count
+                row_counts[append["sheetId"]] += append["length"]
+                added_cells += append["length"] * col_count
+            elif "updateCells" in request:
+                update = request["updateCells"]
+                start = update["start"]
+                if start["rowIndex"] + len(update["rows"]) > row_counts[start["sheetId"]]:
+                    raise api_error(400, "Invalid requests[updateCells]: exceeds grid limits")
+                writes.append((start["sheetId"], start["rowIndex"], update["rows"]))
+        self.backend.check_cells(self, added_cells)
+
+        for sheet_id, (title, row_count, col_count) in new_sheets.items():
+            self.add_worksheet(sheet_id, title, row_count, col_count)
+        for sheet_id, row_count in row_counts.items():
+            self.sheets[sheet_id].row_count = row_count
+        for sheet_id, start_row_index, row_data in writes:
+            self.sheets[sheet_id].set_rows(
+                start_row_index,
+                [[cell_value(cell) for cell in row["values"]] for row in row_data]
+            )
+        return {"replies": [{} for _ in body["requests"]]}
+
+
+class FakeSheetsBackend:
+    def __init__(
+            self,
+            clock: VirtualClock,
+            latency: float = DEFAULT_LATENCY,
+            bandwidth: float = DEFAULT_BANDWIDTH,
+            read_per_minute: int = READ_REQUESTS_PER_MINUTE,
+            write_per_minute: int = WRITE_REQUESTS_PER_MINUTE,
+            max_request_bytes: int = MAX_REQUEST_BYTES,
+            max_cells: int = MAX_CELLS
+    ) -> None:
+        """
+        Синтетический Google Sheets API: учитывает запросы, переданные байты, квоты и ограничения.
+
+        Каждый запрос переводит часы clock на latency + размер запроса и ответа / bandwidth.
+
+        :param clock: Виртуальные часы.
+        :param latency: Задержка ответа в секундах.
+        :param bandwidth: Скорость передачи данных в байтах в секунду.
+        :param read_per_minute: Квота запросов на чтение в минуту.
+        :param write_per_minute: Квота запросов на запись в минуту.
+        :param max_request_bytes: Максимальный размер тела запроса в байтах.
+        :param max_cells: Максимальное количество ячеек в таблице (0 - без ограничения).
+        """
+        self.clock = clock
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.limits = {"read": read_per_minute, "write": write_per_minute}
+        self.max_request_bytes = max_request_bytes
+        self.max_cells = max_cells
+        self.spreadsheets: dict[str, FakeSpreadsheet] = {}
+        self.calls = Counter()
+        self.rejected = Counter()
+        # Чтения значений всего листа (без диапазона ячеек)
+        self.full_reads = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.__windows = {"read": deque(), "write": deque()}
+        self.__lock = threading.Lock()
+
+    def create_spreadsheet(self, key: str) -> FakeSpreadsheet:
+        """
+        Создает таблицу без учета квот и задержек (начальное состояние).
+        """
+        spreadsheet = self.spreadsheets[key] = FakeSpreadsheet(self, key)
+        return spreadsheet
+
+    def open_by_key(self, key: str) -> FakeSpreadsheet:
+        self.request("open_by_key", response={"spreadsheetId": key})
+        try:
+            return self.spreadsheets[key]
+        except KeyError:
+            raise gspread.exceptions.SpreadsheetNotFound(key)
+
+    def request(self, method: str, body: dict = None, response=None, response_bytes: int = None) -> None:
+        """
+        Учитывает запрос к API: квоту, размер тела, переданные байты и время ответа.
+
+        :param method: Название метода gspread.
+        :param body: Тело запроса.
+        :param response: Ответ (для подсчета его размера).
+        :param response_bytes: Размер ответа, если он известен заранее.
+        :raises gspread.exceptions.APIError: Если превышена квота или размер запроса.
+        """
+        sent = json_size(body) if body is not None else 0
+        received = response_bytes if response_bytes is not None else json_size(response)
+        kind = "read" if method in READ_METHODS else "write"
+        with self.__lock:
+            self.calls[method] += 1
+            window = self.__windows[kind]
+            while window and self.clock.now - window[0] >= 60:
+                window.popleft()
+            if len(window) >= self.limits[kind]:
+                self.rejected[method] += 1
+                self.clock.sleep(self.latency)
+                raise api_error(429, f"Quota exceeded for quota metric '{kind.title()} requests'")
+            window.append(self.clock.now)
+            self.bytes_sent += sent
+            if sent > self.max_request_bytes:
+                self.rejected[method] += 1
+                self.clock.sleep(self.latency + sent / self.bandwidth)
+                raise api_error(400, f"Request payload size exceeds the limit: {self.max_request_bytes} bytes.")
+            self.bytes_received += received
+            self.clock.sleep(self.latency + (sent + received) / self.bandwidth)
+
+    def check_cells(self, spreadsheet: FakeSpreadsheet, added_cells: int) -> None:
+        """
+        Проверяет ограничение на количество ячеек в таблице.
+
+        :raises gspread.exceptions.APIError: Если после изменения ячеек будет больше max_cells.
+        """
+        if self.max_cells and added_cells > 0 and spreadsheet.cells() + added_cells > self.max_cells:
+            raise api_error(
+                400,
+                f"This action would increase the number of cells in the workbook above the limit of "\
+                f"{self.max_cells} cells."
+            )
+
+    def snapshot(self) -> tuple[float, int, int, int]:
+        """
+        Возвращает текущее состояние счетчиков для замера одной операции.
+
+        :return: Кортеж (время по часам, количество запросов, отправлено байт, получено байт).
+        """
+        return self.clock.now, sum(self.calls.values()), self.bytes_sent, self.bytes_received
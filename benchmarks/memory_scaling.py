@@ -0,0 +1,135 @@
+"""
+Проверка роста памяти при сборе статистики.
+
+Запускает граф этапов collection_stages на синтетическом аккаунте (FakeCianApi)
+с увеличивающимся количеством объявлений и длиной периода и замеряет пиковый объем
+памяти через tracemalloc. Завершается с кодом 1, если:
+
+- пиковая память в пересчете на одну строку отчета (объявление × день) превышает бюджет;
+- удельная память растет с размером данных быстрее, чем допускает --max-growth,
+  то есть рост перестал быть линейным по количеству строк;
+- запуск с лимитом памяти (--max-memory) не уменьшает пиковую память. Перенос на диск
+  сравнивается на наибольшем запуске, но не меньше чем на SPILL_MIN_CHUNKS пачек строк:
+  на меньших данных пачка в памяти сопоставима со всем отчетом.
+
+Пример запуска из корня проекта:
+    python benchmarks/memory_scaling.py --offers 100 200 400 --days 30 90
+"""
+import argparse
+import logging
+import sys
+import tracemalloc
+
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app import cian_helpers
+from app.cian_helpers import collection_stages
+from app.memory import SPILL_CHUNK_SIZE, MemoryGuard, RowSpill, current_rss
+from app.pipeline import run_stages, select_stages
+from fake_cian import FakeCianApi
+
+# Минимальное количество пачек RowSpill в запуске, на котором сравнивается перенос строк на диск
+SPILL_MIN_CHUNKS = 16
+
+
+def measure(
+        offers_count: int,
+        days: int,
+        logger: logging.Logger,
+        memory_guard: MemoryGuard = None
+) -> tuple[int, int]:
+    """
+    Собирает статистику синтетического аккаунта и замеряет пиковую память.
+
+    :param offers_count: Количество объявлений.
+    :param days: Длина периода в днях.
+    :param logger: Логгер для этапов сбора.
+    :param memory_guard: Ограничение памяти для этапов "join" и "result".
+    :return: Кортеж (количество строк отчета, пиковая память в байтах).
+    """
+    date_to = datetime(2024, 6, 30)
+    date_from = date_to - timedelta(days=days - 1)
+    cian = FakeCianApi(offers_count, date_from, date_to)
+
+    # Паузы между запросами нужны только для настоящего API
+    request_pause, cian_helpers.REQUEST_PAUSE = cian_helpers.REQUEST_PAUSE, 0
+    tracemalloc.start()
+    try:
+        stages = collection_stages(cian, date_from, date_to, logger, memory_guard=memory_guard)
+        result = run_stages(select_stages(stages, "result"), logger)["result"]
+        rows = len(result)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        cian_helpers.REQUEST_PAUSE = request_pause
+    if isinstance(result, RowSpill):
+        result.close()
+    return rows, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка роста памяти при сборе статистики")
+    parser.add_argument("--offers", type=int, nargs="+", default=[100, 200, 400], help="Количество объявлений")
+    parser.add_argument("--days", type=int, nargs="+", default=[30, 90], help="Длина периода в днях")
+    parser.add_argument(
+        "--max-bytes-per-row", type=float, default=2048,
+        help="Допустимая пиковая память на одну строку отчета, байт"
+    )
+    parser.add_argument(
+        "--max-growth", type=float, default=1.5,
+        help="Допустимое отношение удельной памяти на самом большом и самом маленьком запуске"
+    )
+    args = parser.parse_args()
+
+    logger = logging.getLogger("memory_scaling")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    print(f"{'Объявлений':>10} {'Дней':>6} {'Строк':>10} {'Пик, МБ':>9} {'Байт/строку':>12}")
+    results = []
+    for offers_count in sorted(args.offers):
+        for days in sorted(args.days):
+            rows, peak = measure(offers_count, days, logger)
+            results.append((rows, peak))
+            print(f"{offers_count:>10} {days:>6} {rows:>10} {peak / 1024 ** 2:>9.1f} {peak / rows:>12.0f}")
+
+    errors = []
+    results.sort()
+    smallest, largest = results[0], results[-1]
+    per_row = largest[1] / largest[0]
+    if per_row > args.max_bytes_per_row:
+        errors.append(f"Пиковая память на строку {per_row:.0f} байт превышает бюджет {args.max_bytes_per_row:.0f} байт")
+    growth = per_row / (smallest[1] / smallest[0])
+    print(f"Рост удельной памяти: {growth:.2f}")
+    if growth > args.max_growth:
+        errors.append(f"Удельная память растет быстрее линейного: {growth:.2f} > {args.max_growth}")
+
+    offers_count, days = max(args.offers), max(args.days)
+    baseline = largest
+    min_rows = SPILL_MIN_CHUNKS * SPILL_CHUNK_SIZE
+    if largest[0] < min_rows:
+        offers_count = -(-min_rows // days)
+        baseline = measure(offers_count, days, logger)
+    # Лимит меньше текущего RSS: строки переносятся на диск с первого объявления
+    memory_guard = MemoryGuard(1, logger)
+    rows, spill_peak = measure(offers_count, days, logger, memory_guard)
+    print(
+        f"С переносом строк на диск ({offers_count} объявлений, {days} дней): {spill_peak / 1024 ** 2:.1f} МБ "\
+        f"(без переноса - {baseline[1] / 1024 ** 2:.1f} МБ), RSS процесса: {current_rss() // 1024 ** 2} МБ"
+    )
+    if rows != baseline[0]:
+        errors.append(f"С переносом строк на диск получено {rows} строк вместо {baseline[0]}")
+    if spill_peak >= baseline[1]:
+        errors.append("Перенос строк на диск не уменьшает пиковую память")
+
+    for error in errors:
+        print(f"ОШИБКА: {error}")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
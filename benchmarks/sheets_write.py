@@ -0,0 +1,221 @@
+"""
+Замер записи в Google таблицу в зависимости от размера листа и размера пачки.
+
+Запускает методы GoogleSheet (check_headers, add_rows_to_sheet, update) на синтетическом
+Google Sheets API (FakeSheetsBackend) с листом, уже заполненным заданным количеством строк,
+и выводит для каждой операции время по виртуальным часам (задержка ответа, передача
+данных, ожидание квот), количество запросов и объем переданных данных. Каждая операция
+выполняется в двух вариантах:
+
+- "первый запуск" - без кэша подключения (см. SheetsCache), лист читается целиком;
+- "с кэшем" - следующий запуск с проверенными заголовками (читается только первая строка).
+
+Ошибки API (превышение размера запроса или количества ячеек в таблице) выводятся
+вместо замера. Завершается с кодом 1, если запись с кэшем читает не только первую
+строку листа (см. GoogleSheet.headers_verified), а весь лист, или
+ее время растет с размером листа быстрее, чем допускает --max-growth.
+
+Пример запуска из корня проекта:
+    python benchmarks/sheets_write.py --rows 10000 100000 1000000 --batches 100 1000 10000
+"""
+import argparse
+import logging
+import sys
+import tempfile
+
+from dataclasses import astuple
+from pathlib import Path
+
+import gspread
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app import google_sheet, sheets_quota
+from app.datacls import OfferStatistics
+from app.exceptions import UpdateWorksheetError
+from app.google_sheet import HEADERS, GoogleSheet
+from fake_sheets import (
+    DEFAULT_BANDWIDTH,
+    DEFAULT_LATENCY,
+    MAX_CELLS,
+    MAX_REQUEST_BYTES,
+    FakeSheetsBackend,
+    VirtualClock
+)
+
+SPREADSHEET_ID = "benchmark"
+WORKSHEET_ID = 0
+
+clock = VirtualClock()
+# Ожидание квот и повторы в SheetsQuota идут по виртуальным часам
+sheets_quota.time = clock
+
+
+class BenchmarkGoogleSheet(GoogleSheet):
+    def __init__(self, backend: FakeSheetsBackend, cache_path: Path, logger: logging.Logger) -> None:
+        """
+        GoogleSheet, подключенный к синтетическому API вместо Google.
+        """
+        super().__init__(Path("creds.json"), SPREADSHEET_ID, WORKSHEET_ID, logger, cache_path=cache_path)
+        self.backend = backend
+
+    def connect(self, path_creds_json: Path) -> FakeSheetsBackend:
+        return self.backend
+
+
+def new_process() -> None:
+    """
+    Сбрасывает открытые в процессе клиенты, таблицы и листы, как при новом запуске скрипта.
+    """
+    google_sheet._CLIENTS.clear()
+    google_sheet._SPREADSHEETS.clear()
+    google_sheet._WORKSHEETS.clear()
+
+
+def make_backend(rows_count: int, args: argparse.Namespace) -> FakeSheetsBackend:
+    """
+    Создает синтетический API с листом, заполненным заголовками и rows_count строками.
+    """
+    backend = FakeSheetsBackend(
+        clock,
+        latency=args.latency,
+        bandwidth=args.bandwidth,
+        max_request_bytes=int(args.max_request_mb * 1024 ** 2),
+        max_cells=args.max_cells
+    )
+    worksheet = backend.create_spreadsheet(SPREADSHEET_ID).add_worksheet(
+        WORKSHEET_ID, "Статистика", row_count=1000, col_count=len(HEADERS)
+    )
+    worksheet.set_rows(0, [HEADERS])
+    worksheet.fill(rows_count, list(astuple(sample_offer(0))))
+    return backend
+
+
+def sample_offer(index: int) -> OfferStatistics:
+    listing_id = 100_000_000 + index
+    return OfferStatistics(
+        "01.08.2024", f"https://cian.ru/sale/flat/{listing_id}/", listing_id, index % 40, index % 3,
+        index % 2, index % 5, float(index % 50), "01.01.2024", "Квартира", "Продажа",
+        f"Москва, улица Тестовая, {index % 100}", "54,3"
+    )
+
+
+def measure(backend: FakeSheetsBackend, operation) -> tuple[float, int, int, int, str | None]:
+    """
+    Выполняет операцию и замеряет ее по счетчикам синтетического API.
+
+    :return: Кортеж (время в секундах, запросов, отправлено байт, получено байт, текст ошибки).
+    """
+    started = backend.snapshot()
+    error = None
+    try:
+        operation()
+    except (UpdateWorksheetError, gspread.exceptions.APIError) as _ex:
+        error = str(_ex)
+    finished = backend.snapshot()
+    return (*(after - before for after, before in zip(finished, started)), error)
+
+
+def run_case(
+        rows_count: int,
+        operation_name: str,
+        operation,
+        args: argparse.Namespace,
+        logger: logging.Logger
+) -> dict[str, tuple]:
+    """
+    Замеряет операцию при первом запуске и при следующем запуске с кэшем подключения.
+
+    :return: Словарь: вариант запуска -> результат measure и количество чтений всего листа.
+    """
+    backend = make_backend(rows_count, args)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        cache_path = Path(directory, "creds.sheets_cache.json")
+        # Первый запуск проверяет заголовки и сохраняет отметку в кэш, второй ее использует
+        for variant in ("первый запуск", "с кэшем"):
+            new_process()
+            sheet = BenchmarkGoogleSheet(backend, cache_path, logger)
+            reads_before = backend.full_reads
+            result = measure(backend, lambda: operation(sheet))
+            results[variant] = (*result, backend.full_reads - reads_before)
+    for variant, (seconds, calls, sent, received, error, _) in results.items():
+        print(
+            f"{rows_count:>10} {operation_name:<20} {variant:<14} "\
+            + (
+                f"ОШИБКА: {error}" if error else
+                f"{seconds:>9.2f} {calls:>8} {sent / 1024 ** 2:>10.2f} {received / 1024 ** 2:>10.2f}"
+            )
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер записи в Google таблицу на синтетическом API")
+    parser.add_argument(
+        "--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+        help="Количество строк на листе до записи"
+    )
+    parser.add_argument(
+        "--batches", type=int, nargs="+", default=[100, 1_000, 10_000],
+        help="Количество строк, записываемых за один вызов update"
+    )
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY, help="Задержка ответа API, с")
+    parser.add_argument(
+        "--bandwidth", type=float, default=DEFAULT_BANDWIDTH, help="Скорость передачи данных, байт/с"
+    )
+    parser.add_argument(
+        "--max-request-mb", type=float, default=MAX_REQUEST_BYTES / 1024 ** 2,
+        help="Максимальный размер тела запроса, МБ"
+    )
+    parser.add_argument(
+        "--max-cells", type=int, default=MAX_CELLS,
+        help="Максимальное количество ячеек в таблице (0 - без ограничения)"
+    )
+    parser.add_argument(
+        "--max-growth", type=float, default=1.5,
+        help="Допустимое отношение времени записи с кэшем на самом большом и самом маленьком листе"
+    )
+    args = parser.parse_args()
+
+    logger = logging.getLogger("sheets_write")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    print(
+        f"{'Строк':>10} {'Операция':<20} {'Запуск':<14} {'Время, с':>9} {'Запросов':>8} "\
+        f"{'Отпр., МБ':>10} {'Получ., МБ':>10}"
+    )
+    errors = []
+    cached_updates = {}
+    for rows_count in sorted(args.rows):
+        run_case(rows_count, "check_headers", lambda sheet: sheet.check_headers(), args, logger)
+        run_case(rows_count, "add_rows_to_sheet", lambda sheet: sheet.add_rows_to_sheet(1000), args, logger)
+        for batch in sorted(args.batches):
+            offers = [sample_offer(index) for index in range(batch)]
+            results = run_case(
+                rows_count, f"update ({batch})", lambda sheet: sheet.update(offers), args, logger
+            )
+            seconds, calls, _, _, error, reads = results["с кэшем"]
+            if error:
+                continue
+            if reads:
+                errors.append(f"Запись {batch} строк с кэшем на лист из {rows_count} строк читает весь лист")
+            cached_updates.setdefault(batch, []).append((rows_count, seconds))
+
+    for batch, timings in cached_updates.items():
+        (_, smallest), (_, largest) = timings[0], timings[-1]
+        growth = largest / smallest
+        if growth > args.max_growth:
+            errors.append(
+                f"Время записи {batch} строк с кэшем растет с размером листа: {growth:.2f} > {args.max_growth}"
+            )
+
+    for error in errors:
+        print(f"ОШИБКА: {error}")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
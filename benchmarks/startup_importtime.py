@@ -0,0 +1,73 @@
+"""
+Замер времени запуска точки входа cian_statistics.py (в стиле python -X importtime).
+
+Запускает интерпретатор с флагом -X importtime, импортирует модуль cian_statistics
+и выводит суммарное время импорта и самые медленные модули. Завершается с кодом 1,
+если при старте были импортированы тяжелые зависимости (requests, gspread, google-auth,
+dateutil) или суммарное время превысило бюджет.
+
+Пример запуска из корня проекта:
+    python benchmarks/startup_importtime.py --budget-ms 150
+"""
+import argparse
+import subprocess
+import sys
+
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+# Модули, которые не должны импортироваться при старте скрипта
+HEAVY_MODULES = ("requests", "gspread", "google", "dateutil")
+
+
+def measure(module: str = "cian_statistics") -> list[tuple[int, int, str]]:
+    """
+    Импортирует модуль в отдельном процессе с -X importtime и разбирает вывод.
+
+    :param module: Имя импортируемого модуля.
+    :return: Список кортежей (self_us, cumulative_us, имя модуля).
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cumulative_us), name.strip()))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер времени запуска cian_statistics.py")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Допустимое время импорта, мс")
+    parser.add_argument("--top", type=int, default=10, help="Сколько самых медленных модулей вывести")
+    args = parser.parse_args()
+
+    rows = measure()
+    total_us = sum(self_us for self_us, _, _ in rows)
+    print(f"Суммарное время импорта: {total_us / 1000:.1f} мс ({len(rows)} модулей)")
+    for self_us, cumulative_us, name in sorted(rows, key=lambda row: row[1], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:>10.1f} мс  {name}")
+
+    heavy = sorted({
+        name for _, _, name in rows
+        if name.split(".")[0] in HEAVY_MODULES
+    })
+    failed = False
+    if heavy:
+        print(f"Тяжелые модули импортируются при старте: {', '.join(heavy)}")
+        failed = True
+    if args.budget_ms is not None and total_us / 1000 > args.budget_ms:
+        print(f"Превышен бюджет времени запуска: {args.budget_ms} мс")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
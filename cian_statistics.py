@@ -1,21 +1,12 @@
-import logging
+import threading
 
 from sys import exit
 
 
-from app.cian_api import CianApi
-from app.cian_helpers import (
-    fetch_all_my_offer_ids,
-    fetch_all_my_offers_detail,
-    fetch_all_my_offers_auction,
-    update_my_offer_with_views_data,
-    fetch_filtered_calls,
-    fetch_filtered_chats,
-    update_my_offer_with_calls,
-    update_my_offer_with_chats
-)
 from app.cmdline import parse_args 
 from app.exceptions import (
+    ArchiveFormatError,
+    CassetteNotFound,
     DateRangeError,
     SendRequestError,
     SpreadsheetNotFound,
@@ -25,15 +16,21 @@ from app.exceptions import (
     MissingPathToCreds,
     MissingSpreadsheetId,
     MissingWorksheetId,
-    MissingAccessToken
+    MissingAccessToken,
+    InvalidPartitionPeriod,
+    InvalidCredentials,
+    ShardSetError
 )
-from app.google_sheet import GoogleSheet
 from app.logger import init_logging
 from app.settings import (
     BUNNER,
     SettingsYamlFile
 )
-from app.utils import json_alarm_record
+from app.utils import (
+    json_alarm_record,
+    read_shard_results,
+    write_shard_result
+)
 
 
 def main():
@@ -41,11 +38,13 @@ def main():
         print(BUNNER)
         logger = init_logging()
         try:
-            date_from, date_to = parse_args()
+            args = parse_args()
         except DateRangeError as _ex:
             logger.critical(_ex)
             exit(1)
+        logger = init_logging(args.log_level, args.log_json)
         
+        date_from, date_to = args.date_from, args.date_to
         logger.info(f"Дата начала: {date_from} | Дата окончания: {date_to}")    
         logger.info(f"Извлечение данных из файла с настройками!")
         try:
@@ -55,66 +54,165 @@ def main():
             MissingAccessToken, 
             MissingPathToCreds, 
             MissingSpreadsheetId, 
-            MissingWorksheetId
+            MissingWorksheetId,
+            InvalidPartitionPeriod
         ) as _ex:
             logger.critical(_ex)
             logger.critical("Завершение работы скрипта с ошибкой!")
             exit(1)
-        
-        cian = CianApi(settings.cian_conf.access_token, logger=logger)
 
-        logger.info(f"Подключение к Google Worksheet!")
+        # Тяжелые зависимости (requests, gspread, google-auth) импортируются
+        # только после успешной проверки аргументов и настроек.
+        from app.cassette import Cassette
+        from app.cian_api import CianApi
+        from app.cian_helpers import collection_stages
+        from app.dead_letter import DeadLetterQueue
+        from app.google_sheet import GoogleSheet
+        from app.memory import MemoryGuard, RowSpill
+        from app.enums import CassetteMode, RequestLog
+        from app.pipeline import Stage, run_stages, select_stages
+
+        shard_offers = None
+        if args.merge:
+            logger.info(f"Чтение частичных результатов шардов: {', '.join(args.merge)}")
+            try:
+                shard_offers = read_shard_results(args.merge, date_from, date_to)
+            except (DateRangeError, ShardSetError, OSError, ValueError) as _ex:
+                logger.critical(f"Ошибка чтения результатов шардов! {_ex}")
+                logger.critical("Завершение работы скрипта с ошибкой!")
+                exit(1)
+
+        cassette = None
         try:
-            google_sheet = GoogleSheet(
-                settings.google_conf.path_creds_json,
-                settings.google_conf.spreadsheet_id,
-                settings.google_conf.worksheet_id,
-                logger
-            )
-        except (SpreadsheetNotFound, WorksheetNotFound) as _ex:
-            logging.critical(_ex)
+            if args.record:
+                logger.info(f"Запись запросов к API Циан в файл {args.record}")
+                cassette = Cassette(args.record, CassetteMode.RECORD)
+            elif args.replay:
+                logger.info(f"Воспроизведение запросов к API Циан из файла {args.replay}")
+                cassette = Cassette(
+                    args.replay, 
+                    CassetteMode.REPLAY, 
+                    recorded_latency=args.replay_latency == "recorded"
+                )
+        except CassetteNotFound as _ex:
+            logger.critical(_ex)
             exit(1)
+        
+        # Ошибка одного этапа останавливает запросы остальных (см. run_stages)
+        cancel = threading.Event()
+        cian = CianApi(
+            settings.cian_conf.access_token, 
+            logger=logger, 
+            cassette=cassette,
+            request_log=RequestLog(args.request_log),
+            request_log_rate=args.request_log_rate,
+            hedge_ratio=args.hedge_ratio,
+            hedge_percentile=args.hedge_percentile,
+            cancel=cancel
+        )
 
-        logger.info(f"Сбор статистики!")
-        updated_offers = []
-        try: 
-            my_offers = fetch_all_my_offer_ids(cian, logger)
-            my_offers = fetch_all_my_offers_detail(cian, my_offers, logger)
-            my_offers = fetch_all_my_offers_auction(cian, my_offers, logger)
-            for my_offer in my_offers:
-                updated_offers.extend(
-                    update_my_offer_with_views_data(
-                        cian, 
-                        date_from, 
-                        date_to, 
-                        my_offer
-                    )
+        google_sheet = GoogleSheet(
+            settings.google_conf.path_creds_json,
+            settings.google_conf.spreadsheet_id,
+            settings.google_conf.worksheet_id,
+            logger,
+            settings.google_conf.partition_period
+        )
+
+        if args.plan:
+            from app.planner import plan_collection
+
+            logger.info("Составление плана сбора статистики!")
+            try:
+                plan = plan_collection(
+                    cian, date_from, date_to, logger, cassette, args.shard,
+                    args.by_employees, args.max_memory is not None, args.include_inactive
                 )
-            chats = fetch_filtered_chats(cian, date_from)
-            updated_offers = update_my_offer_with_chats(
-                updated_offers, chats
-            )
+            finally:
+                cian.close()
+                if cassette:
+                    cassette.close()
+            for line in plan.format():
+                logger.info(line)
+            exit(0)
 
-            calls_data = fetch_filtered_calls(
-                cian, 
-                date_from, 
-                date_to
-            )
-            updated_offers = update_my_offer_with_calls(
-                updated_offers, 
-                calls_data
-            )
-            updated_offers.sort(key=lambda x: x.report_date)
-            
+        if not args.shard:
+            # Учетные данные проверяются до сбора: подключение к таблице открывается только при записи
+            try:
+                GoogleSheet.load_credentials(settings.google_conf.path_creds_json)
+            except InvalidCredentials as _ex:
+                logger.critical(_ex)
+                logger.critical("Завершение работы скрипта с ошибкой!")
+                exit(1)
+
+        logger.info(f"Сбор статистики!")
+        dead_letters = DeadLetterQueue(logger)
+        memory_guard = MemoryGuard(args.max_memory, logger) if args.max_memory else None
+        stages = collection_stages(
+            cian, date_from, date_to, logger, dead_letters, args.shard, memory_guard,
+            args.by_employees, args.include_inactive
+        )
+        target = "result"
+        if args.shard:
+            # Шард собирает только данные объявлений, чаты и звонки добавляются при объединении
+            target = "join"
+        elif shard_offers is not None:
+            stages = [stage for stage in stages if stage.name != "join"]
+            stages.append(Stage("join", lambda: shard_offers))
+        try: 
+            updated_offers = run_stages(select_stages(stages, target), logger, cancel=cancel)[target]
         except SendRequestError as _ex:
             logger.critical(_ex)
             logger.critical("Завершение работы скрипта с ошибкой!")
             exit(1)
+        finally:
+            cian.close()
+            if cassette:
+                cassette.close()
+        if cian.hedge_budget.hedges:
+            logger.info(
+                f"Дублирующих запросов к API Циан: {cian.hedge_budget.hedges} "\
+                f"из {cian.hedge_budget.requests}"
+            )
 
-        logging.info("Запись данных в таблицу Google!")
+        if args.shard:
+            name_file = write_shard_result(
+                args.shard_output, updated_offers, date_from, date_to, args.shard
+            )
+            logger.info(f"Частичный результат шарда записан в файл - {name_file}")
+            if dead_letters:
+                dead_letters.report()
+                logger.error("Скрипт завершил работу с ошибками! Данные собраны частично.")
+                exit(1)
+            logger.info("Скрипт завершил работу!")
+            exit(0)
+
+        if args.archive:
+            from app.archive import MetricsArchive
+
+            try:
+                rows = MetricsArchive(args.archive).append(updated_offers)
+                logger.info(f"В архив {args.archive} добавлено строк: {rows}")
+            except (ArchiveFormatError, OSError, ValueError) as _ex:
+                logger.error(f"Ошибка записи данных в архив! {_ex}")
+
+        logger.info("Запись данных в таблицу Google!")
 
         try:
-            google_sheet.update(updated_offers)
+            if isinstance(updated_offers, RowSpill):
+                # Лист читается только перед первой пачкой, остальные пишутся с известной строки
+                next_row = None
+                for batch in updated_offers.batches():
+                    next_row = google_sheet.update(batch, next_row)
+            else:
+                google_sheet.update(updated_offers)
+        except (InvalidCredentials, SpreadsheetNotFound, WorksheetNotFound) as _ex:
+            logger.critical(_ex)
+            logger.critical("Запись полученных данных в JSON!")
+            name_file = json_alarm_record(updated_offers)
+            logger.critical(f"Данные записаны в файл - {name_file}")
+            logger.critical("Завершение работы скрипта с ошибкой!")
+            exit(1)
         except UpdateWorksheetError as _ex:
             logger.critical(f"Ошибка добавления данных в таблицу Google! {_ex}")
             logger.critical("Запись полученных данных в JSON!")
@@ -122,11 +220,36 @@ def main():
             logger.critical(f"Данные записаны в файл - {name_file}")
             logger.critical("Завершение работы скрипта с ошибкой!")
             exit(1)
+        logger.info(
+            f"Запросов к Google Sheets API: чтение - {google_sheet.quota.reads}, "\
+            f"запись - {google_sheet.quota.writes}"
+        )
+
+        if args.rollup:
+            from app.rollup import PERIODS, SUMMARY_HEADERS, SUMMARY_KEY_SIZE, build_rollups
+
+            logger.info("Построение сводок по неделям и месяцам!")
+            rollups = build_rollups(updated_offers, date_from, date_to)
+            try:
+                for period, rows in rollups.items():
+                    if not rows:
+                        logger.info(f"{PERIODS[period]}: в периоде сбора нет полных периодов, сводка не записана")
+                    google_sheet.write_summary(
+                        PERIODS[period], SUMMARY_HEADERS, rows, SUMMARY_KEY_SIZE
+                    )
+            except (InvalidCredentials, SpreadsheetNotFound, UpdateWorksheetError) as _ex:
+                logger.critical(f"Ошибка записи сводок в таблицу Google! {_ex}")
+                logger.critical("Завершение работы скрипта с ошибкой!")
+                exit(1)
             
-        logging.info("Скрипт завершил работу!")
+        if dead_letters:
+            dead_letters.report()
+            logger.error("Скрипт завершил работу с ошибками! Данные записаны частично.")
+            exit(1)
+        logger.info("Скрипт завершил работу!")
         exit(0)    
     except KeyboardInterrupt:
-        logging.info("Остановка скрипта...")
+        init_logging().info("Остановка скрипта...")
         exit(1)
 
 if __name__ == "__main__":